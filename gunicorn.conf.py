@@ -0,0 +1,7 @@
+def post_worker_init(worker):
+    # Race-day check-in: load today's events into memory before the first lookup
+    try:
+        from registration.checkin import warm_indexes
+        warm_indexes()
+    except Exception as exc:
+        worker.log.warning("Check-in index warm-up failed: %s", exc)
@@ -1,6 +1,11 @@
 from django.contrib import admin
-from .models import Event, Distance, Runner
+from .models import Event, Distance, Runner, OutgoingEmail, BibCounter, ExportJob, RaceResult, SheetSync
 
 admin.site.register(Event)
 admin.site.register(Distance)
-admin.site.register(Runner)
\ No newline at end of file
+admin.site.register(Runner)
+admin.site.register(OutgoingEmail)
+admin.site.register(BibCounter)
+admin.site.register(ExportJob)
+admin.site.register(SheetSync)
+admin.site.register(RaceResult)
@@ -0,0 +1,88 @@
+from rest_framework import generics, serializers
+from rest_framework.permissions import IsAdminUser
+from datetime import date
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from .caching import API_EVENTS_TIMEOUT, build_once, cached_json, version
+from .forms import DUPLICATE_EMAIL_MESSAGE
+from .models import Event, Runner, build_registration_email
+from .serializers import EventSerializer, GroupRegistrationSerializer, RunnerSerializer
+from .uploads import install_receipt_upload_handler
+
+class EventListAPI(generics.ListAPIView):
+    serializer_class = EventSerializer
+
+    def get_queryset(self):
+        # Evaluated per request; a class-level queryset froze date.today() at import
+        return Event.objects.filter(date__gte=date.today()).order_by('date').prefetch_related('distances')
+
+    def list(self, request, *args, **kwargs):
+        # Poster URLs are absolute, so the cached body is per host as well
+        key = f"api-events:{version('api-events')}:{date.today()}:{request.build_absolute_uri('/')}"
+        entry = build_once(
+            key,
+            lambda: cached_json(self.get_serializer(self.get_queryset(), many=True).data),
+            API_EVENTS_TIMEOUT,
+        )
+
+        response = get_conditional_response(request, etag=entry['etag'])
+        if response is None:
+            response = HttpResponse(entry['body'], content_type='application/json')
+        response['ETag'] = entry['etag']
+        patch_cache_control(response, public=True, no_cache=True)
+        return response
+
+class ReceiptUploadMixin:
+    """Rejects bad receipt uploads while they stream in (see uploads.py)."""
+
+    def initial(self, request, *args, **kwargs):
+        # Installed before request.data is parsed so oversized receipts stop early
+        install_receipt_upload_handler(request._request)
+        super().initial(request, *args, **kwargs)
+
+    def create(self, request, *args, **kwargs):
+        request.data  # parse the body so the upload handler has run
+        upload_errors = getattr(request._request, 'upload_errors', None)
+        if upload_errors:
+            raise serializers.ValidationError(
+                {field: [message] for field, message in upload_errors.items()}
+            )
+        return super().create(request, *args, **kwargs)
+
+
+class RunnerCreateAPI(ReceiptUploadMixin, generics.CreateAPIView):
+    queryset = Runner.objects.all()
+    serializer_class = RunnerSerializer
+
+    def perform_create(self, serializer):
+        # The per-event email constraint replaces a pre-check query
+        try:
+            with transaction.atomic():
+                runner = serializer.save()
+                # 🔔 Same "Registration Received" email as the form (register_runner)
+                build_registration_email(runner).save()
+        except IntegrityError as exc:
+            if not Runner.is_duplicate_email_error(exc):
+                raise
+            raise serializers.ValidationError({'email': [DUPLICATE_EMAIL_MESSAGE]})
+
+
+class GroupRegistrationAPI(ReceiptUploadMixin, generics.CreateAPIView):
+    """Staff endpoint: registers a club's runners in one request with one shared receipt."""
+    serializer_class = GroupRegistrationSerializer
+    permission_classes = [IsAdminUser]
+
+    def create(self, request, *args, **kwargs):
+        try:
+            return super().create(request, *args, **kwargs)
+        except IntegrityError as exc:
+            if not Runner.is_duplicate_email_error(exc):
+                raise
+            # Someone registered one of these emails meanwhile; validating again names the row.
+            # The receipt was read when it was stored, so rewind it for the image check
+            for upload in request.FILES.values():
+                upload.seek(0)
+            serializer = self.get_serializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            raise serializers.ValidationError({'email': [DUPLICATE_EMAIL_MESSAGE]})
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Distance, Event
+
+# Namespaces whose cached content is built from events and their distances
+EVENT_NAMESPACES = ('home', 'distances', 'api-events', 'results')
+
+LOCK_TIMEOUT = 30  # Seconds a rebuild may hold the lock before others take over
+LOCK_WAIT = 3.0  # Seconds a request waits for someone else's rebuild when nothing stale is cached
+LOCK_POLL = 0.05
+
+DISTANCES_TIMEOUT = 24 * 60 * 60  # Versioned, so this only bounds how long dead keys linger
+API_EVENTS_TIMEOUT = 24 * 60 * 60
+
+
+def _new_version():
+    # A timestamp rather than a counter: a version key that was culled or
+    # evicted comes back as a value no earlier key was built with, where a
+    # counter would restart at 1 and revive entries built from old data
+    return time.time_ns()
+
+
+def version(namespace):
+    """Current version of a namespace; part of every key built from it."""
+    key = f"version:{namespace}"
+    current = cache.get(key)
+    if current is None:
+        # add() so concurrent first readers agree on one value
+        cache.add(key, _new_version(), None)
+        current = cache.get(key)
+    return current
+
+
+def bump_version(namespace):
+    # Old keys are simply never read again and expire on their own
+    cache.set(f"version:{namespace}", _new_version(), None)
+
+
+@receiver([post_save, post_delete], sender=Event)
+@receiver([post_save, post_delete], sender=Distance)
+def invalidate_event_caches(**kwargs):
+    for namespace in EVENT_NAMESPACES:
+        bump_version(namespace)
+
+
+def build_once(key, build, timeout, stale_key=None):
+    """
+    cache.get(key), rebuilding on a miss with stampede protection: only the
+    request that wins cache.add() on the lock calls build(). Everyone else
+    is served the previous value from stale_key, or waits briefly for the
+    winner, so an invalidation costs one rebuild rather than one per worker.
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    lock_key = f"{key}:lock"
+    locked = cache.add(lock_key, 1, LOCK_TIMEOUT)
+    if not locked:
+        stale = cache.get(stale_key) if stale_key else None
+        if stale is not None:
+            return stale
+
+        deadline = time.monotonic() + LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL)
+            value = cache.get(key)
+            if value is not None:
+                return value
+        # The winner is slow or died; build without the lock rather than fail
+
+    try:
+        value = build()
+        cache.set(key, value, timeout)
+        if stale_key:
+            cache.set(stale_key, value, None)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    return value
+
+
+def cached_page(html):
+    """Cache entry for a rendered page: body plus its validators."""
+    return {
+        'html': html,
+        'etag': '"%s"' % hashlib.md5(html.encode(), usedforsecurity=False).hexdigest(),
+        'last_modified': timezone.now().replace(microsecond=0),
+    }
+
+
+def cached_json(data):
+    """Cache entry for a JSON response: serialized body plus its ETag."""
+    body = json.dumps(data, cls=DjangoJSONEncoder)
+    return {
+        'body': body,
+        'etag': '"%s"' % hashlib.md5(body.encode(), usedforsecurity=False).hexdigest(),
+    }
+
+
+def event_distances(event_id):
+    """[{id, label, fee}] for one event, as a cached_json entry."""
+    def build():
+        distances = Distance.objects.filter(event_id=event_id).order_by('pk').values('id', 'label', 'fee')
+        return cached_json(list(distances))
+
+    return build_once(f"distances:{version('distances')}:event:{event_id}", build, DISTANCES_TIMEOUT)
+
+
+def open_event_distances(today):
+    """
+    Snapshot of the distances of every event still open on `today`, keyed by
+    event id, stamped with the version it was built from. Embedded in the
+    registration page so choosing an event needs no request.
+    """
+    current = version('distances')
+
+    def build():
+        # Open events without distances are listed too, so the page never asks about them
+        events = {
+            str(pk): [] for pk in Event.objects.filter(date__gte=today).values_list('pk', flat=True)
+        }
+        rows = (
+            Distance.objects.filter(event__date__gte=today)
+            .order_by('event_id', 'pk').values('event_id', 'id', 'label', 'fee')
+        )
+        for row in rows:
+            events[str(row.pop('event_id'))].append(row)
+        return {'version': current, 'events': events}
+
+    return build_once(f"distances:{current}:open:{today}", build, DISTANCES_TIMEOUT)
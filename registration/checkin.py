@@ -0,0 +1,219 @@
+import heapq
+import re
+import threading
+import time
+from collections import namedtuple
+from datetime import date, timedelta
+
+from django.utils import timezone
+
+from .models import Event, Runner, bib_keys, normalize_name
+
+REFRESH_INTERVAL = 2.0  # Seconds between incremental refreshes of an index
+FULL_RELOAD_INTERVAL = 15 * 60  # Seconds; rebuilds the trie, which discard() leaves sparse
+# Look back past the last refresh for rows whose transaction committed late
+REFRESH_OVERLAP = timedelta(seconds=30)
+MAX_RESULTS = 20
+
+CheckinEntry = namedtuple('CheckinEntry', [
+    'id', 'bib_number', 'first_name', 'last_name', 'distance', 'gender',
+    'age', 'shirt_size', 'is_verified', 'kit_claimed_at',
+])
+
+ENTRY_FIELDS = (
+    'pk', 'bib_number', 'first_name', 'last_name', 'distance__label', 'gender',
+    'age', 'shirt_size', 'is_verified', 'kit_claimed_at',
+)
+
+
+class PrefixTrie:
+    """
+    Maps every prefix of every indexed word to the ids containing it, so a
+    lookup costs one dict step per typed character.
+    """
+
+    def __init__(self):
+        self.root = {}
+
+    def add(self, word, item):
+        node = self.root
+        for char in word:
+            node = node.setdefault(char, {})
+            node.setdefault('', set()).add(item)
+
+    def discard(self, word, item):
+        node = self.root
+        for char in word:
+            node = node.get(char)
+            if node is None:
+                return
+            node[''].discard(item)
+
+    def find(self, prefix):
+        node = self.root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return set()
+        return node.get('', set())
+
+
+class CheckinIndex:
+    """
+    One event's runners held in memory for check-in desks: bib lookups by
+    dict, partial names through a PrefixTrie. refresh() pulls only rows
+    whose updated_at moved since the last refresh.
+    """
+
+    def __init__(self, event_id):
+        self.event_id = event_id
+        self.lock = threading.Lock()
+        self.entries = {}  # runner pk -> CheckinEntry
+        self.by_bib = {}  # '100007' -> pk
+        self.by_number = {}  # 7 -> {pks}; the same number exists per distance
+        self.names = PrefixTrie()
+        self.watermark = None
+        self.refreshed_at = 0.0
+        self.loaded_at = 0.0
+
+    def _rows(self, since=None):
+        runners = Runner.objects.filter(event_id=self.event_id)
+        if since is not None:
+            runners = runners.filter(updated_at__gte=since)
+        return runners.order_by().values_list(*ENTRY_FIELDS)
+
+    def _words(self, entry):
+        return set(normalize_name(f"{entry.first_name} {entry.last_name}").split())
+
+    def _add(self, entry):
+        self.entries[entry.id] = entry
+        for word in self._words(entry):
+            self.names.add(word, entry.id)
+        full, number = bib_keys(entry.bib_number)
+        if full:
+            self.by_bib[full] = entry.id
+            self.by_number.setdefault(number, set()).add(entry.id)
+
+    def _remove(self, pk):
+        entry = self.entries.pop(pk, None)
+        if entry is None:
+            return
+        for word in self._words(entry):
+            self.names.discard(word, pk)
+        full, number = bib_keys(entry.bib_number)
+        if full:
+            if self.by_bib.get(full) == pk:
+                del self.by_bib[full]
+            self.by_number.get(number, set()).discard(pk)
+
+    def upsert(self, entry):
+        with self.lock:
+            if self.entries.get(entry.id) != entry:
+                self._remove(entry.id)
+                self._add(entry)
+
+    def load(self):
+        started = timezone.now()
+        entries = [CheckinEntry(*row) for row in self._rows()]
+        with self.lock:
+            self.entries, self.by_bib, self.by_number = {}, {}, {}
+            self.names = PrefixTrie()
+            for entry in entries:
+                self._add(entry)
+            self.watermark = started
+            self.loaded_at = self.refreshed_at = time.monotonic()
+
+    def refresh(self, force=False):
+        """Incremental update, at most every REFRESH_INTERVAL unless forced."""
+        now = time.monotonic()
+        if self.watermark is None or now - self.loaded_at > FULL_RELOAD_INTERVAL:
+            return self.load()
+        if not force and now - self.refreshed_at < REFRESH_INTERVAL:
+            return
+
+        started = timezone.now()
+        changed = [CheckinEntry(*row) for row in self._rows(since=self.watermark - REFRESH_OVERLAP)]
+        # updated_at can't show deletions (or runners moved to another event);
+        # the event's current pks can, in one narrow query
+        current = set(Runner.objects.filter(event_id=self.event_id).values_list('pk', flat=True))
+
+        for entry in changed:
+            self.upsert(entry)
+        with self.lock:
+            for pk in self.entries.keys() - current:
+                self._remove(pk)
+        self.watermark = started
+        self.refreshed_at = now
+
+    def lookup(self, query, limit=MAX_RESULTS):
+        """Runners matching a bib ("10-0007", "7") or every word of a partial name."""
+        query = normalize_name(query)
+        if not query:
+            return []
+
+        with self.lock:
+            if re.fullmatch(r'[\d\s-]+', query):
+                full, number = bib_keys(query)
+                exact = self.by_bib.get(full)
+                if exact is not None:
+                    pks = {exact}
+                elif query.strip().isdigit():
+                    # A bare number ("7") matches it in every distance
+                    pks = set(self.by_number.get(number, ()))
+                else:
+                    # A distance prefix that matched nothing must not fall back to another distance's kit
+                    pks = set()
+            else:
+                pks = None
+                for word in query.split():
+                    found = self.names.find(word)
+                    pks = found.copy() if pks is None else pks & found
+                    if not pks:
+                        break
+            entries = [self.entries[pk] for pk in pks or ()]
+
+        # A one-letter prefix can match most of the field; only order what is shown
+        return heapq.nsmallest(limit, entries, key=lambda e: (e.last_name.lower(), e.first_name.lower(), e.id))
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(event_id):
+    """This process's index for the event, created and refreshed on demand."""
+    with _indexes_lock:
+        index = _indexes.get(event_id)
+        if index is None:
+            index = _indexes[event_id] = CheckinIndex(event_id)
+    index.refresh()
+    return index
+
+
+def warm_indexes():
+    """Loads today's events up front so the first lookup on race morning is fast."""
+    for event_id in Event.objects.filter(date=date.today()).values_list('pk', flat=True):
+        get_index(event_id)
+
+
+def claim_kit(runner_id, user=None):
+    """
+    Records kit pickup for a verified runner. The conditional UPDATE makes a
+    second desk claiming the same runner a no-op. Returns (entry, claimed).
+    """
+    now = timezone.now()
+    claimed = Runner.objects.filter(
+        pk=runner_id, is_verified=True, kit_claimed_at__isnull=True
+    ).update(kit_claimed_at=now, kit_claimed_by=user, updated_at=now)
+
+    row = Runner.objects.filter(pk=runner_id).values_list('event_id', *ENTRY_FIELDS).first()
+    if row is None:
+        return None, False
+    event_id, *fields = row
+    entry = CheckinEntry(*fields)
+
+    # Other workers see it on their next refresh; this one right away
+    index = _indexes.get(event_id)
+    if index is not None:
+        index.upsert(entry)
+    return entry, bool(claimed)
@@ -0,0 +1,475 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import csv
+import hashlib
+import io
+import json
+import os
+import tempfile
+import zipfile
+
+import xlsxwriter
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from .forms import RunnerExportForm
+from .images import EXPORT_THUMBNAIL_SIZE, THUMBNAIL_SIZE
+from .models import ExportJob, Runner
+
+# Age category filters shared by the export form and the runner listings
+AGE_MAP = {
+    '20_below': (0, 20),
+    '21_29': (21, 29),
+    '30_39': (30, 39),
+    '40_49': (40, 49),
+    '50_59': (50, 59),
+    '60_75': (60, 75),
+}
+
+# Columns read for each exported row, in this order
+EXPORT_COLUMNS = (
+    'last_name', 'first_name', 'email', 'distance__label',
+    'is_verified', 'bib_number', 'age', 'gender', 'shirt_size',
+)
+
+CHUNK_SIZE = 2000
+FILE_CHUNK_SIZE = 64 * 1024  # Bytes read from storage at a time for receipt archives
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+CSV_CONTENT_TYPE = 'text/csv; charset=utf-8'
+JSONL_CONTENT_TYPE = 'application/x-ndjson; charset=utf-8'
+
+EXPORT_HEADERS = ['Name', 'Email', 'Distance', 'Bib', 'Age', 'Gender', 'Shirt Size']
+
+# Background jobs: identical filters within REUSE_WINDOW share one artifact
+FILTER_FIELDS = ('event', 'distance', 'shirt_size', 'gender', 'is_verified', 'age_category', 'include_receipts')
+REUSE_WINDOW = timedelta(minutes=10)
+ARTIFACT_TTL = timedelta(days=1)
+STALE_AFTER = timedelta(minutes=15)  # A running job without progress this long is retried
+
+# Receipt column: the thumbnails stored at upload are scaled down to
+# EXPORT_THUMBNAIL_SIZE, and rows are made tall enough for them
+RECEIPT_IMAGE_SCALE = EXPORT_THUMBNAIL_SIZE[0] / THUMBNAIL_SIZE[0]
+RECEIPT_ROW_HEIGHT = EXPORT_THUMBNAIL_SIZE[1] * 0.75 + 4  # points
+# Threads copying thumbnails out of storage; the work is network bound
+EXPORT_THUMBNAIL_WORKERS = getattr(settings, 'EXPORT_THUMBNAIL_WORKERS', 4)
+
+
+def filter_runners(cd):
+    """Runner queryset for RunnerExportForm cleaned data."""
+    qs = Runner.objects.all()
+
+    if cd['event']:
+        qs = qs.filter(event=cd['event'])
+    if cd['distance']:
+        qs = qs.filter(distance=cd['distance'])
+    if cd['shirt_size']:
+        qs = qs.filter(shirt_size=cd['shirt_size'])
+    if cd['gender']:
+        qs = qs.filter(gender=cd['gender'])
+    if cd['is_verified'] == 'yes':
+        qs = qs.filter(is_verified=True)
+    elif cd['is_verified'] == 'no':
+        qs = qs.filter(is_verified=False)
+    if cd['age_category'] in AGE_MAP:
+        low, high = AGE_MAP[cd['age_category']]
+        qs = qs.filter(age__gte=low, age__lte=high)
+
+    return qs.order_by('last_name', 'first_name', 'pk')
+
+
+def describe_filters(cd):
+    """Human readable summary of the selected filters."""
+    filter_parts = []
+
+    if cd['event']:
+        filter_parts.append(f"Event: {cd['event'].name} on {cd['event'].date}")
+    if cd['distance']:
+        filter_parts.append(f"Distance: {cd['distance'].label} KM")
+    if cd['is_verified'] in ['yes', 'no']:
+        filter_parts.append(f"Verified: {'Yes' if cd['is_verified'] == 'yes' else 'No'}")
+    if cd['gender']:
+        gender_display = dict(Runner.GENDER_CHOICES).get(cd['gender'], cd['gender'])
+        filter_parts.append(f"Gender: {gender_display}")
+    if cd['shirt_size']:
+        filter_parts.append(f"Shirt Size: {cd['shirt_size']}")
+    if cd['age_category']:
+        category_map = dict(RunnerExportForm.AGE_CATEGORY_CHOICES)
+        filter_parts.append(f"Age Category: {category_map.get(cd['age_category'], cd['age_category'])}")
+
+    return "Filters – " + ", ".join(filter_parts) if filter_parts else "All runners (no filters applied)"
+
+
+def export_filename(cd, extension):
+    event_name = cd['event'].name.replace(" ", "_") if cd['event'] else 'all_events'
+    timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M')
+    return f"{event_name}_runners_{timestamp}.{extension}"
+
+
+def iter_export_rows(cd, with_receipts=False):
+    """
+    Yields one dict per runner, streamed from the database in chunks as
+    plain tuples rather than model instances. with_receipts adds the stored
+    receipt and thumbnail names under 'receipt' and 'thumbnail'.
+    """
+    genders = dict(Runner.GENDER_CHOICES)
+    columns = EXPORT_COLUMNS + (('proof_of_payment', 'proof_thumbnail') if with_receipts else ())
+    rows = filter_runners(cd).values_list(*columns).iterator(chunk_size=CHUNK_SIZE)
+
+    for last_name, first_name, email, distance, is_verified, bib, age, gender, shirt_size, *extra in rows:
+        row = {
+            'name': f"{last_name}, {first_name}",
+            'email': email,
+            'distance': distance,
+            # ✅ Show bib only for verified runners
+            'bib': bib if is_verified and bib else '',
+            'age': age,
+            'gender': genders.get(gender, gender),
+            'shirt_size': shirt_size,
+        }
+        if with_receipts:
+            row['receipt'], row['thumbnail'] = extra
+        yield row
+
+
+def _copy_thumbnail(name, directory):
+    """Copies one stored thumbnail to a local file for xlsxwriter. None if it's missing."""
+    path = os.path.join(directory, f"{hashlib.sha256(name.encode()).hexdigest()}.jpg")
+    try:
+        with default_storage.open(name, 'rb') as stored, open(path, 'wb') as local:
+            for chunk in iter(lambda: stored.read(FILE_CHUNK_SIZE), b''):
+                local.write(chunk)
+    except OSError:
+        return None
+    return path
+
+
+def receipt_thumbnails(cd, directory, workers=None):
+    """
+    Maps each stored thumbnail name in the export to a local copy in
+    `directory`. The thumbnails are the ones built at upload time (see
+    images.process_receipt), so nothing is decoded here.
+    """
+    names = list(
+        filter_runners(cd).exclude(proof_thumbnail='')
+        .order_by().values_list('proof_thumbnail', flat=True).distinct()
+    )
+    if not names:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=workers or EXPORT_THUMBNAIL_WORKERS) as pool:
+        paths = pool.map(_copy_thumbnail, names, [directory] * len(names))
+        return {name: path for name, path in zip(names, paths) if path}
+
+
+def write_xlsx(output, cd, progress=None):
+    """
+    Writes the styled runner workbook to a seekable file object.
+    constant_memory mode flushes each row to disk as it is written, so
+    memory use stays flat whatever the row count. `progress`, if given, is
+    called with the number of rows written after every CHUNK_SIZE rows.
+    With cd['include_receipts'] a thumbnail of each receipt goes in column H.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        _write_xlsx(output, cd, directory, progress)
+
+
+def _write_xlsx(output, cd, directory, progress):
+    with_receipts = bool(cd.get('include_receipts'))
+    # Thumbnails are prepared up front: constant_memory rows are written strictly in order
+    thumbnails = receipt_thumbnails(cd, directory) if with_receipts else {}
+
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+    worksheet = workbook.add_worksheet("Runners")
+
+    # Header styles
+    summary_format = workbook.add_format({
+        'bold': True,
+        'font_color': 'white',
+        'bg_color': '#004400',
+        'align': 'left'
+    })
+    header_format = workbook.add_format({
+        'bold': True,
+        'bg_color': '#00cc44',
+        'font_color': 'white',
+        'align': 'center',
+        'valign': 'vcenter',
+        'border': 1
+    })
+    cell_format = workbook.add_format({
+        'border': 1,
+        'text_wrap': True,
+        'valign': 'vcenter'
+    })
+    bold_name_format = workbook.add_format({
+        'bold': True,
+        'border': 1,
+        'text_wrap': True,
+        'valign': 'vcenter'
+    })
+
+    # Column widths
+    worksheet.set_column('A:A', 22)  # Name
+    worksheet.set_column('B:B', 30)  # Email
+    worksheet.set_column('C:C', 15)  # Distance
+    worksheet.set_column('D:D', 12)  # Bib Number
+    worksheet.set_column('E:E', 6)   # Age
+    worksheet.set_column('F:F', 10)  # Gender
+    worksheet.set_column('G:G', 12)  # Shirt Size
+    if with_receipts:
+        worksheet.set_column('H:H', 15)  # Receipt
+
+    # Title & summary (rows must be written top to bottom in constant_memory mode)
+    worksheet.merge_range('A1:H1', 'Surigao Ultra Runners – Exported Data', summary_format)
+    worksheet.merge_range('A2:H2', describe_filters(cd), workbook.add_format({'italic': True, 'bg_color': '#002200', 'font_color': '#ccffcc'}))
+
+    # Headers
+    headers = EXPORT_HEADERS + ['Receipt'] if with_receipts else EXPORT_HEADERS
+    for col, header in enumerate(headers):
+        worksheet.write(3, col, header, header_format)
+
+    # Data rows
+    for row_num, row in enumerate(iter_export_rows(cd, with_receipts), start=4):
+        thumbnail = thumbnails.get(row['thumbnail']) if with_receipts else None
+        if thumbnail:
+            # Row height must be set before any cell of the row is written
+            worksheet.set_row(row_num, RECEIPT_ROW_HEIGHT)
+
+        worksheet.write(row_num, 0, row['name'], bold_name_format)
+        worksheet.write(row_num, 1, row['email'], cell_format)
+        worksheet.write(row_num, 2, row['distance'], cell_format)
+        worksheet.write(row_num, 3, row['bib'], cell_format)
+        worksheet.write(row_num, 4, row['age'], cell_format)
+        worksheet.write(row_num, 5, row['gender'], cell_format)
+        worksheet.write(row_num, 6, row['shirt_size'], cell_format)
+        if thumbnail:
+            worksheet.insert_image(row_num, 7, thumbnail, {
+                'x_offset': 2, 'y_offset': 2, 'object_position': 1,
+                'x_scale': RECEIPT_IMAGE_SCALE, 'y_scale': RECEIPT_IMAGE_SCALE,
+            })
+        elif with_receipts:
+            # A receipt without a thumbnail couldn't be decoded at upload
+            worksheet.write(row_num, 7, 'No preview' if row['receipt'] else 'No receipt', cell_format)
+
+        written = row_num - 3
+        if progress and written % CHUNK_SIZE == 0:
+            progress(written)
+
+    workbook.close()
+
+
+class Echo:
+    """File-like object whose write() just returns the line, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(cd):
+    """Yields the export as CSV lines, header first."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_HEADERS)
+    for row in iter_export_rows(cd):
+        yield writer.writerow(row.values())
+
+
+def stream_jsonl(cd):
+    """Yields the export as JSON Lines, one runner object per line."""
+    for row in iter_export_rows(cd):
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+def export_filters(cd):
+    """JSON-safe copy of the filter fields, as RunnerExportForm data."""
+    filters = {}
+    for name in FILTER_FIELDS:
+        value = cd.get(name)
+        filters[name] = value.pk if hasattr(value, 'pk') else (value or '')
+    return filters
+
+
+def filters_key(filters):
+    canonical = json.dumps(filters, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def enqueue_export(cd, user=None):
+    """
+    Returns the ExportJob for these filters: one already queued or running,
+    a finished one from the last REUSE_WINDOW, or a newly queued job.
+    """
+    filters = export_filters(cd)
+    key = filters_key(filters)
+
+    job = (
+        ExportJob.objects
+        .filter(filters_key=key)
+        .filter(
+            Q(status__in=[ExportJob.STATUS_PENDING, ExportJob.STATUS_RUNNING])
+            | Q(status=ExportJob.STATUS_DONE, finished_at__gte=timezone.now() - REUSE_WINDOW)
+        )
+        .order_by('-created_at')
+        .first()
+    )
+    if job:
+        return job
+
+    return ExportJob.objects.create(
+        filters=filters,
+        filters_key=key,
+        filename=export_filename(cd, 'xlsx'),
+        requested_by=user if user and user.is_authenticated else None,
+    )
+
+
+def claim_export_job():
+    """Marks the oldest runnable job as running and returns it, or None."""
+    stale = timezone.now() - STALE_AFTER
+    with transaction.atomic():
+        # skip_locked lets several workers share the queue
+        job = (
+            ExportJob.objects
+                .select_for_update(skip_locked=True)
+            .filter(
+                Q(status=ExportJob.STATUS_PENDING)
+                | Q(status=ExportJob.STATUS_RUNNING, updated_at__lt=stale)
+            )
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = ExportJob.STATUS_RUNNING
+        job.rows_done = 0
+        job.save(update_fields=['status', 'rows_done', 'updated_at'])
+    return job
+
+
+def run_export_job(job):
+    """Builds the workbook for a claimed job into a temp file, then saves it to storage."""
+    form = RunnerExportForm(job.filters)
+    if not form.is_valid():
+        # e.g. the event was deleted after the job was queued
+        _finish(job, ExportJob.STATUS_FAILED, error=form.errors.as_text())
+        return job
+
+    cd = form.cleaned_data
+    job.rows_total = filter_runners(cd).count()
+    job.save(update_fields=['rows_total', 'updated_at'])
+
+    def progress(rows_done):
+        ExportJob.objects.filter(pk=job.pk).update(rows_done=rows_done, updated_at=timezone.now())
+
+    try:
+        with tempfile.TemporaryFile() as output:
+            write_xlsx(output, cd, progress=progress)
+            output.seek(0)
+            # Storage copies it in chunks, the workbook is never held in memory
+            job.file.save(f"{job.pk}/{job.filename}", File(output), save=False)
+    except Exception as exc:
+        _finish(job, ExportJob.STATUS_FAILED, error=str(exc))
+        raise
+
+    job.rows_done = job.rows_total
+    _finish(job, ExportJob.STATUS_DONE)
+    return job
+
+
+def _finish(job, status, error=''):
+    job.status = status
+    job.error = error
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'file', 'rows_done', 'finished_at', 'updated_at'])
+
+
+def purge_expired_exports():
+    """Deletes jobs and their stored workbooks older than ARTIFACT_TTL. Returns the count."""
+    expired = ExportJob.objects.filter(created_at__lt=timezone.now() - ARTIFACT_TTL)
+    for name in expired.exclude(file='').values_list('file', flat=True).iterator():
+        default_storage.delete(name)
+    deleted, _ = expired.delete()
+    return deleted
+
+
+class ZipBuffer:
+    """
+    Unseekable write target for zipfile. zipfile then writes data
+    descriptors after each member, and the bytes can be handed off as soon
+    as they are written.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        chunks, self.chunks = self.chunks, []
+        return chunks
+
+
+def receipt_archive_name(bib, last_name, first_name, receipt, pk, used):
+    """<bib>_<last>_<first>.<ext>, made filesystem safe and unique within the archive."""
+    ext = os.path.splitext(receipt)[1].lower() or '.jpg'
+    bib = bib.replace(' ', '') if bib else 'unverified'  # "10 - 0001" -> "10-0001"
+    stem = get_valid_filename(f"{bib}_{last_name}_{first_name}")
+    name = f"{stem}{ext}"
+    if name in used:
+        name = f"{stem}_{pk}{ext}"
+    used.add(name)
+    return name
+
+
+def stream_receipts_zip(event):
+    """
+    Yields a ZIP of every receipt uploaded for an event, plus index.csv.
+    Files are copied from storage FILE_CHUNK_SIZE bytes at a time and each
+    piece of the archive is yielded as soon as it is written.
+    """
+    buffer = ZipBuffer()
+    index = [['file', 'bib', 'last_name', 'first_name', 'email', 'distance', 'verified', 'receipt', 'status']]
+    used = set()
+
+    runners = (
+        Runner.objects.filter(event=event).exclude(proof_of_payment='')
+        .order_by('-is_verified', 'bib_number', 'last_name', 'first_name', 'pk')
+        .values_list('pk', 'bib_number', 'last_name', 'first_name', 'email',
+                     'distance__label', 'is_verified', 'proof_of_payment')
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+
+    with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_STORED) as archive:
+        for pk, bib, last_name, first_name, email, distance, is_verified, receipt in runners:
+            bib = bib if is_verified else ''
+            name = receipt_archive_name(bib, last_name, first_name, receipt, pk, used)
+            status = 'ok'
+            try:
+                stored = default_storage.open(receipt, 'rb')
+            except OSError:
+                name, status = '', 'missing'
+            else:
+                with stored, archive.open(name, mode='w', force_zip64=True) as member:
+                    # Images are already compressed, so members are stored as-is
+                    for chunk in iter(lambda: stored.read(FILE_CHUNK_SIZE), b''):
+                        member.write(chunk)
+                        yield from buffer.drain()
+            index.append([name, bib, last_name, first_name, email, distance,
+                          'yes' if is_verified else 'no', receipt, status])
+            yield from buffer.drain()
+
+        lines = io.StringIO()
+        csv.writer(lines).writerows(index)
+        archive.writestr('index.csv', lines.getvalue(), compress_type=zipfile.ZIP_DEFLATED)
+
+    yield from buffer.drain()
@@ -1,10 +1,38 @@
 from django import forms
 from datetime import date
-from .models import Runner, Distance, Event
+from django.db import IntegrityError, transaction
+from .models import Runner, Distance, Event, normalize_name
+from .uploads import MAX_RECEIPT_SIZE
 from django.core.exceptions import ValidationError
 import re
 
 
+DUPLICATE_EMAIL_MESSAGE = "❌ This email is already registered for this event."
+DUPLICATE_NAME_MESSAGE = "⚠️ This person is already registered for this event with a different email."
+REGISTRATION_CLOSED_MESSAGE = "❌ Registration for this event has closed."
+
+
+def validate_contact_number(number):
+    if not re.match(r'^(09\d{9}|\+639\d{9})$', number):
+        raise ValidationError("❌ Invalid number. Use format 09XXXXXXXXX or +639XXXXXXXXX.")
+
+
+def is_duplicate_name(event, first, last, email, exclude_pk=None):
+    """Whether the name is already registered for the event under another email (indexed lookup)."""
+    first = normalize_name(first)
+    last = normalize_name(last)
+    if not (first and last):
+        return False
+
+    emails = set(
+        Runner.objects
+        .filter(event=event, normalized_last_name=last, normalized_first_name=first)
+        .exclude(pk=exclude_pk)
+        .values_list('normalized_email', flat=True)
+    )
+    return bool(emails - {normalize_name(email)})
+
+
 class DebugExportForm(forms.Form):
     event = forms.ModelChoiceField(
         queryset=Event.objects.all(),
@@ -53,17 +81,11 @@ class RunnerRegistrationForm(forms.ModelForm):
 
 
     def clean_email(self):
-        email = self.cleaned_data.get('email', '').strip().lower()
-        event = self.cleaned_data.get('event')
-
-        if event and Runner.objects.filter(email=email, event=event).exists():
-            raise ValidationError("❌ This email is already registered for this event.")
-        return email
+        return self.cleaned_data.get('email', '').strip().lower()
 
     def clean_contact_number(self):
         number = self.cleaned_data.get('contact_number', '').strip()
-        if not re.match(r'^(09\d{9}|\+639\d{9})$', number):
-            raise forms.ValidationError("❌ Invalid number. Use format 09XXXXXXXXX or +639XXXXXXXXX.")
+        validate_contact_number(number)
         return number
 
     def clean_proof_of_payment(self):
@@ -71,7 +93,7 @@ class RunnerRegistrationForm(forms.ModelForm):
         if file:
             if not file.content_type.startswith('image/'):
                 raise ValidationError("❌ Only image files are allowed (JPG, PNG, etc).")
-            if file.size > 5 * 1024 * 1024:
+            if file.size > MAX_RECEIPT_SIZE:
                 raise ValidationError("❌ File size must be under 5MB.")
         return file
 
@@ -85,22 +107,35 @@ class RunnerRegistrationForm(forms.ModelForm):
         if event and event.registration_deadline:
             today = date.today()
             if today > event.registration_deadline:
-                raise ValidationError("❌ Registration for this event has closed.")
+                raise ValidationError(REGISTRATION_CLOSED_MESSAGE)
 
     
-        if first and last and event:
-            existing = Runner.objects.filter(
-                first_name__iexact=first.strip(),
-                last_name__iexact=last.strip(),
-                event=event
-            )
-            for runner in existing:
-                if runner.email.lower() != email:
-                    raise forms.ValidationError(
-                        "⚠️ This person is already registered for this event with a different email."
-                    )
+        if event and first and last:
+            self.check_duplicates(event, first, last, email)
         return cleaned_data
 
+    def check_duplicates(self, event, first, last, email):
+        """
+        Flags a name that is already registered for the event under another
+        email. A repeated email is left to the database constraint (see
+        try_save).
+        """
+        if is_duplicate_name(event, first, last, email, exclude_pk=self.instance.pk):
+            raise forms.ValidationError(DUPLICATE_NAME_MESSAGE)
+
+    def try_save(self):
+        """
+        Saves the runner, turning a per-event duplicate email rejected by the
+        database into a form error. Returns the runner, or None on duplicate.
+        """
+        try:
+            with transaction.atomic():
+                return self.save()
+        except IntegrityError as exc:
+            if not Runner.is_duplicate_email_error(exc):
+                raise
+            self.add_error('email', DUPLICATE_EMAIL_MESSAGE)
+            return None
 
 
 class RunnerExportForm(forms.Form):
@@ -151,6 +186,18 @@ class RunnerExportForm(forms.Form):
         label="Age Category"
     )
 
+    export_type = forms.ChoiceField(
+        choices=[('xlsx', 'XLSX (styled workbook)'), ('csv', 'CSV'), ('jsonl', 'JSON Lines')],
+        required=False,
+        initial='xlsx',
+        label="Format"
+    )
+
+    include_receipts = forms.BooleanField(
+        required=False,
+        label="Include receipt thumbnails (XLSX only)"
+    )
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         today = date.today()
@@ -207,6 +254,47 @@ class DistanceForm(forms.ModelForm):
         numeric_label = match.group(1)  # "5" from "5K", "10" from "10 KM"
         return numeric_label
 
+class BulkVerifyForm(forms.Form):
+    event = forms.ModelChoiceField(queryset=Event.objects.all())
+    runner_ids = forms.ModelMultipleChoiceField(queryset=Runner.objects.all(), required=False)
+    select_all = forms.BooleanField(required=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('select_all') and not cleaned_data.get('runner_ids'):
+            raise ValidationError("❌ Select at least one runner to verify.")
+        return cleaned_data
+
+    def get_runners(self):
+        """Unverified runners of the event that this submission targets."""
+        cd = self.cleaned_data
+        runners = Runner.objects.filter(event=cd['event'], is_verified=False)
+        if not cd['select_all']:
+            runners = runners.filter(pk__in=cd['runner_ids'].values('pk'))
+        return runners
+
+
+class RunnerImportForm(forms.Form):
+    event = forms.ModelChoiceField(
+        queryset=Event.objects.all(),
+        label="Event",
+        empty_label="Select an event"
+    )
+    file = forms.FileField(
+        label="CSV or XLSX file",
+        help_text="Header row with First Name, Last Name, Email, Contact Number, Distance, Age, Gender and Shirt Size."
+    )
+    allocate_bibs = forms.BooleanField(required=False, label="Assign bibs to verified runners")
+    send_emails = forms.BooleanField(required=False, label="Send Registration Received emails")
+    dry_run = forms.BooleanField(required=False, label="Dry run (validate only)")
+
+    def clean_file(self):
+        upload = self.cleaned_data['file']
+        if not upload.name.lower().endswith(('.csv', '.xlsx', '.xlsm')):
+            raise ValidationError("❌ Upload a .csv or .xlsx file.")
+        return upload
+
+
 class EventSelectForm(forms.Form):
     AGE_CATEGORY_CHOICES = [
         ('', '—'),
@@ -251,7 +339,7 @@ class EventSelectForm(forms.Form):
 
     search = forms.CharField(
         required=False,
-        label="Search Name",
+        label="Search Name, Email or Bib",
         widget=forms.TextInput(attrs={"placeholder": "e.g. Juan Dela Cruz"})
     )
 
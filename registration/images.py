@@ -0,0 +1,126 @@
+import os
+from io import BytesIO
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+# Receipts only need to stay readable, phone photos are far larger than that
+RECEIPT_MAX_SIZE = (1600, 1600)
+RECEIPT_QUALITY = 82
+THUMBNAIL_SIZE = (160, 160)
+THUMBNAIL_QUALITY = 70
+THUMBNAIL_DIR = 'receipts/thumbs'
+# Decoding is refused above this: ~120MB as RGB, and the header can claim far more
+MAX_RECEIPT_PIXELS = 40_000_000
+
+# Size the stored thumbnails are shown at in XLSX exports
+EXPORT_THUMBNAIL_SIZE = (96, 96)
+
+
+def _normalize(image):
+    """Returns the image upright (EXIF orientation applied) as plain RGB."""
+    image = ImageOps.exif_transpose(image)
+
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        # Flatten screenshots with transparency onto white instead of black
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _encode(image, size, quality):
+    copy = image.copy()
+    copy.thumbnail(size, Image.LANCZOS)
+    output = BytesIO()
+    # No exif= argument, so location and camera metadata are dropped
+    copy.save(output, 'JPEG', quality=quality, optimize=True, progressive=True)
+    return output.getvalue()
+
+
+def _load(fileobj):
+    """Opens and decodes an image, checking the declared size before any pixels are read."""
+    with Image.open(fileobj) as original:
+        width, height = original.size
+        if width * height > MAX_RECEIPT_PIXELS:
+            raise ValueError(f"Image is too large to process ({width}x{height}).")
+        original.load()
+        return _normalize(original)
+
+
+def render_receipt(fileobj):
+    """
+    Returns (receipt_bytes, thumbnail_bytes), both JPEG, for an uploaded image.
+    Raises OSError/UnidentifiedImageError/ValueError if it can't be decoded.
+    """
+    image = _load(fileobj)
+    return (
+        _encode(image, RECEIPT_MAX_SIZE, RECEIPT_QUALITY),
+        _encode(image, THUMBNAIL_SIZE, THUMBNAIL_QUALITY),
+    )
+
+
+def receipt_basename(name):
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return f"{stem}.jpg"
+
+
+def process_receipt(runner):
+    """
+    Replaces a runner's freshly uploaded (uncommitted) proof_of_payment with a
+    recompressed JPEG and attaches a thumbnail. The files are written by the
+    model save that follows. Undecodable files are left untouched.
+    """
+    upload = runner.proof_of_payment
+    try:
+        upload.seek(0)
+        receipt, thumbnail = render_receipt(upload)
+    except (OSError, UnidentifiedImageError, ValueError):
+        return False
+
+    name = receipt_basename(upload.name)
+    runner.proof_of_payment = ContentFile(receipt, name=name)
+    runner.proof_thumbnail = ContentFile(thumbnail, name=name)
+    return True
+
+
+def process_stored_receipt(name):
+    """
+    Process-pool worker for the backfill command: re-encodes an already stored
+    receipt and writes its thumbnail. Returns (name, new_name, thumbnail_name),
+    or None when the file is missing or not a readable image. The original is
+    left in place; the caller deletes it once the new names are saved.
+    """
+    try:
+        with default_storage.open(name, 'rb') as stored:
+            receipt, thumbnail = render_receipt(stored)
+    except (OSError, UnidentifiedImageError, ValueError):
+        return None
+
+    basename = receipt_basename(name)
+    directory = os.path.dirname(name)
+    new_name = default_storage.save(os.path.join(directory, basename), ContentFile(receipt))
+    thumbnail_name = default_storage.save(os.path.join(THUMBNAIL_DIR, basename), ContentFile(thumbnail))
+    return name, new_name, thumbnail_name
+
+
+def store_shared_receipt(upload, directory='receipts'):
+    """
+    Saves one uploaded receipt (recompressed, with a thumbnail) for several
+    runners to point at. Returns (receipt_name, thumbnail_name); the
+    thumbnail is '' when the upload couldn't be decoded and is stored as-is.
+    """
+    try:
+        upload.seek(0)
+        receipt, thumbnail = render_receipt(upload)
+    except (OSError, UnidentifiedImageError, ValueError):
+        upload.seek(0)
+        return default_storage.save(os.path.join(directory, os.path.basename(upload.name)), upload), ''
+
+    basename = receipt_basename(upload.name)
+    return (
+        default_storage.save(os.path.join(directory, basename), ContentFile(receipt)),
+        default_storage.save(os.path.join(THUMBNAIL_DIR, basename), ContentFile(thumbnail)),
+    )
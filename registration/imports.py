@@ -0,0 +1,308 @@
+import csv
+import io
+import os
+import re
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .forms import DUPLICATE_EMAIL_MESSAGE
+from .models import (
+    Runner,
+    allocate_bib_numbers,
+    catch_up_bib_counter,
+    create_runners,
+    format_bib_number,
+)
+from .serializers import GroupRunnerSerializer, check_runner_batch
+
+CHUNK_SIZE = 500
+TRUE_VALUES = {'1', 'y', 'yes', 'true', 'verified', 'paid'}
+GENDER_ALIASES = {'male': 'M', 'm': 'M', 'female': 'F', 'f': 'F'}
+
+# Columns besides the GroupRunnerSerializer fields
+EXTRA_COLUMNS = ('is_verified', 'bib_number')
+
+
+class RunnerImportError(Exception):
+    """The file as a whole can't be imported (bad format, missing columns)."""
+
+
+class ImportResult:
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.created = 0
+        self.bibs_allocated = 0
+        self.errors = []  # [(line number, {field: [messages]})]
+
+    @property
+    def rejected(self):
+        return len(self.errors)
+
+
+def _column_aliases():
+    # "First Name", "first_name" and the model's verbose name all map to first_name
+    aliases = {}
+    for name in list(GroupRunnerSerializer.Meta.fields) + list(EXTRA_COLUMNS):
+        aliases[name] = name
+        aliases[name.replace('_', ' ')] = name
+        field = Runner._meta.get_field(name)
+        aliases[str(field.verbose_name).lower()] = name
+    aliases['verified'] = 'is_verified'
+    aliases['bib'] = 'bib_number'
+    return aliases
+
+
+def required_columns():
+    # Whatever the serializer would reject a row for lacking, checked once for the file
+    return {name for name, field in GroupRunnerSerializer().fields.items() if field.required}
+
+
+def _map_headers(headers):
+    aliases = _column_aliases()
+    columns = [aliases.get(" ".join(str(h or '').split()).lower()) for h in headers]
+    missing = required_columns() - set(columns)
+    if missing:
+        raise RunnerImportError(f"Missing column(s): {', '.join(sorted(missing))}")
+    return columns
+
+
+def _iter_csv(fileobj):
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    reader = csv.reader(text)
+    try:
+        columns = _map_headers(next(reader))
+    except StopIteration:
+        raise RunnerImportError("The file is empty.")
+    for line, values in enumerate(reader, start=2):
+        yield line, values, columns
+
+
+def _iter_xlsx(fileobj):
+    from openpyxl import load_workbook
+
+    # read_only streams rows from the zip instead of loading the whole sheet
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        try:
+            columns = _map_headers(next(rows))
+        except StopIteration:
+            raise RunnerImportError("The sheet is empty.")
+        for line, values in enumerate(rows, start=2):
+            yield line, values, columns
+    finally:
+        workbook.close()
+
+
+def iter_rows(fileobj, name):
+    """Yields (line number, {column: value}) for each non-blank row of a CSV or XLSX file."""
+    extension = os.path.splitext(name)[1].lower()
+    if extension == '.csv':
+        rows = _iter_csv(fileobj)
+    elif extension in ('.xlsx', '.xlsm'):
+        rows = _iter_xlsx(fileobj)
+    else:
+        raise RunnerImportError("Upload a .csv or .xlsx file.")
+
+    for line, values, columns in rows:
+        row = {
+            column: value for column, value in zip(columns, values)
+            if column and value not in (None, '')
+        }
+        if row:
+            yield line, row
+
+
+def _cell_text(value):
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _clean_row(row, distances):
+    """Turns a raw row into GroupRunnerSerializer data plus (is_verified, bib_number)."""
+    data = {column: _cell_text(value) for column, value in row.items()}
+
+    label = data.get('distance', '')
+    label = label[:-2].strip() if label.lower().endswith('km') else label
+    distance = distances.get(label.lower())
+    data['distance'] = distance.pk if distance else -1
+
+    if 'gender' in data:
+        data['gender'] = GENDER_ALIASES.get(data['gender'].lower(), data['gender'])
+    if 'shirt_size' in data:
+        data['shirt_size'] = data['shirt_size'].upper()
+
+    # Spreadsheets store 09XXXXXXXXX as a number and drop the leading zero
+    number = data.get('contact_number', '')
+    if len(number) == 10 and number.startswith('9') and number.isdigit():
+        data['contact_number'] = f"0{number}"
+
+    is_verified = data.pop('is_verified', '').lower() in TRUE_VALUES
+    bib_number = data.pop('bib_number', '')
+    return data, is_verified, bib_number
+
+
+def import_runners(event, fileobj, name, allocate_bibs=False, send_emails=False, dry_run=False):
+    """
+    Imports runners for `event` from a CSV/XLSX file object. Rows are read as
+    a stream and handled CHUNK_SIZE at a time: field rules as in
+    RunnerRegistrationForm, duplicate checks as one query per chunk (see
+    check_runner_batch) and a bulk_create per chunk. Invalid rows are
+    skipped and reported, bad bibs included (see check_bibs). With
+    allocate_bibs, verified runners without a bib get one, reserved as a
+    single block per distance once all rows are in.
+    Everything runs in one transaction; dry_run rolls it back.
+    """
+    result = ImportResult(dry_run=dry_run)
+    distances = {str(d.label).strip().lower(): d for d in event.distances.all()}
+    by_pk = {d.pk: d for d in distances.values()}
+    needs_bib = {}  # distance pk -> [runner]
+    with_bibs = set()  # distance pks that had bibs in the file
+    seen_bibs = set()  # (distance pk, bib) given so far
+
+    rows = iter_rows(fileobj, name)
+    try:
+        with transaction.atomic():
+            while True:
+                chunk = list(islice(rows, CHUNK_SIZE))
+                if not chunk:
+                    break
+
+                cleaned = [(line, *_clean_row(row, distances)) for line, row in chunk]
+                data, errors = [], []
+                for line, row, is_verified, bib in cleaned:
+                    serializer = GroupRunnerSerializer(data=row)
+                    valid = serializer.is_valid()
+                    data.append(serializer.validated_data if valid else None)
+                    errors.append({} if valid else dict(serializer.errors))
+
+                check_runner_batch(event, data, errors)
+                bibs = [
+                    bib if is_verified and valid else None
+                    for (_, _, is_verified, bib), valid in zip(cleaned, data)
+                ]
+                check_bibs(event, by_pk, data, bibs, errors, seen_bibs)
+
+                pending = []
+                for (line, _, is_verified, _), row, bib, row_errors in zip(cleaned, data, bibs, errors):
+                    if row_errors:
+                        result.errors.append((line, row_errors))
+                        continue
+                    distance = by_pk[row['distance']]
+                    runner = Runner(
+                        **{**row, 'distance': distance},
+                        event=event,
+                        is_verified=is_verified,
+                        bib_number=bib or None,
+                    )
+                    pending.append((line, runner))
+
+                for runner in _create_chunk(pending, send_emails, result):
+                    if runner.bib_number:
+                        with_bibs.add(runner.distance_id)
+                    elif allocate_bibs and runner.is_verified:
+                        needs_bib.setdefault(runner.distance_id, []).append(runner)
+
+            # Bibs that came in the file must never be handed out again
+            for distance_pk in with_bibs | set(needs_bib):
+                catch_up_bib_counter(by_pk[distance_pk])
+            result.bibs_allocated = _allocate_bibs(needs_bib, by_pk)
+
+            if dry_run:
+                transaction.set_rollback(True)
+    finally:
+        rows.close()
+
+    result.errors.sort(key=lambda error: error[0])
+    return result
+
+
+def _create_chunk(pending, send_emails, result):
+    """
+    create_runners for one chunk of (line, runner). If someone registered one
+    of these emails after check_runner_batch looked, the unique constraint
+    fails the bulk insert; the chunk is then inserted row by row so only the
+    clashing rows are reported. Returns the runners created.
+    """
+    runners = [runner for _, runner in pending]
+    try:
+        with transaction.atomic():
+            create_runners(runners, send_emails=send_emails)
+    except IntegrityError as exc:
+        if not Runner.is_duplicate_email_error(exc):
+            raise
+    else:
+        result.created += len(runners)
+        return runners
+
+    created = []
+    for line, runner in pending:
+        try:
+            with transaction.atomic():
+                create_runners([runner], send_emails=send_emails)
+        except IntegrityError as exc:
+            if not Runner.is_duplicate_email_error(exc):
+                raise
+            result.errors.append((line, {'email': [DUPLICATE_EMAIL_MESSAGE]}))
+        else:
+            created.append(runner)
+    result.created += len(created)
+    return created
+
+
+def check_bibs(event, distances, data, bibs, errors, seen):
+    """
+    Bibs given in the file must be written as one of the row's distance's
+    bibs ('5 - 0007', '5-7') and be free: not used by another runner and not
+    repeated in the file (`seen` carries them across chunks). Valid bibs are
+    rewritten in place in the standard format; bad ones become row errors.
+    """
+    for i, (row, bib) in enumerate(zip(data, bibs)):
+        if not bib:
+            continue
+        distance = distances.get(row['distance'])
+        if distance is None:  # Already an error: not a distance of this event
+            bibs[i] = None
+            continue
+        match = re.fullmatch(rf"{re.escape(str(distance.label).strip())}\s*-\s*(\d{{1,4}})", bib.strip())
+        if not match or not int(match.group(1)):
+            errors[i]['bib_number'] = [f"❌ Bib must look like '{format_bib_number(distance, 7)}' for this distance."]
+            bibs[i] = None
+        else:
+            bibs[i] = format_bib_number(distance, int(match.group(1)))
+
+    wanted = {(data[i]['distance'], bib) for i, bib in enumerate(bibs) if bib}
+    taken = set(
+        Runner.objects.filter(
+            event=event,
+            distance_id__in={distance for distance, _ in wanted},
+            bib_number__in={bib for _, bib in wanted},
+        ).values_list('distance_id', 'bib_number')
+    ) if wanted else set()
+
+    for i, bib in enumerate(bibs):
+        if not bib:
+            continue
+        key = (data[i]['distance'], bib)
+        if key in taken or key in seen:
+            errors[i]['bib_number'] = ["❌ This bib is already taken."]
+        elif not errors[i]:
+            seen.add(key)
+
+
+def _allocate_bibs(needs_bib, distances):
+    now = timezone.now()
+    assigned = []
+    for distance_pk, runners in needs_bib.items():
+        distance = distances[distance_pk]
+        for runner, number in zip(runners, allocate_bib_numbers(distance, count=len(runners))):
+            runner.bib_number = format_bib_number(distance, number)
+            runner.updated_at = now
+            runner.normalize()
+            assigned.append(runner)
+
+    Runner.objects.bulk_update(assigned, ['bib_number', 'search_document', 'updated_at'], batch_size=500)
+    return len(assigned)
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from registration.models import Distance, catch_up_bib_counter
+
+
+class Command(BaseCommand):
+    help = "Seed per-distance bib counters from existing bib_number values."
+
+    def handle(self, *args, **options):
+        for distance in Distance.objects.select_related('event'):
+            counter = catch_up_bib_counter(distance)
+            self.stdout.write(f"{distance}: last bib {counter.last_number}")
@@ -0,0 +1,53 @@
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from registration.models import Event
+from registration.results import ResultsImportError, import_timing_reads
+
+
+class Command(BaseCommand):
+    help = "Ingest a timing-mat CSV export for an event and re-rank its results."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV with bib and time columns; without a location/point column the reads are from one shared start/finish mat.")
+        parser.add_argument('--event', type=int, required=True, help="Event id.")
+        parser.add_argument(
+            '--gun-start', action='append', default=[], metavar='LABEL=HH:MM:SS',
+            help="Gun time for a distance on the event date, e.g. 21=05:00:00 (repeatable).",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            event = Event.objects.get(pk=options['event'])
+        except Event.DoesNotExist:
+            raise CommandError(f"No event with id {options['event']}.")
+
+        distances = {str(d.label).strip(): d for d in event.distances.all()}
+        gun_starts = {}
+        for value in options['gun_start']:
+            label, _, clock = value.partition('=')
+            if label.strip() not in distances:
+                raise CommandError(f"No {label} KM distance in {event.name}.")
+            try:
+                moment = datetime.combine(event.date, time.fromisoformat(clock.strip()))
+            except ValueError:
+                raise CommandError(f"Bad gun time {clock!r}; use HH:MM:SS.")
+            gun_starts[distances[label.strip()]] = timezone.make_aware(moment)
+
+        try:
+            with open(options['path'], 'rb') as fileobj:
+                summary = import_timing_reads(event, fileobj, gun_starts=gun_starts)
+        except (OSError, ResultsImportError) as exc:
+            raise CommandError(str(exc))
+
+        if summary.unknown_bibs:
+            unknown = ", ".join(sorted(summary.unknown_bibs)[:20])
+            self.stderr.write(f"{len(summary.unknown_bibs)} unknown bibs ignored: {unknown}")
+        if summary.bad_rows:
+            self.stderr.write(f"{len(summary.bad_rows)} rows with an unreadable time, e.g. line {summary.bad_rows[0]}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary.reads} reads for {summary.runners} runners; "
+            f"{summary.finishers} finishers ranked in {event.name}."
+        ))
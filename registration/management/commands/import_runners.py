@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from registration.imports import RunnerImportError, import_runners
+from registration.models import Event
+
+
+class Command(BaseCommand):
+    help = "Import runners for an event from a CSV or XLSX file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or XLSX file with a header row.")
+        parser.add_argument('--event', type=int, required=True, help="Event id to register the runners for.")
+        parser.add_argument('--allocate-bibs', action='store_true', help="Give verified runners without a bib one.")
+        parser.add_argument('--send-emails', action='store_true', help="Queue the Registration Received emails.")
+        parser.add_argument('--dry-run', action='store_true', help="Validate everything, then roll back.")
+        parser.add_argument('--show-errors', type=int, default=20, help="How many rejected rows to list.")
+
+    def handle(self, *args, **options):
+        try:
+            event = Event.objects.get(pk=options['event'])
+        except Event.DoesNotExist:
+            raise CommandError(f"No event with id {options['event']}.")
+
+        started = time.monotonic()
+        try:
+            with open(options['path'], 'rb') as fileobj:
+                result = import_runners(
+                    event,
+                    fileobj,
+                    options['path'],
+                    allocate_bibs=options['allocate_bibs'],
+                    send_emails=options['send_emails'],
+                    dry_run=options['dry_run'],
+                )
+        except (OSError, RunnerImportError) as exc:
+            raise CommandError(str(exc))
+
+        for line, errors in result.errors[:options['show_errors']]:
+            details = "; ".join(f"{field}: {' '.join(map(str, messages))}" for field, messages in errors.items())
+            self.stderr.write(f"Line {line}: {details}")
+
+        prefix = "Dry run: would import" if result.dry_run else "Imported"
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix} {result.created} runners into {event.name} "
+            f"({result.rejected} rejected, {result.bibs_allocated} bibs allocated) "
+            f"in {time.monotonic() - started:.1f}s."
+        ))
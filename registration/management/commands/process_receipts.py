@@ -0,0 +1,67 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.db.models import Q
+
+from registration.images import process_stored_receipt
+from registration.models import Runner
+
+
+class Command(BaseCommand):
+    help = "Recompress stored receipts and generate their thumbnails using a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--all', action='store_true', help="Reprocess receipts that already have a thumbnail.")
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        runners = Runner.objects.exclude(proof_of_payment='')
+        if not options['all']:
+            runners = runners.filter(Q(proof_thumbnail__isnull=True) | Q(proof_thumbnail=''))
+        pending = list(runners.values_list('pk', 'proof_of_payment'))
+
+        if not pending:
+            self.stdout.write("No receipts to process.")
+            return
+
+        # Workers only touch storage; don't let them inherit open DB sockets
+        connections.close_all()
+
+        processed = skipped = 0
+        updates = []
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as pool:
+            names = [name for _, name in pending]
+            results = pool.map(process_stored_receipt, names, chunksize=8)
+            for (pk, _), result in zip(pending, results):
+                if result is None:
+                    skipped += 1
+                    continue
+                old_name, new_name, thumbnail_name = result
+                updates.append((old_name, Runner(pk=pk, proof_of_payment=new_name, proof_thumbnail=thumbnail_name)))
+                processed += 1
+
+                if len(updates) >= options['batch_size']:
+                    self.save_batch(updates)
+                    updates = []
+
+        if updates:
+            self.save_batch(updates)
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} receipts, skipped {skipped}."))
+
+    def save_batch(self, updates):
+        # Originals are only removed once the runners point at the new files
+        replaced = [old for old, runner in updates if old != runner.proof_of_payment.name]
+
+        def delete_originals():
+            for name in replaced:
+                default_storage.delete(name)
+
+        with transaction.atomic():
+            Runner.objects.bulk_update([runner for _, runner in updates], ['proof_of_payment', 'proof_thumbnail'])
+            transaction.on_commit(delete_originals)
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from registration.models import reconcile_runner_counts
+
+
+class Command(BaseCommand):
+    help = "Recompute the registered/verified counters on events and distances from the runner table."
+
+    def handle(self, *args, **options):
+        fixed = reconcile_runner_counts()
+        if fixed:
+            self.stdout.write(self.style.WARNING(f"Corrected {fixed} events/distances."))
+        else:
+            self.stdout.write(self.style.SUCCESS("All counters are accurate."))
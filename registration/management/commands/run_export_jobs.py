@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from registration.exports import claim_export_job, purge_expired_exports, run_export_job
+
+
+class Command(BaseCommand):
+    help = "Build queued XLSX exports (run with --loop as a background worker)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep polling for jobs instead of exiting.")
+        parser.add_argument('--interval', type=float, default=2.0, help="Seconds to sleep when the queue is empty.")
+
+    def handle(self, *args, **options):
+        purged = purge_expired_exports()
+        if purged:
+            self.stdout.write(f"Purged {purged} expired exports")
+
+        while True:
+            close_old_connections()  # Long-lived worker: no request cycle to do it
+            job = claim_export_job()
+            if job is not None:
+                try:
+                    run_export_job(job)
+                except Exception as exc:
+                    # Already recorded on the job; keep the worker alive
+                    self.stderr.write(f"Export {job.pk} failed: {exc}")
+                else:
+                    self.stdout.write(f"Export {job.pk}: {job.status}, {job.rows_done} rows")
+                continue
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+            purge_expired_exports()
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from registration.outbox import send_queued_emails
+
+
+class Command(BaseCommand):
+    help = "Send queued emails from the outbox (run with --loop as a background worker)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--loop', action='store_true', help="Keep polling the outbox instead of exiting.")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds to sleep when the outbox is empty.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        while True:
+            # No request cycle here to drop dead or over-age connections for us
+            close_old_connections()
+            sent, failed = send_queued_emails(batch_size=batch_size)
+            if sent or failed:
+                self.stdout.write(f"Sent {sent}, failed {failed}")
+
+            # A full batch means there is probably more waiting
+            if sent + failed >= batch_size:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from registration.models import SheetSync
+from registration.sheets import SheetsClient, sync_sheet
+
+
+class Command(BaseCommand):
+    help = "Push new and changed runners to their Google Sheets (run with --loop as a periodic worker)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep syncing every --interval seconds.")
+        parser.add_argument('--interval', type=float, default=300.0, help="Seconds between sync rounds.")
+        parser.add_argument('--sync', type=int, action='append', help="Only this SheetSync id (repeatable).")
+        parser.add_argument('--full', action='store_true', help="Rewrite every row, ignoring the watermark.")
+
+    def handle(self, *args, **options):
+        client = None  # Credentials are only loaded once there is something to sync
+        full = options['full']
+
+        while True:
+            close_old_connections()  # Long-lived worker: no request cycle to do it
+            syncs = SheetSync.objects.select_related('event').order_by('pk')
+            if options['sync']:
+                syncs = syncs.filter(pk__in=options['sync'])
+
+            for sync in syncs:
+                if client is None:
+                    try:
+                        client = SheetsClient()
+                    except OSError as exc:
+                        raise CommandError(f"Can't load the Google credentials: {exc}")
+                try:
+                    written = sync_sheet(sync, client=client, full=full)
+                except Exception as exc:
+                    # Recorded on the sync; the next round retries from the same watermark
+                    self.stderr.write(f"Sheet sync {sync.pk} failed: {exc}")
+                else:
+                    if written:
+                        self.stdout.write(f"{sync}: {written} rows written")
+
+            if not options['loop']:
+                break
+            full = False  # Only the first round
+            time.sleep(options['interval'])
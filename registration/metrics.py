@@ -0,0 +1,80 @@
+from datetime import date, timedelta
+from functools import cache
+
+from django.core.cache import cache as django_cache
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.urls import reverse
+
+from .models import Distance, Event, Runner, runners_bulk_changed
+
+DASHBOARD_METRICS_KEY = 'registration:dashboard-metrics'
+DASHBOARD_METRICS_TIMEOUT = 300  # Safety net for writes that skip signals (bulk updates, raw SQL)
+
+
+def _per_event_total(queryset):
+    # SUM over events of a correlated COUNT, so all metrics fit in one SELECT
+    per_event = (
+        queryset.filter(event=OuterRef('pk')).order_by()
+        .values('event').annotate(total=Count('pk')).values('total')
+    )
+    return Coalesce(Sum(Subquery(per_event, output_field=IntegerField())), 0)
+
+
+def compute_dashboard_metrics(today=None):
+    today = today or date.today()
+    return Event.objects.aggregate(
+        event_count=Count('pk'),
+        upcoming_week=Count('pk', filter=Q(date__gte=today, date__lte=today + timedelta(days=7))),
+        distance_count=_per_event_total(Distance.objects.all()),
+        # Runner totals come from the counters maintained on each event
+        runner_count=Coalesce(Sum('registered_count'), 0),
+        unverified=Coalesce(Sum(F('registered_count') - F('verified_count')), 0),
+    )
+
+
+def dashboard_metrics():
+    """Dashboard counts, cached until an Event, Distance or Runner changes."""
+    today = date.today()
+    metrics = django_cache.get(DASHBOARD_METRICS_KEY)
+    # upcoming_week depends on the date, so a cached value from yesterday is stale
+    if metrics is None or metrics['computed_on'] != today:
+        metrics = compute_dashboard_metrics(today)
+        metrics['computed_on'] = today
+        django_cache.set(DASHBOARD_METRICS_KEY, metrics, DASHBOARD_METRICS_TIMEOUT)
+    return metrics
+
+
+@receiver([post_save, post_delete], sender=Event)
+@receiver([post_save, post_delete], sender=Distance)
+@receiver([post_save, post_delete], sender=Runner)
+@receiver(runners_bulk_changed)
+def invalidate_dashboard_metrics(**kwargs):
+    django_cache.delete(DASHBOARD_METRICS_KEY)
+
+
+@cache
+def dashboard_features():
+    """
+    Static part of the dashboard feature cards, built once per process.
+    'count_key' names the metric shown as a badge, if any.
+    """
+    cards = [
+        ('New Event', 'Create a new race event', 'fa-calendar-plus', 'add_event', None),
+        ('New Distance', 'Add a new distance/fee category', 'fa-route', 'add_distance', None),
+        ('New Runner', 'Manually register a runner', 'fa-user-plus', 'manual_runner', None),
+        ('Import Runners', 'Bulk register from CSV/XLSX', 'fa-file-import', 'import_runners', None),
+        ('Runners by Event', 'View runners by selected event', 'fa-list', 'runners_by_event', None),
+        ('Payment Stats', 'View verified vs pending counts', 'fa-chart-pie', 'verification_stats', None),
+        ('Current Events', 'Edit or delete upcoming races', 'fa-calendar-alt', 'current_events', None),
+        ('Export XLSX', 'Download full report with images', 'fa-file-excel', 'export_xlsx', None),
+        ('Edit Distances', 'Manage existing distance categories', 'fa-edit', 'edit_distances', None),
+        ('Race Check-in', 'Kit claim lookup by bib or name', 'fa-id-badge', 'checkin', None),
+        ('Verify Runners', 'Approve pending registrations', 'fa-check-circle', 'unverified_runners', 'unverified'),
+    ]
+    return tuple(
+        {'name': name, 'desc': desc, 'icon': icon, 'url': reverse(f'registration:{url_name}'), 'count_key': count_key}
+        for name, desc, icon, url_name, count_key in cards
+    )
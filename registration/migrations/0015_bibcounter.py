@@ -0,0 +1,21 @@
+# Generated by Django 5.1.6 on 2026-10-18 00:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registration', '0014_outgoingemail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BibCounter',
+            fields=[
+                ('distance', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='bib_counter', serialize=False, to='registration.distance')),
+                ('last_number', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 00:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registration', '0015_bibcounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='runner',
+            name='proof_thumbnail',
+            field=models.ImageField(blank=True, null=True, upload_to='receipts/thumbs/'),
+        ),
+    ]
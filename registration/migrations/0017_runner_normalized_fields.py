@@ -0,0 +1,56 @@
+# Generated by Django 5.1.6 on 2026-10-18 00:28
+
+from django.db import migrations, models
+
+
+def normalize(value):
+    return " ".join((value or "").split()).lower()
+
+
+def populate_normalized_fields(apps, schema_editor):
+    Runner = apps.get_model('registration', 'Runner')
+    runners = []
+    for runner in Runner.objects.only('first_name', 'last_name', 'email').iterator(chunk_size=1000):
+        runner.normalized_first_name = normalize(runner.first_name)
+        runner.normalized_last_name = normalize(runner.last_name)
+        runner.normalized_email = normalize(runner.email)
+        runners.append(runner)
+    Runner.objects.bulk_update(
+        runners,
+        ['normalized_first_name', 'normalized_last_name', 'normalized_email'],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registration', '0016_runner_proof_thumbnail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='runner',
+            name='normalized_email',
+            field=models.CharField(blank=True, editable=False, max_length=254),
+        ),
+        migrations.AddField(
+            model_name='runner',
+            name='normalized_first_name',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='runner',
+            name='normalized_last_name',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.RunPython(populate_normalized_fields, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='runner',
+            index=models.Index(fields=['event', 'normalized_last_name', 'normalized_first_name'], name='registratio_event_i_3240a9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='runner',
+            index=models.Index(fields=['event', 'normalized_email'], name='registratio_event_i_3dad44_idx'),
+        ),
+    ]
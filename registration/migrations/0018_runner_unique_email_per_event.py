@@ -0,0 +1,26 @@
+# Generated by Django 5.1.6 on 2026-10-18 00:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registration', '0017_runner_normalized_fields'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='runner',
+            name='registratio_event_i_3dad44_idx',
+        ),
+        migrations.AlterField(
+            model_name='runner',
+            name='email',
+            field=models.EmailField(max_length=254),
+        ),
+        migrations.AddConstraint(
+            model_name='runner',
+            constraint=models.UniqueConstraint(fields=('event', 'normalized_email'), name='unique_runner_email_per_event'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.6 on 2026-10-18 00:31
+
+from django.db import migrations, models
+
+
+def normalize(value):
+    return " ".join((value or "").split()).lower()
+
+
+def populate_search_document(apps, schema_editor):
+    Runner = apps.get_model('registration', 'Runner')
+    fields = ('first_name', 'last_name', 'email', 'bib_number')
+    runners = []
+    for runner in Runner.objects.only(*fields).iterator(chunk_size=1000):
+        runner.search_document = " ".join(
+            filter(None, (normalize(getattr(runner, f)) for f in fields))
+        )
+        runners.append(runner)
+    Runner.objects.bulk_update(runners, ['search_document'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registration', '0018_runner_unique_email_per_event'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='runner',
+            name='search_document',
+            field=models.CharField(blank=True, editable=False, max_length=500),
+        ),
+        # The pg_trgm / FTS5 index itself is created in 0031_runner_search_index
+        migrations.RunPython(populate_search_document, migrations.RunPython.noop),
+    ]
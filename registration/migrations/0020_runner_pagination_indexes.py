@@ -0,0 +1,21 @@
+# Generated by Django 5.1.6 on 2026-10-18 00:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registration', '0019_runner_search_document'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='runner',
+            index=models.Index(fields=['event', 'last_name', 'first_name', 'id'], name='registratio_event_i_5caf3a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='runner',
+            index=models.Index(fields=['event', 'is_verified', '-created_at', 'id'], name='registratio_event_i_c4f705_idx'),
+        ),
+    ]
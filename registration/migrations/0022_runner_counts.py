@@ -0,0 +1,51 @@
+# Generated by Django 5.1.6 on 2026-10-18 00:40
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_runner_counts(apps, schema_editor):
+    Runner = apps.get_model('registration', 'Runner')
+    for model_name, key in (('Event', 'event'), ('Distance', 'distance')):
+        model = apps.get_model('registration', model_name)
+
+        def total(**filters):
+            counts = (
+                Runner.objects.filter(**{key: OuterRef('pk')}, **filters).order_by()
+                .values(key).annotate(n=Count('pk')).values('n')
+            )
+            return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+        model.objects.update(registered_count=total(), verified_count=total(is_verified=True))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registration', '0021_exportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='distance',
+            name='registered_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='distance',
+            name='verified_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='registered_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='verified_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_runner_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.1.6 on 2026-10-18 00:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registration', '0022_runner_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SheetRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('row_number', models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SheetSync',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('spreadsheet_id', models.CharField(max_length=100)),
+                ('sheet_title', models.CharField(default='Sheet1', max_length=100)),
+                ('synced_until', models.DateTimeField(blank=True, null=True)),
+                ('next_row', models.PositiveIntegerField(default=2)),
+                ('last_synced_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='runner',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='runner',
+            index=models.Index(fields=['event', 'updated_at'], name='registratio_event_i_95f64e_idx'),
+        ),
+        migrations.AddField(
+            model_name='sheetrow',
+            name='runner',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='registration.runner'),
+        ),
+        migrations.AddField(
+            model_name='sheetsync',
+            name='event',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sheet_syncs', to='registration.event'),
+        ),
+        migrations.AddField(
+            model_name='sheetrow',
+            name='sync',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rows', to='registration.sheetsync'),
+        ),
+        migrations.AddConstraint(
+            model_name='sheetsync',
+            constraint=models.UniqueConstraint(fields=('spreadsheet_id', 'sheet_title'), name='unique_sheet_sync_tab'),
+        ),
+        migrations.AddConstraint(
+            model_name='sheetrow',
+            constraint=models.UniqueConstraint(fields=('sync', 'runner'), name='unique_sheet_row_runner'),
+        ),
+        migrations.AddConstraint(
+            model_name='sheetrow',
+            constraint=models.UniqueConstraint(fields=('sync', 'row_number'), name='unique_sheet_row_number'),
+        ),
+    ]
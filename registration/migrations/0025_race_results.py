@@ -0,0 +1,41 @@
+# Generated by Django 5.1.6 on 2026-10-18 00:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registration', '0024_runner_kit_claim'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='distance',
+            name='gun_start',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='RaceResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_read', models.DateTimeField(blank=True, null=True)),
+                ('finish_read', models.DateTimeField(blank=True, null=True)),
+                ('gun_time', models.DurationField(blank=True, null=True)),
+                ('chip_time', models.DurationField(blank=True, null=True)),
+                ('age_category', models.CharField(blank=True, max_length=10)),
+                ('overall_rank', models.PositiveIntegerField(blank=True, null=True)),
+                ('distance_rank', models.PositiveIntegerField(blank=True, null=True)),
+                ('gender_rank', models.PositiveIntegerField(blank=True, null=True)),
+                ('category_rank', models.PositiveIntegerField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('distance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='results', to='registration.distance')),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='results', to='registration.event')),
+                ('runner', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='result', to='registration.runner')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['event', 'distance', 'distance_rank'], name='registratio_event_i_a7a8ae_idx')],
+            },
+        ),
+    ]
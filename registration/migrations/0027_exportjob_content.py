@@ -0,0 +1,22 @@
+# Generated by Django 5.1.6 on 2026-10-18 01:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registration', '0026_cache_version'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='exportjob',
+            name='file',
+        ),
+        migrations.AddField(
+            model_name='exportjob',
+            name='content',
+            field=models.BinaryField(null=True),
+        ),
+    ]
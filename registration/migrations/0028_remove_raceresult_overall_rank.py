@@ -0,0 +1,17 @@
+# Generated by Django 5.1.6 on 2026-10-18 01:17
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registration', '0027_exportjob_content'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='raceresult',
+            name='overall_rank',
+        ),
+    ]
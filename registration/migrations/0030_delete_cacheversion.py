@@ -0,0 +1,16 @@
+# Generated by Django 5.1.6 on 2026-10-18 01:21
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registration', '0029_outgoingemail_sending'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='CacheVersion',
+        ),
+    ]
@@ -0,0 +1,107 @@
+import re
+
+from django.db import migrations
+
+RUNNER_TABLE = 'registration_runner'
+FTS_TABLE = f'{RUNNER_TABLE}_fts'
+TRIGRAM_INDEX = f'{RUNNER_TABLE}_search_trgm'
+
+# SQLite: external-content FTS5 table over Runner.search_document, kept in
+# sync by triggers. Prefix indexes make "jua" / "dela cr" style typing fast.
+SQLITE_FORWARD = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        search_document, content='{RUNNER_TABLE}', content_rowid='id', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {RUNNER_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, search_document) VALUES (new.id, new.search_document);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {RUNNER_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_document) VALUES ('delete', old.id, old.search_document);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF search_document ON {RUNNER_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_document) VALUES ('delete', old.id, old.search_document);
+        INSERT INTO {FTS_TABLE}(rowid, search_document) VALUES (new.id, new.search_document);
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+SQLITE_REVERSE = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+# Postgres: trigram GIN index, which also serves LIKE '%term%'.
+# The extension is left installed on reverse, other apps may use it.
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX IF NOT EXISTS {TRIGRAM_INDEX} ON {RUNNER_TABLE} USING gin (search_document gin_trgm_ops)",
+]
+POSTGRES_REVERSE = [
+    f"DROP INDEX IF EXISTS {TRIGRAM_INDEX}",
+]
+
+
+class VendorRunSQL(migrations.RunSQL):
+    """RunSQL that only runs on one database vendor."""
+
+    def __init__(self, vendor, *args, **kwargs):
+        self.vendor = vendor
+        super().__init__(*args, **kwargs)
+
+    def _applies(self, schema_editor):
+        if schema_editor.connection.vendor != self.vendor:
+            return False
+        if self.vendor == 'sqlite':
+            # SQLite built without FTS5: search falls back to LIKE
+            with schema_editor.connection.cursor() as cursor:
+                cursor.execute("PRAGMA compile_options")
+                return 'ENABLE_FTS5' in {row[0] for row in cursor.fetchall()}
+        return True
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if self._applies(schema_editor):
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if self._applies(schema_editor):
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+def bib_search_terms(bib):
+    parts = re.findall(r'\d+', bib or '')
+    if not parts:
+        return ''
+    full = "".join(parts)
+    return full if full == parts[-1] else f"{full} {parts[-1]}"
+
+
+def normalize(value):
+    return " ".join((value or "").split()).lower()
+
+
+def populate_search_document(apps, schema_editor):
+    # Bibs are now indexed by their digits ("5 - 0007" -> "50007 0007")
+    Runner = apps.get_model('registration', 'Runner')
+    fields = ('first_name', 'last_name', 'email')
+    runners = []
+    for runner in Runner.objects.only(*fields, 'bib_number').iterator(chunk_size=1000):
+        runner.search_document = " ".join(filter(None, (
+            *(normalize(getattr(runner, f)) for f in fields),
+            bib_search_terms(runner.bib_number),
+        )))
+        runners.append(runner)
+    Runner.objects.bulk_update(runners, ['search_document'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registration', '0030_delete_cacheversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_search_document, migrations.RunPython.noop),
+        VendorRunSQL('sqlite', SQLITE_FORWARD, SQLITE_REVERSE),
+        VendorRunSQL('postgresql', POSTGRES_FORWARD, POSTGRES_REVERSE),
+    ]
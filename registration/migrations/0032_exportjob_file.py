@@ -0,0 +1,22 @@
+# Generated by Django 5.1.6 on 2026-10-18 01:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registration', '0031_runner_search_index'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='exportjob',
+            name='content',
+        ),
+        migrations.AddField(
+            model_name='exportjob',
+            name='file',
+            field=models.FileField(blank=True, upload_to='exports/'),
+        ),
+    ]
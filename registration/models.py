@@ -1,13 +1,46 @@
-from django.db import models
-from django.core.mail import send_mail
-from django.db.models.signals import pre_save
-from django.dispatch import receiver
+import re
+from collections import Counter
+from datetime import timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.db.models.signals import post_delete, pre_save
+from django.dispatch import Signal, receiver
 from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.core.exceptions import ValidationError
 
+from .images import process_receipt
+
+# RunnerCounts: Registered/verified totals shared by Event and Distance
+class RunnerCounts(models.Model):
+    """
+    Denormalized runner totals, only ever changed with F() updates from
+    apply_runner_counts (or rebuilt by reconcile_runner_counts).
+    """
+    COUNTER_FIELDS = ('registered_count', 'verified_count')
+
+    registered_count = models.PositiveIntegerField(default=0, editable=False)
+    verified_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        # A plain save (e.g. from the edit forms) must not write back stale counts
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+
 # Event model: Represents a running event
-class Event(models.Model):
+class Event(RunnerCounts):
     name = models.CharField(max_length=255)  # Event name
     date = models.DateField()  # Event date
     description = models.TextField(blank=True, null=True)  # Optional description
@@ -18,14 +51,23 @@ class Event(models.Model):
         return f"{self.name} on {self.date}"  # String representation
 
 # Distance model: Represents a distance category for an event
-class Distance(models.Model):
+class Distance(RunnerCounts):
     event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='distances')  # Related event
     label = models.CharField(max_length=10)  # Distance label (e.g., "5", "21")
     fee = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)  # Optional fee
+    gun_start = models.DateTimeField(null=True, blank=True)  # Race start, for gun times (see results.py)
 
     def __str__(self):
         return f"{self.label} KM – {self.event.name}"  # String representation
 
+def normalize_name(value):
+    """
+    Lower-cases and collapses whitespace, so " Juan  Dela Cruz " matches "juan dela cruz".
+    Used for the indexed duplicate checks on Runner.
+    """
+    return " ".join((value or "").split()).lower()
+
+
 # Runner model: Represents a participant in an event
 class Runner(models.Model):
     GENDER_CHOICES = [
@@ -46,7 +88,7 @@ class Runner(models.Model):
     distance = models.ForeignKey(Distance, on_delete=models.CASCADE)  # Chosen distance
     first_name = models.CharField("First Name (with middle initial/name)", max_length=100)
     last_name = models.CharField("Last Name", max_length=100)
-    email = models.EmailField(unique=True)  # Unique email for each runner
+    email = models.EmailField()  # Unique per event (see Meta.constraints)
     contact_number = models.CharField(max_length=15)
     age = models.PositiveIntegerField()
     gender = models.CharField(max_length=1, choices=GENDER_CHOICES)
@@ -54,90 +96,419 @@ class Runner(models.Model):
     emergency_contact_name = models.CharField(max_length=100, blank=True, null=True)
     emergency_contact_number = models.CharField(max_length=15, blank=True, null=True)
     proof_of_payment = models.ImageField(upload_to='receipts/')  # Payment receipt image
+    proof_thumbnail = models.ImageField(upload_to='receipts/thumbs/', blank=True, null=True)  # Small preview for listings
     is_verified = models.BooleanField(default=False)  # Admin verification status
     created_at = models.DateTimeField(auto_now_add=True)  # Registration timestamp
     bib_number = models.CharField(max_length=20, blank=True, null=True)  # Optional bib number
+    updated_at = models.DateTimeField(auto_now=True)  # Last change; bulk writes must set it themselves
+    # Race-day kit pickup (see checkin.py)
+    kit_claimed_at = models.DateTimeField(null=True, blank=True)
+    kit_claimed_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='+'
+    )
+
+    # Normalized copies for duplicate lookups (kept in sync by save())
+    normalized_first_name = models.CharField(max_length=100, blank=True, editable=False)
+    normalized_last_name = models.CharField(max_length=100, blank=True, editable=False)
+    normalized_email = models.CharField(max_length=254, blank=True, editable=False)
+    # "first last email bib", indexed by the search backend (see search.py)
+    search_document = models.CharField(max_length=500, blank=True, editable=False)
+
+    NORMALIZED_FIELDS = {
+        'first_name': 'normalized_first_name',
+        'last_name': 'normalized_last_name',
+        'email': 'normalized_email',
+    }
+    SEARCH_FIELDS = ('first_name', 'last_name', 'email', 'bib_number')
+
+    DUPLICATE_EMAIL_CONSTRAINT = 'unique_runner_email_per_event'
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['event', 'normalized_last_name', 'normalized_first_name']),
+            # Keyset pagination orderings for runners_by_event / unverified_runners
+            models.Index(fields=['event', 'last_name', 'first_name', 'id']),
+            models.Index(fields=['event', 'is_verified', '-created_at', 'id']),
+            # Google Sheets sync: rows changed since the last watermark
+            models.Index(fields=['event', 'updated_at']),
+        ]
+        constraints = [
+            # Enforced by the database so concurrent sign-ups can't both get in
+            models.UniqueConstraint(
+                fields=['event', 'normalized_email'],
+                name='unique_runner_email_per_event',
+            ),
+        ]
+
+    @classmethod
+    def is_duplicate_email_error(cls, exc):
+        # Postgres names the constraint, SQLite lists the columns instead
+        message = str(exc)
+        return cls.DUPLICATE_EMAIL_CONSTRAINT in message or 'normalized_email' in message
 
     @property
     def full_name(self):
         # Returns the runner's full name in "Last, First" format
-        return f"{self.last_name}, {self.first_name}"   
+        return f"{self.last_name}, {self.first_name}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Snapshot the values as loaded so saves can tell what changed without a query
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
 
-    def generate_bib_number(distance):
+    def _snapshot(self):
+        self._loaded_values = {
+            f.attname: getattr(self, f.attname)
+            for f in self._meta.concrete_fields
+            if f.attname not in self.get_deferred_fields()
+        }
+
+    def get_dirty_fields(self):
         """
-        Generates the next available bib number for a given distance.
-        Format: "<distance_label> - 0001"
-        Example: "10 - 0007"
+        Returns {attname: loaded_value} for every field changed since load/save.
+        Unsaved instances have no snapshot and report nothing as dirty.
         """
-        prefix = str(distance.label).strip()
-        existing_bibs = (
-            Runner.objects
-            .filter(distance=distance, bib_number__startswith=f"{prefix} -")
-            .values_list('bib_number', flat=True)
+        loaded = getattr(self, '_loaded_values', {})
+        return {
+            name: old
+            for name, old in loaded.items()
+            if getattr(self, name) != old
+        }
+
+    def is_dirty(self, field_name=None):
+        dirty = self.get_dirty_fields()
+        if field_name is None:
+            return bool(dirty)
+        return self._meta.get_field(field_name).attname in dirty
+
+    def loaded_value(self, field_name, default=None):
+        # Value of a field as it was in the database when this instance was loaded
+        attname = self._meta.get_field(field_name).attname
+        return getattr(self, '_loaded_values', {}).get(attname, default)
+
+    @property
+    def proof_preview_url(self):
+        # Thumbnail when available, falling back to the full receipt
+        if self.proof_thumbnail:
+            return self.proof_thumbnail.url
+        if self.proof_of_payment:
+            return self.proof_of_payment.url
+        return ''
+
+    def normalize(self):
+        # Refresh the normalized lookup columns; call before bulk_create/bulk_update
+        for source, target in self.NORMALIZED_FIELDS.items():
+            setattr(self, target, normalize_name(getattr(self, source)))
+        self.search_document = " ".join(filter(None, (
+            bib_search_terms(self.bib_number) if f == 'bib_number' else normalize_name(getattr(self, f))
+            for f in self.SEARCH_FIELDS
+        )))
+
+    def save(self, *args, **kwargs):
+        self.normalize()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            extra = {self.NORMALIZED_FIELDS[f] for f in update_fields if f in self.NORMALIZED_FIELDS}
+            if update_fields & set(self.SEARCH_FIELDS):
+                extra.add('search_document')
+            kwargs['update_fields'] = update_fields | extra
+
+        # Recompress new receipt uploads and build their thumbnail before writing
+        if self.proof_of_payment and not self.proof_of_payment._committed:
+            if process_receipt(self) and kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = set(kwargs['update_fields']) | {'proof_thumbnail'}
+
+        changes = []
+        if self._state.adding:
+            changes.append((self.event_id, self.distance_id, 1, int(self.is_verified)))
+        else:
+            old = (self.loaded_value('event'), self.loaded_value('distance'), self.loaded_value('is_verified'))
+            new = (self.event_id, self.distance_id, self.is_verified)
+            if None not in old and old != new:
+                changes.append((old[0], old[1], -1, -int(old[2])))
+                changes.append((new[0], new[1], 1, int(new[2])))
+
+        # Counters move in the same transaction as the row itself
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            apply_runner_counts(changes)
+        self._snapshot()
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._snapshot()
+
+
+# BibCounter model: Last bib number handed out for a distance
+class BibCounter(models.Model):
+    distance = models.OneToOneField(Distance, on_delete=models.CASCADE, primary_key=True, related_name='bib_counter')
+    last_number = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.distance} – last bib {self.last_number}"
+
+
+# OutgoingEmail model: Durable outbox drained by the send_queued_emails command
+class OutgoingEmail(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'  # Claimed by a worker until next_attempt_at (see outbox.py)
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENDING, 'Sending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    MAX_ATTEMPTS = 6
+    RETRY_BASE_SECONDS = 60
+
+    to_email = models.EmailField()  # Recipient address
+    subject = models.CharField(max_length=255)
+    body = models.TextField()  # Plain text body
+    html_body = models.TextField(blank=True)  # Optional HTML alternative
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)  # Earliest (re)try; the lease end while sending
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['next_attempt_at', 'pk']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} → {self.to_email} ({self.status})"
+
+    def as_message(self, connection=None):
+        # Rebuilds the Django message object for the given (shared) connection
+        message = EmailMultiAlternatives(
+            subject=self.subject,
+            body=self.body,
+            from_email=None,  # uses DEFAULT_FROM_EMAIL
+            to=[self.to_email],
+            connection=connection,
         )
+        if self.html_body:
+            message.attach_alternative(self.html_body, "text/html")
+        return message
+
+    def mark_failed_attempt(self, error):
+        # Exponential backoff: 1, 2, 4, 8... minutes until MAX_ATTEMPTS is reached
+        # (attempts was already counted when the worker claimed the email)
+        self.last_error = str(error)
+        if self.attempts >= self.MAX_ATTEMPTS:
+            self.status = self.STATUS_FAILED
+        else:
+            delay = self.RETRY_BASE_SECONDS * (2 ** (self.attempts - 1))
+            self.status = self.STATUS_PENDING
+            self.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+
+
+
+# ExportJob model: XLSX export built in the background by the run_export_jobs command
+class ExportJob(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    filters = models.JSONField(default=dict)  # RunnerExportForm data (pks and choice values)
+    filters_key = models.CharField(max_length=64, db_index=True)  # Hash of filters, for reuse
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    rows_total = models.PositiveIntegerField(default=0)
+    rows_done = models.PositiveIntegerField(default=0)
+    # The finished workbook, in the default storage the web service and the
+    # export worker share (see STORAGES in settings)
+    file = models.FileField(upload_to='exports/', blank=True)
+    filename = models.CharField(max_length=255)  # Download name shown to the user
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)  # Doubles as the worker heartbeat
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.filename} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
+
+    @property
+    def progress(self):
+        """Percent complete, 0-100."""
+        if self.status == self.STATUS_DONE:
+            return 100
+        if not self.rows_total:
+            return 0
+        return min(99, self.rows_done * 100 // self.rows_total)
+
+
+class SheetSync(models.Model):
+    """An event's runners mirrored into a Google Sheet tab (see sheets.py)."""
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='sheet_syncs')
+    spreadsheet_id = models.CharField(max_length=100)
+    sheet_title = models.CharField(max_length=100, default='Sheet1')  # Tab name
+    synced_until = models.DateTimeField(null=True, blank=True)  # Watermark: runners changed after this get resent
+    next_row = models.PositiveIntegerField(default=2)  # Row 1 is the header
+    last_synced_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['spreadsheet_id', 'sheet_title'], name='unique_sheet_sync_tab'),
+        ]
+
+    def __str__(self):
+        return f"{self.event.name} → {self.spreadsheet_id} ({self.sheet_title})"
+
+
+class RaceResult(models.Model):
+    """A runner's timing-mat reads and the times and places derived from them (see results.py)."""
+    runner = models.OneToOneField(Runner, on_delete=models.CASCADE, related_name='result')
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='results')
+    distance = models.ForeignKey(Distance, on_delete=models.CASCADE, related_name='results')
+    start_read = models.DateTimeField(null=True, blank=True)  # Last start-mat crossing
+    finish_read = models.DateTimeField(null=True, blank=True)  # First finish-mat crossing
+    gun_time = models.DurationField(null=True, blank=True)  # Finish minus the distance's gun start
+    chip_time = models.DurationField(null=True, blank=True)  # Finish minus the runner's own start
+    age_category = models.CharField(max_length=10, blank=True)  # AGE_MAP key
+    distance_rank = models.PositiveIntegerField(null=True, blank=True)
+    gender_rank = models.PositiveIntegerField(null=True, blank=True)  # Within the distance
+    category_rank = models.PositiveIntegerField(null=True, blank=True)  # Within distance, gender and age category
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['event', 'distance', 'distance_rank']),
+        ]
+
+    def __str__(self):
+        return f"{self.runner} – {self.gun_time}"
+
+
+class SheetRow(models.Model):
+    """Which sheet row a runner was written to, so updates overwrite it in place."""
+    sync = models.ForeignKey(SheetSync, on_delete=models.CASCADE, related_name='rows')
+    # NULL once the runner is deleted; the next sync blanks the row
+    runner = models.ForeignKey(Runner, null=True, on_delete=models.SET_NULL, related_name='+')
+    row_number = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['sync', 'runner'], name='unique_sheet_row_runner'),
+            models.UniqueConstraint(fields=['sync', 'row_number'], name='unique_sheet_row_number'),
+        ]
+
+
+def build_registration_email(runner):
+    """
+    Builds (without saving) the "Registration Received" email sent on sign-up.
+    """
+    return OutgoingEmail(
+        subject="✅ SUR Registration Received",
+        body=(
+            f"{runner.full_name}\n\n"
+            f"Thanks for registering for:\n\n"
+            f"🏁 Event: {runner.event.name}\n"
+            f"📏 Distance: {runner.distance.label} KM\n"
+            f"📅 Date: {runner.event.date.strftime('%B %d, %Y')}\n\n"
+            f"We’ll verify your proof of payment shortly.\n"
+            f"Once confirmed, you’ll get another email.\n\n"
+            f"Thanks for joining Surigao Ultra Runners!\n"
+            f"– The SUR Team 🏃‍♂️💚"
+        ),
+        to_email=runner.email,
+    )
+
+
+def build_verification_email(runner):
+    """
+    Builds (without saving) the "You're In!" email for a verified runner.
+    """
+    subject = "✅ SUR Registration Verified – You're In!"
+
+    context = {
+        "name": runner.first_name,
+        "event": runner.event.name,
+        "distance": runner.distance.label,
+        "date": runner.event.date.strftime("%B %d, %Y"),
+    }
+
+    # Plain text email body
+    text_body = (
+        f"Hi {runner.first_name},\n\n"
+        f"🎉 Your registration for the following event has been officially verified:\n\n"
+        f"🏁 Event: {context['event']}\n"
+        f"📏 Distance: {context['distance']}\n"
+        f"📅 Date: {context['date']}\n\n"
+        f"You're now officially part of the race!\n"
+        f"Please keep your email active for further race day details and instructions.\n\n"
+        f"If you have questions, feel free to reach out to us or message the SUR Facebook Page.\n\n"
+        f"See you at the starting line!\n"
+        f"— Surigao Ultra Runners Team 🏃‍♂️💚"
+    )
 
-        max_number = 0
-        for bib in existing_bibs:
-            try:
-                suffix = bib.split(" - ")[1]
-                number = int(suffix)
-                if number > max_number:
-                    max_number = number
-            except (IndexError, ValueError):
-                continue
+    # HTML email body using a template
+    html_body = render_to_string("emails/verification_email.html", context)
 
-        next_number = max_number + 1
-        return f"{prefix} - {next_number:04d}"
+    return OutgoingEmail(
+        subject=subject,
+        body=text_body,
+        to_email=runner.email,
+        html_body=html_body,
+    )
+
+
+def queue_verification_email(runner):
+    # Queue the email for the outbox worker
+    email = build_verification_email(runner)
+    email.save()
+    return email
 
 
-# Signal handler: Sends verification email when a runner is marked as verified
+# Signal handler: Queues verification email when a runner is marked as verified
 @receiver(pre_save, sender=Runner)
 def send_verification_email(sender, instance, **kwargs_):
-    if instance.pk:
-        old = Runner.objects.get(pk=instance.pk)
-        # Only send email if is_verified changed from False to True
-        if not old.is_verified and instance.is_verified:
-            subject = "✅ SUR Registration Verified – You're In!"
-
-            context = {
-                "name": instance.first_name,
-                "event": instance.event.name,
-                "distance": instance.distance.label,
-                "date": instance.event.date.strftime("%B %d, %Y"),
-            }
+    # Only send email if is_verified changed from False to True (no extra query)
+    if instance.pk and instance.is_verified and instance.loaded_value('is_verified') is False:
+        queue_verification_email(instance)
 
-            # Plain text email body
-            text_body = (
-                f"Hi {instance.first_name},\n\n"
-                f"🎉 Your registration for the following event has been officially verified:\n\n"
-                f"🏁 Event: {context['event']}\n"
-                f"📏 Distance: {context['distance']}\n"
-                f"📅 Date: {context['date']}\n\n"
-                f"You're now officially part of the race!\n"
-                f"Please keep your email active for further race day details and instructions.\n\n"
-                f"If you have questions, feel free to reach out to us or message the SUR Facebook Page.\n\n"
-                f"See you at the starting line!\n"
-                f"— Surigao Ultra Runners Team 🏃‍♂️💚"
-            )
 
-            # HTML email body using a template
-            html_body = render_to_string("emails/verification_email.html", context)
+def parse_bib_number(bib):
+    """
+    Returns the numeric suffix of a "<distance_label> - NNNN" bib, or None.
+    """
+    try:
+        return int(bib.split(" - ")[1])
+    except (AttributeError, IndexError, ValueError):
+        return None
 
-            # Compose and send the email
-            email = EmailMultiAlternatives(
-                subject=subject,
-                body=text_body,
-                from_email=None,  # uses DEFAULT_FROM_EMAIL
-                to=[instance.email]
-            )
-            email.attach_alternative(html_body, "text/html")
-            email.send()
 
-def generate_bib_number(distance):
+def highest_bib_number(distance):
     """
-    Generates the next available bib number for a given distance.
-    Format: "<distance_label> - 0001"
-    Example: "10 - 0007"
+    Scans existing bibs for a distance and returns the highest suffix in use.
+    Only used to seed a BibCounter; allocation itself never scans.
     """
     prefix = str(distance.label).strip()
     existing_bibs = (
@@ -145,16 +516,217 @@ def generate_bib_number(distance):
         .filter(distance=distance, bib_number__startswith=f"{prefix} -")
         .values_list('bib_number', flat=True)
     )
+    numbers = [n for n in map(parse_bib_number, existing_bibs) if n is not None]
+    return max(numbers, default=0)
+
+
+def catch_up_bib_counter(distance):
+    """
+    Moves a distance's BibCounter up to the highest bib already in use (never
+    backwards), e.g. after bibs were written without allocate_bib_numbers.
+    Returns the counter.
+    """
+    with transaction.atomic():
+        counter, _ = BibCounter.objects.select_for_update().get_or_create(distance=distance)
+        highest = highest_bib_number(distance)
+        if highest > counter.last_number:
+            counter.last_number = highest
+            counter.save(update_fields=['last_number'])
+    return counter
+
+
+def allocate_bib_numbers(distance, count=1):
+    """
+    Atomically reserves `count` consecutive bib numbers for a distance.
+    Returns the reserved numbers as a range of ints.
+    """
+    with transaction.atomic():
+        # The UPDATE row lock is held until commit, so concurrent callers queue up
+        updated = (
+            BibCounter.objects
+            .filter(distance=distance)
+            .update(last_number=F('last_number') + count)
+        )
+        if not updated:
+            # First allocation for this distance: seed from any existing bibs
+            BibCounter.objects.get_or_create(
+                distance=distance,
+                defaults={'last_number': highest_bib_number(distance)},
+            )
+            BibCounter.objects.filter(distance=distance).update(
+                last_number=F('last_number') + count
+            )
+
+        last_number = (
+            BibCounter.objects
+            .filter(distance=distance)
+            .values_list('last_number', flat=True)
+            .get()
+        )
+
+    return range(last_number - count + 1, last_number + 1)
+
+
+def format_bib_number(distance, number):
+    return f"{str(distance.label).strip()} - {number:04d}"
+
+
+def bib_keys(bib):
+    """'10 - 0007' -> ('100007', 7): the full bib as digits, and its sequence number."""
+    parts = re.findall(r'\d+', str(bib or ''))
+    if not parts:
+        return None, None
+    return "".join(parts), int(parts[-1])
+
+
+def bib_search_terms(bib):
+    """'5 - 0007' -> '50007 0007': the bib_keys digits, so "5-0007" finds it, plus the number on its own."""
+    full, _ = bib_keys(bib)
+    if not full:
+        return ''
+    number = re.findall(r'\d+', str(bib))[-1]
+    return full if full == number else f"{full} {number}"
+
+
+def generate_bib_number(distance):
+    """
+    Generates the next available bib number for a given distance.
+    Format: "<distance_label> - 0001"
+    Example: "10 - 0007"
+    """
+    number = allocate_bib_numbers(distance)[0]
+    return format_bib_number(distance, number)
+
+
+def apply_runner_counts(changes):
+    """
+    Applies (event_id, distance_id, registered_delta, verified_delta) tuples
+    to the denormalized counters on Event and Distance with F() updates.
+    Call inside the transaction that writes the runners.
+    """
+    events, distances = Counter(), Counter()
+    for event_id, distance_id, registered, verified in changes:
+        events[event_id, 'registered_count'] += registered
+        events[event_id, 'verified_count'] += verified
+        distances[distance_id, 'registered_count'] += registered
+        distances[distance_id, 'verified_count'] += verified
+
+    # Fixed order (events, then distances, by pk) so concurrent writers can't deadlock
+    for model, deltas in ((Event, events), (Distance, distances)):
+        for pk in sorted({pk for pk, _ in deltas}):
+            fields = {
+                name: F(name) + deltas[pk, name]
+                for name in ('registered_count', 'verified_count')
+                if deltas[pk, name]
+            }
+            if fields:
+                model.objects.filter(pk=pk).update(**fields)
+
+
+@receiver(post_delete, sender=Runner)
+def decrement_runner_counts(sender, instance, origin=None, **kwargs):
+    # Runs inside the delete's transaction, cascades included
+    if isinstance(origin, Event):
+        return  # the counters go away with the event
+    apply_runner_counts([(instance.event_id, instance.distance_id, -1, -int(instance.is_verified))])
+
+
+def reconcile_runner_counts():
+    """
+    Recomputes the Event/Distance counters from the runner table and fixes
+    any that drifted (e.g. after raw SQL). Returns the number of rows fixed.
+    """
+    fixed = 0
+    for model, key in ((Event, 'event'), (Distance, 'distance')):
+        with transaction.atomic():
+            # Lock first: writers queued behind the lock apply their F() deltas
+            # on top of the corrected value instead of being overwritten
+            rows = list(model.objects.select_for_update().only('registered_count', 'verified_count').order_by('pk'))
+            actual = {
+                row[key]: (row['registered'], row['verified'])
+                for row in Runner.objects.order_by().values(key).annotate(
+                    registered=models.Count('pk'),
+                    verified=models.Count('pk', filter=models.Q(is_verified=True)),
+                )
+            }
+            drifted = []
+            for obj in rows:
+                registered, verified = actual.get(obj.pk, (0, 0))
+                if (obj.registered_count, obj.verified_count) != (registered, verified):
+                    obj.registered_count, obj.verified_count = registered, verified
+                    drifted.append(obj)
+            model.objects.bulk_update(drifted, ['registered_count', 'verified_count'], batch_size=500)
+        fixed += len(drifted)
+    return fixed
+
+
+# Sent after bulk writes that bypass post_save (bulk_create/bulk_update), so
+# caches built from runner rows can be invalidated the same way
+runners_bulk_changed = Signal()
+
+
+def create_runners(runners, send_emails=True):
+    """
+    Inserts unsaved Runner instances with bulk_create in one transaction,
+    keeping the event/distance counters in step and queueing the
+    "Registration Received" emails. Runners need their event and distance
+    objects set. Raises IntegrityError (nothing saved) on a duplicate email.
+    """
+    for runner in runners:
+        runner.normalize()  # bulk_create skips save()
+
+    with transaction.atomic():
+        Runner.objects.bulk_create(runners, batch_size=500)
+        apply_runner_counts([(r.event_id, r.distance_id, 1, int(r.is_verified)) for r in runners])
+        if send_emails:
+            OutgoingEmail.objects.bulk_create(
+                [build_registration_email(r) for r in runners], batch_size=500
+            )
+
+    runners_bulk_changed.send(sender=Runner, runners=runners)
+    return runners
+
+
+def verify_runners(runners):
+    """
+    Verifies every unverified runner in the given queryset in one transaction.
+    Bibs are reserved as one contiguous block per distance, rows are written
+    with bulk_update and the confirmation emails are queued in bulk.
+    Returns the number of runners verified.
+    """
+    with transaction.atomic():
+        pending = list(
+            runners
+            .filter(is_verified=False)
+            .select_related('event', 'distance')
+            .select_for_update(of=('self',))
+            .order_by('distance_id', 'created_at', 'pk')
+        )
+
+        for distance_id, group in groupby(pending, key=lambda r: r.distance_id):
+            group = list(group)
+            needs_bib = [r for r in group if not r.bib_number]
+            if needs_bib:
+                distance = group[0].distance
+                numbers = allocate_bib_numbers(distance, count=len(needs_bib))
+                for runner, number in zip(needs_bib, numbers):
+                    runner.bib_number = format_bib_number(distance, number)
+
+        now = timezone.now()
+        for runner in pending:
+            runner.is_verified = True
+            runner.updated_at = now
+            runner.normalize()  # the new bib is searchable
+
+        # bulk_update skips pre_save, so the emails are queued here instead
+        Runner.objects.bulk_update(
+            pending, ['is_verified', 'bib_number', 'search_document', 'updated_at'], batch_size=500
+        )
+        apply_runner_counts([(r.event_id, r.distance_id, 0, 1) for r in pending])
+        OutgoingEmail.objects.bulk_create(
+            [build_verification_email(r) for r in pending], batch_size=500
+        )
 
-    max_number = 0
-    for bib in existing_bibs:
-        try:
-            suffix = bib.split(" - ")[1]
-            number = int(suffix)
-            if number > max_number:
-                max_number = number
-        except (IndexError, ValueError):
-            continue
-
-    next_number = max_number + 1
-    return f"{prefix} - {next_number:04d}"
+    if pending:
+        runners_bulk_changed.send(sender=Runner, runners=pending)
+    return len(pending)
@@ -0,0 +1,83 @@
+from datetime import timedelta
+
+from django.core.mail import get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+# A claimed email not reported back within this time (worker crashed) is retried
+LEASE = timedelta(minutes=10)
+
+RESULT_FIELDS = ['status', 'last_error', 'next_attempt_at', 'sent_at']
+
+
+def claim_batch(batch_size=50):
+    """
+    Marks up to batch_size due emails as sending, leased for LEASE, and
+    counts the attempt. Only this short transaction holds row locks; the
+    SMTP work happens after it has committed.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # skip_locked lets several workers claim from the outbox without waiting on each other
+        batch = list(
+            OutgoingEmail.objects
+            .select_for_update(skip_locked=True)
+            .filter(
+                status__in=[OutgoingEmail.STATUS_PENDING, OutgoingEmail.STATUS_SENDING],
+                next_attempt_at__lte=now,
+            )
+            .order_by('next_attempt_at', 'pk')[:batch_size]
+        )
+        for email in batch:
+            email.status = OutgoingEmail.STATUS_SENDING
+            email.attempts += 1
+            email.next_attempt_at = now + LEASE
+        OutgoingEmail.objects.bulk_update(batch, ['status', 'attempts', 'next_attempt_at'])
+    return batch
+
+
+def record_result(email):
+    # One UPDATE per email, so whatever was delivered before a crash stays sent
+    OutgoingEmail.objects.filter(pk=email.pk, status=OutgoingEmail.STATUS_SENDING).update(
+        **{field: getattr(email, field) for field in RESULT_FIELDS}
+    )
+
+
+def send_queued_emails(batch_size=50):
+    """
+    Sends one claimed batch of due emails over a single SMTP connection.
+    Returns a (sent, failed) tuple for the batch.
+    """
+    sent = failed = 0
+    batch = claim_batch(batch_size)
+    if not batch:
+        return sent, failed
+
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as exc:
+        # Server unreachable: back off the whole batch
+        for email in batch:
+            email.mark_failed_attempt(exc)
+            record_result(email)
+        return sent, len(batch)
+
+    try:
+        for email in batch:
+            try:
+                email.as_message(connection=connection).send()
+            except Exception as exc:
+                email.mark_failed_attempt(exc)
+                failed += 1
+            else:
+                email.status = OutgoingEmail.STATUS_SENT
+                email.sent_at = timezone.now()
+                sent += 1
+            record_result(email)
+    finally:
+        connection.close()
+
+    return sent, failed
@@ -0,0 +1,168 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core import signing
+from django.db.models import Q
+
+TOKEN_SALT = 'registration.pagination'
+TOKEN_MAX_AGE = 24 * 60 * 60  # Seconds; an older link starts over at the first page
+
+
+class KeysetPage:
+    """
+    One page of a KeysetPaginator. Mirrors the parts of Django's Page that
+    the templates use, with opaque next/previous tokens instead of numbers.
+    """
+
+    def __init__(self, object_list, next_token, previous_token, approximate_total=None, total_capped=False):
+        self.object_list = object_list
+        self.next_token = next_token
+        self.previous_token = previous_token
+        self.approximate_total = approximate_total
+        self.total_capped = total_capped
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_next(self):
+        return self.next_token is not None
+
+    def has_previous(self):
+        return self.previous_token is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Cursor pagination over a queryset ordered by `ordering`, which must end
+    in a unique field (e.g. 'pk'). Each page is a single indexed range query
+    (no COUNT, no OFFSET), so its cost doesn't grow with depth.
+    """
+
+    def __init__(self, queryset, ordering, per_page=25, total_cap=1000):
+        self.ordering = list(ordering)
+        self.queryset = queryset.order_by(*self.ordering)
+        self.per_page = per_page
+        self.total_cap = total_cap
+
+    def _fields(self, reverse=False):
+        # [(name, descending)] with the direction optionally flipped
+        fields = []
+        for item in self.ordering:
+            descending = item.startswith('-')
+            fields.append((item.lstrip('-'), descending != reverse))
+        return fields
+
+    def _after(self, values, reverse=False):
+        """Q selecting rows strictly after the cursor in the (possibly reversed) ordering."""
+        # (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z) ...
+        fields = self._fields(reverse)
+        condition = Q()
+        for i, (name, descending) in enumerate(fields):
+            step = Q(**{f"{name}__{'lt' if descending else 'gt'}": values[i]})
+            for j in range(i):
+                step &= Q(**{fields[j][0]: values[j]})
+            condition |= step
+        return condition
+
+    def _cursor(self, obj):
+        return [getattr(obj, name) for name, _ in self._fields()]
+
+    def _token(self, obj, direction):
+        return signing.dumps({'v': self._cursor(obj), 'd': direction}, salt=TOKEN_SALT, serializer=CursorSerializer)
+
+    def _decode(self, token):
+        try:
+            data = signing.loads(token, salt=TOKEN_SALT, serializer=CursorSerializer, max_age=TOKEN_MAX_AGE)
+            values, direction = data['v'], data['d']
+        except (signing.BadSignature, KeyError, TypeError, ValueError):
+            return None, None
+        if direction not in ('next', 'prev') or len(values) != len(self.ordering):
+            return None, None
+        return values, direction
+
+    def page(self, token=None, with_total=False):
+        values, direction = self._decode(token) if token else (None, None)
+        limit = self.per_page + 1  # one extra row tells us whether there is more
+
+        if values is None:
+            rows = list(self.queryset[:limit])
+            has_more, came_from_other_page = len(rows) > self.per_page, False
+            rows = rows[:self.per_page]
+        elif direction == 'next':
+            rows = list(self.queryset.filter(self._after(values))[:limit])
+            has_more, came_from_other_page = len(rows) > self.per_page, True
+            rows = rows[:self.per_page]
+        else:
+            reversed_ordering = [
+                f"-{name}" if descending else name for name, descending in self._fields(reverse=True)
+            ]
+            rows = list(
+                self.queryset.filter(self._after(values, reverse=True))
+                .order_by(*reversed_ordering)[:limit]
+            )
+            has_more, came_from_other_page = len(rows) > self.per_page, True
+            rows = rows[:self.per_page][::-1]
+
+        if direction == 'prev':
+            has_next, has_previous = came_from_other_page, has_more
+        else:
+            has_next, has_previous = has_more, came_from_other_page
+
+        next_token = self._token(rows[-1], 'next') if rows and has_next else None
+        previous_token = self._token(rows[0], 'prev') if rows and has_previous else None
+
+        total = capped = None
+        if with_total:
+            # COUNT over a LIMITed subquery: bounded work, "1000+" beyond the cap
+            total = self.queryset.order_by()[:self.total_cap + 1].count()
+            capped = total > self.total_cap
+            total = min(total, self.total_cap)
+
+        return KeysetPage(rows, next_token, previous_token, total, capped)
+
+
+class CursorSerializer:
+    """JSON serializer that round-trips the dates and datetimes in cursors."""
+
+    def dumps(self, obj):
+        return signing.JSONSerializer().dumps(_encode(obj))
+
+    def loads(self, data):
+        return _decode(signing.JSONSerializer().loads(data))
+
+
+def _encode(value):
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_encode(v) for v in value]
+    if isinstance(value, datetime):
+        return {'$dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'$d': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'$dec': str(value)}
+    return value
+
+
+def _decode(value):
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    if isinstance(value, dict):
+        if '$dt' in value:
+            return datetime.fromisoformat(value['$dt'])
+        if '$d' in value:
+            return date.fromisoformat(value['$d'])
+        if '$dec' in value:
+            return Decimal(value['$dec'])
+        return {k: _decode(v) for k, v in value.items()}
+    return value
@@ -0,0 +1,308 @@
+import csv
+import io
+import re
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .caching import bump_version
+from .exports import AGE_MAP
+from .models import RaceResult, Runner, bib_keys
+
+# Header aliases in the CSV exports of common timing systems
+BIB_COLUMNS = {'bib', 'bib number', 'bib_number', 'bib no', 'bibno', 'number', 'no'}
+TIME_COLUMNS = {'time', 'timestamp', 'read time', 'read_time', 'time of day', 'tod'}
+LOCATION_COLUMNS = {'location', 'point', 'mat', 'split', 'reader', 'timing point'}
+
+BATCH_SIZE = 1000
+
+# Faster than this pace is a mat re-read or the start crossing, not a finish
+MIN_SECONDS_PER_KM = 150
+
+# '6:12:03', '06:12:03.45', '2025-06-01 6:12:03,4' (Excel and timing exports drop the leading zero)
+READ_TIME = re.compile(r'^(?:(\d{4}-\d{2}-\d{2})[ T])?(\d{1,2}):(\d{2}):(\d{2})(?:[.,](\d{1,6}))?$')
+
+# Columns rank_results() derives from the reads
+RANKED_FIELDS = [
+    'distance_id', 'age_category', 'gun_time', 'chip_time',
+    'distance_rank', 'gender_rank', 'category_rank',
+]
+
+
+class ResultsImportError(Exception):
+    """The reads file as a whole can't be used (missing columns)."""
+
+
+class ReadsSummary:
+    def __init__(self):
+        self.reads = 0
+        self.unknown_bibs = Counter()  # Bib as written in the file -> reads
+        self.bad_rows = []  # Line numbers with an unreadable time
+        self.runners = 0  # Runners with at least one read in this file
+        self.finishers = 0  # Finishers in the event after merging
+        self.single_mat = False  # No location column: start and finish share a mat
+
+
+def age_category(age):
+    for key, (low, high) in AGE_MAP.items():
+        if low <= age <= high:
+            return key
+    return ''
+
+
+def format_duration(value):
+    """timedelta -> 'H:MM:SS' (tenths dropped, as on printed results)."""
+    if value is None:
+        return ''
+    seconds = int(value.total_seconds())
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def minimum_time(distance):
+    match = re.search(r'\d+(\.\d+)?', str(distance.label))
+    return timedelta(seconds=float(match.group()) * MIN_SECONDS_PER_KM if match else MIN_SECONDS_PER_KM)
+
+
+def parse_read_time(value, race_date, tz=None):
+    """
+    Accepts a time of day ('6:12:03', '06:12:03.45'), taken to be on
+    race_date, or a full timestamp ('2025-06-01 06:12:03.45'; any ISO 8601
+    form, including an offset, works too).
+    """
+    value = value.strip()
+    match = READ_TIME.match(value)
+    if match:
+        day, hour, minute, second, fraction = match.groups()
+        moment = datetime.combine(
+            date.fromisoformat(day) if day else race_date,
+            time(int(hour), int(minute), int(second), int((fraction or '0').ljust(6, '0'))),
+        )
+    else:
+        moment = datetime.fromisoformat(value)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, tz)
+    return moment
+
+
+def _column(headers, names, required=True):
+    for i, header in enumerate(headers):
+        if " ".join(header.split()).lower() in names:
+            return i
+    if required:
+        raise ResultsImportError(f"Missing a column named one of: {', '.join(sorted(names))}")
+    return None
+
+
+def _bib_lookup(event):
+    """Maps bibs as timing systems write them ('100007' or '7') to runner pks."""
+    by_full, by_number = {}, {}
+    for pk, bib in Runner.objects.filter(event=event).exclude(bib_number=None).values_list('pk', 'bib_number'):
+        full, number = bib_keys(bib)
+        if full:
+            by_full[full] = pk
+            by_number.setdefault(number, []).append(pk)
+
+    def lookup(bib):
+        full, number = bib_keys(bib)
+        if full in by_full:
+            return by_full[full]
+        # A bare sequence number is only usable while it is unique across distances;
+        # a bib with a distance prefix that matched nothing is just unknown
+        if not bib.strip().isdigit():
+            return None
+        candidates = by_number.get(number, ())
+        return candidates[0] if len(candidates) == 1 else None
+
+    return lookup
+
+
+def read_timing_csv(event, fileobj, summary):
+    """
+    Streams a timing-mat CSV and dedupes it per runner: the last start-mat
+    crossing and the first finish-mat crossing win. Files without a location
+    column come from a shared start/finish mat: there the first read is the
+    start and the last read the finish. Returns {runner pk: [start, finish]}.
+    """
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    reader = csv.reader(text)
+    headers = next(reader, None)
+    if not headers:
+        raise ResultsImportError("The file is empty.")
+    bib_col = _column(headers, BIB_COLUMNS)
+    time_col = _column(headers, TIME_COLUMNS)
+    location_col = _column(headers, LOCATION_COLUMNS, required=False)
+    summary.single_mat = location_col is None
+
+    runner_for = _bib_lookup(event)
+    tz = timezone.get_current_timezone()
+    parsed = {}  # The same time string recurs across mats and bibs; parse once
+    reads = {}
+
+    for line, row in enumerate(reader, start=2):
+        if len(row) <= max(bib_col, time_col):
+            continue
+        summary.reads += 1
+
+        bib = row[bib_col].strip()
+        runner_pk = runner_for(bib)
+        if runner_pk is None:
+            summary.unknown_bibs[bib] += 1
+            continue
+
+        raw = row[time_col]
+        moment = parsed.get(raw)
+        if moment is None:
+            try:
+                moment = parsed[raw] = parse_read_time(raw, event.date, tz)
+            except ValueError:
+                summary.bad_rows.append(line)
+                continue
+
+        if summary.single_mat:
+            first, last = reads.setdefault(runner_pk, [moment, moment])
+            reads[runner_pk] = [min(first, moment), max(last, moment)]
+            continue
+
+        start, finish = reads.setdefault(runner_pk, [None, None])
+        if 'start' in row[location_col].lower():
+            if start is None or moment > start:
+                reads[runner_pk][0] = moment
+        elif finish is None or moment < finish:
+            reads[runner_pk][1] = moment
+
+    summary.runners = len(reads)
+    return reads
+
+
+def import_timing_reads(event, fileobj, gun_starts=None):
+    """
+    Merges a timing-mat CSV into the event's RaceResults (reads from earlier
+    files count too, so start and finish mats can arrive separately), then
+    re-ranks the event. gun_starts maps Distance -> datetime and is saved
+    on the distances. Returns a ReadsSummary.
+    """
+    summary = ReadsSummary()
+    reads = read_timing_csv(event, fileobj, summary)
+
+    with transaction.atomic():
+        for distance, moment in (gun_starts or {}).items():
+            distance.gun_start = moment
+            distance.save(update_fields=['gun_start'])
+
+        existing = {
+            result.runner_id: result
+            for result in RaceResult.objects.filter(event=event, runner_id__in=list(reads))
+        }
+        distances = dict(Runner.objects.filter(pk__in=list(reads)).values_list('pk', 'distance_id'))
+
+        results = []
+        for runner_pk, (start, finish) in reads.items():
+            result = existing.get(runner_pk) or RaceResult(
+                runner_id=runner_pk, event=event, distance_id=distances[runner_pk]
+            )
+            if summary.single_mat:
+                # Shared mat: the earliest read overall starts, the latest finishes
+                result.start_read = min(filter(None, (result.start_read, start)))
+                result.finish_read = max(filter(None, (result.finish_read, finish)))
+            else:
+                if start and (result.start_read is None or start > result.start_read):
+                    result.start_read = start
+                if finish and (result.finish_read is None or finish < result.finish_read):
+                    result.finish_read = finish
+            results.append(result)
+
+        save_results(results, ['start_read', 'finish_read'])
+        summary.finishers = rank_results(event)
+
+    return summary
+
+
+def rank_results(event):
+    """
+    Recomputes gun/chip times and every ranking of the event in one pass:
+    results are sorted once by gun time (chip time, then bib, breaks ties)
+    and each finisher takes the next place in the distance, gender and
+    age-category counters (all within the runner's distance; a place
+    across distances would rank 5K times against 21K ones). Times under the distance's
+    minimum_time (including zero or negative ones) are not finishes.
+    Returns the number of finishers.
+    """
+    results = list(
+        RaceResult.objects.filter(event=event)
+        .select_related('runner', 'runner__distance')
+    )
+
+    # Without a recorded gun start, the first start-mat crossing stands in
+    gun_starts = {}
+    for result in results:
+        distance = result.runner.distance
+        if distance.gun_start:
+            gun_starts[distance.pk] = distance.gun_start
+        elif result.start_read:
+            current = gun_starts.get(distance.pk)
+            gun_starts[distance.pk] = min(current, result.start_read) if current else result.start_read
+
+    minimums = {distance.pk: minimum_time(distance) for distance in event.distances.all()}
+
+    before = {result.pk: _ranked_values(result) for result in results}
+    for result in results:
+        runner = result.runner
+        result.distance_id = runner.distance_id
+        result.age_category = age_category(runner.age)
+        gun_start = gun_starts.get(runner.distance_id)
+        minimum = minimums[runner.distance_id]
+        start, finish = result.start_read, result.finish_read
+
+        if start and finish and finish - start < minimum:
+            # A single crossing of a shared mat, or start and finish reads too close
+            # together: it only counts as a finish if the gun time says so
+            if gun_start and finish - gun_start >= minimum:
+                start = None
+            else:
+                finish = None
+
+        result.gun_time = finish - gun_start if finish and gun_start else None
+        if result.gun_time is not None and result.gun_time < minimum:
+            result.gun_time = None
+        result.chip_time = finish - start if result.gun_time and start else result.gun_time
+        result.distance_rank = result.gender_rank = result.category_rank = None
+
+    finishers = sorted(
+        (r for r in results if r.gun_time is not None),
+        key=lambda r: (r.gun_time, r.chip_time, r.runner.bib_number or '', r.pk),
+    )
+    places = Counter()
+    for result in finishers:
+        distance, gender = result.distance_id, result.runner.gender
+        for field, key in (
+            ('distance_rank', (distance,)),
+            ('gender_rank', (distance, gender)),
+            ('category_rank', (distance, gender, result.age_category) if result.age_category else None),
+        ):
+            if key is None:
+                continue
+            places[field, key] += 1
+            setattr(result, field, places[field, key])
+
+    changed = [r for r in results if _ranked_values(r) != before[r.pk]]
+    save_results(changed, RANKED_FIELDS)
+    transaction.on_commit(lambda: bump_version('results'))
+    return len(finishers)
+
+
+def _ranked_values(result):
+    return tuple(getattr(result, field) for field in RANKED_FIELDS)
+
+
+def save_results(results, fields):
+    # One INSERT .. ON CONFLICT per batch; bulk_update's per-row CASE WHEN is
+    # far slower to build for thousands of rows
+    RaceResult.objects.bulk_create(
+        results,
+        update_conflicts=True,
+        unique_fields=['runner'],
+        update_fields=[field.removesuffix('_id') for field in fields] + ['updated_at'],
+        batch_size=BATCH_SIZE,
+    )
@@ -0,0 +1,85 @@
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Runner, bib_keys, normalize_name
+
+RUNNER_TABLE = Runner._meta.db_table
+FTS_TABLE = f"{RUNNER_TABLE}_fts"
+
+# The FTS5 table and its triggers (SQLite) and the pg_trgm index (Postgres)
+# are created by migration 0031_runner_search_index.
+# Bibs are searched through their bib_keys digits: "5-0007" and "5 - 0007"
+# both become "50007", which Runner.normalize() puts in search_document.
+BIB_PATTERN = re.compile(r'\d+(?:\s*-\s*\d+)+')
+
+
+def _sqlite_search_installed(cursor):
+    # A migration that rebuilds the runner table on SQLite drops the triggers,
+    # in which case search falls back to LIKE until they are recreated
+    cursor.execute(
+        "SELECT count(*) FROM sqlite_master WHERE name IN (%s, %s, %s, %s)",
+        [FTS_TABLE, f"{FTS_TABLE}_ai", f"{FTS_TABLE}_ad", f"{FTS_TABLE}_au"],
+    )
+    return cursor.fetchone()[0] == 4
+
+
+_fts_checked = None
+
+
+def _fts_available():
+    global _fts_checked
+    if _fts_checked is None:
+        with connection.cursor() as cursor:
+            _fts_checked = _sqlite_search_installed(cursor)
+    return _fts_checked
+
+
+def _fts_query(tokens):
+    # Every token must match as a prefix: "juan dela" -> "juan"* "dela"*
+    return " ".join('"%s"*' % token.replace('"', '""') for token in tokens)
+
+
+def search_runners(queryset, term):
+    """
+    Filters a Runner queryset to rows matching every word of `term` across
+    name, email and bib, annotated with `search_rank` (higher is better) and
+    ordered by it.
+    """
+    term = BIB_PATTERN.sub(lambda match: bib_keys(match.group())[0], term or '')
+    tokens = normalize_name(term).split()
+    if not tokens:
+        return queryset
+
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        for token in tokens:
+            queryset = queryset.filter(search_document__contains=token)
+        queryset = queryset.annotate(
+            search_rank=TrigramWordSimilarity(" ".join(tokens), 'search_document')
+        )
+
+    elif connection.vendor == 'sqlite' and _fts_available():
+        match = _fts_query(tokens)
+        queryset = queryset.filter(
+            pk__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+        ).annotate(
+            # bm25() is lower-is-better, flip it so both backends sort descending
+            search_rank=RawSQL(
+                f"SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s AND rowid = {RUNNER_TABLE}.id",
+                [match],
+                output_field=FloatField(),
+            )
+        )
+
+    else:
+        for token in tokens:
+            queryset = queryset.filter(search_document__contains=token)
+        queryset = queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    return queryset.order_by('-search_rank', 'last_name', 'first_name', 'pk')
+
@@ -0,0 +1,214 @@
+from collections import Counter
+from datetime import date
+
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from rest_framework import serializers
+from .forms import (
+    DUPLICATE_EMAIL_MESSAGE,
+    DUPLICATE_NAME_MESSAGE,
+    REGISTRATION_CLOSED_MESSAGE,
+    is_duplicate_name,
+    validate_contact_number,
+)
+from .images import store_shared_receipt
+from .models import Event, Distance, Runner, create_runners, normalize_name
+from .uploads import MAX_RECEIPT_SIZE
+
+MAX_GROUP_SIZE = 100
+
+class DistanceSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Distance
+        fields = ['id', 'label', 'fee']
+
+class EventSerializer(serializers.ModelSerializer):
+    distances = DistanceSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Event
+        fields = ['id', 'name', 'date', 'description', 'poster', 'distances']
+
+def validate_open_event(event):
+    # Past events and passed deadlines, as in RunnerRegistrationForm
+    today = date.today()
+    if event.date < today or (event.registration_deadline and today > event.registration_deadline):
+        raise serializers.ValidationError(REGISTRATION_CLOSED_MESSAGE)
+    return event
+
+
+def validate_receipt_size(file):
+    if file.size > MAX_RECEIPT_SIZE:
+        raise serializers.ValidationError("❌ File size must be under 5MB.")
+    return file
+
+
+class RunnerSerializer(serializers.ModelSerializer):
+    """Public single registration, held to the RunnerRegistrationForm rules."""
+    contact_number = serializers.CharField(max_length=15, validators=[validate_contact_number])
+
+    class Meta:
+        model = Runner
+        fields = [
+            'event', 'distance', 'first_name', 'last_name', 'email', 'contact_number',
+            'age', 'gender', 'shirt_size',
+            'emergency_contact_name', 'emergency_contact_number',
+            'proof_of_payment'
+        ]
+
+    def validate_event(self, event):
+        return validate_open_event(event)
+
+    def validate_email(self, value):
+        return value.strip().lower()
+
+    def validate_proof_of_payment(self, file):
+        return validate_receipt_size(file)
+
+    def validate(self, attrs):
+        event = attrs['event']
+        if attrs['distance'].event_id != event.pk:
+            raise serializers.ValidationError({'distance': ["❌ Not a distance of this event."]})
+        # A repeated email is left to the database constraint (see RunnerCreateAPI)
+        if is_duplicate_name(event, attrs['first_name'], attrs['last_name'], attrs['email']):
+            raise serializers.ValidationError(DUPLICATE_NAME_MESSAGE)
+        return attrs
+
+
+class GroupRunnerSerializer(serializers.ModelSerializer):
+    """One member of a group registration; event and receipt are shared."""
+    # Plain id: checked against the event's distances in one query for the whole batch
+    distance = serializers.IntegerField()
+    contact_number = serializers.CharField(max_length=15, validators=[validate_contact_number])
+
+    class Meta:
+        model = Runner
+        fields = [
+            'distance', 'first_name', 'last_name', 'email', 'contact_number',
+            'age', 'gender', 'shirt_size',
+            'emergency_contact_name', 'emergency_contact_number',
+        ]
+
+    def validate_email(self, value):
+        return value.strip().lower()
+
+
+def check_runner_batch(event, data, errors):
+    """
+    Distance, duplicate email and duplicate name checks for a batch of
+    GroupRunnerSerializer data (None for rows that already failed), adding
+    to the matching entries of `errors`. Repeats inside the batch are
+    counted in Python and the database is asked once about every email and
+    name together.
+    """
+    keys = {
+        i: (normalize_name(row['email']), normalize_name(row['first_name']), normalize_name(row['last_name']))
+        for i, row in enumerate(data) if row
+    }
+    if not keys:
+        return
+
+    distance_ids = set(event.distances.values_list('pk', flat=True))
+    emails_in_batch = Counter(email for email, _, _ in keys.values())
+    names_in_batch = Counter((first, last) for _, first, last in keys.values())
+
+    existing = Runner.objects.filter(event=event).filter(
+        Q(normalized_email__in={email for email, _, _ in keys.values()})
+        | Q(normalized_first_name__in={first for _, first, _ in keys.values()},
+            normalized_last_name__in={last for _, _, last in keys.values()})
+    ).values_list('normalized_email', 'normalized_first_name', 'normalized_last_name')
+
+    taken_emails = set()
+    emails_by_name = {}
+    for email, first, last in existing:
+        taken_emails.add(email)
+        emails_by_name.setdefault((first, last), set()).add(email)
+
+    for i, (email, first, last) in keys.items():
+        row_errors = errors[i]
+        if data[i]['distance'] not in distance_ids:
+            row_errors['distance'] = ["❌ Not a distance of this event."]
+        if email in taken_emails:
+            row_errors['email'] = [DUPLICATE_EMAIL_MESSAGE]
+        elif emails_in_batch[email] > 1:
+            row_errors['email'] = ["❌ This email appears more than once in this upload."]
+        if emails_by_name.get((first, last), set()) - {email}:
+            row_errors['non_field_errors'] = [DUPLICATE_NAME_MESSAGE]
+        elif names_in_batch[first, last] > 1:
+            row_errors['non_field_errors'] = ["⚠️ This person appears more than once in this upload."]
+
+
+class GroupRegistrationSerializer(serializers.Serializer):
+    """
+    Up to MAX_GROUP_SIZE runners for one event, paying with a single receipt.
+    `runners` is a JSON list (a JSON string when posted as multipart).
+    Errors for individual runners come back under 'runners', one entry per
+    submitted row, empty for rows that were fine.
+    """
+    event = serializers.PrimaryKeyRelatedField(queryset=Event.objects.all())
+    proof_of_payment = serializers.ImageField()
+    runners = serializers.JSONField(binary=True)
+
+    def validate_event(self, event):
+        return validate_open_event(event)
+
+    def validate_proof_of_payment(self, file):
+        return validate_receipt_size(file)
+
+    def validate_runners(self, runners):
+        if not isinstance(runners, list) or not runners:
+            raise serializers.ValidationError("Send a non-empty list of runners.")
+        if len(runners) > MAX_GROUP_SIZE:
+            raise serializers.ValidationError(f"At most {MAX_GROUP_SIZE} runners per request.")
+        return runners
+
+    def validate(self, attrs):
+        event = attrs['event']
+        data, errors = [], []
+        for row in attrs['runners']:
+            serializer = GroupRunnerSerializer(data=row)
+            if serializer.is_valid():
+                data.append(serializer.validated_data)
+                errors.append({})
+            else:
+                data.append(None)
+                errors.append(dict(serializer.errors))
+
+        check_runner_batch(event, data, errors)
+        if any(errors):
+            raise serializers.ValidationError({'runners': errors})
+
+        attrs['runners'] = data
+        return attrs
+
+    def to_representation(self, runners):
+        return {
+            'created': len(runners),
+            'runners': [
+                {'id': r.pk, 'first_name': r.first_name, 'last_name': r.last_name, 'email': r.email}
+                for r in runners
+            ],
+        }
+
+    def create(self, validated_data):
+        event = validated_data['event']
+        distances = {d.pk: d for d in event.distances.all()}
+        receipt, thumbnail = store_shared_receipt(validated_data['proof_of_payment'])
+
+        runners = [
+            Runner(
+                **{**row, 'distance': distances[row['distance']]},
+                event=event,
+                proof_of_payment=receipt,
+                proof_thumbnail=thumbnail,
+            )
+            for row in validated_data['runners']
+        ]
+        try:
+            create_runners(runners)
+        except Exception:
+            # The rows were rolled back; don't leave the shared receipt behind
+            for name in filter(None, (receipt, thumbnail)):
+                default_storage.delete(name)
+            raise
+        return runners
@@ -0,0 +1,184 @@
+import time
+from datetime import timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Runner, SheetRow, SheetSync
+
+SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
+
+SHEET_HEADERS = [
+    'Bib', 'Last Name', 'First Name', 'Email', 'Contact Number', 'Distance',
+    'Age', 'Gender', 'Shirt Size', 'Verified', 'Registered',
+]
+LAST_COLUMN = chr(ord('A') + len(SHEET_HEADERS) - 1)
+BLANK_ROW = [''] * len(SHEET_HEADERS)
+
+BATCH_ROWS = 500  # Rows per values:batchUpdate request
+
+# Runners saved just before the previous sync may have committed after its
+# query ran, so each sync looks back a little past the watermark
+WATERMARK_OVERLAP = timedelta(minutes=2)
+
+MAX_RETRIES = 4
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class SheetsError(Exception):
+    pass
+
+
+def default_session():
+    """requests session authorised with the service account key in settings."""
+    from google.auth.transport.requests import AuthorizedSession
+    from google.oauth2 import service_account
+
+    credentials = service_account.Credentials.from_service_account_file(
+        settings.GOOGLE_SHEETS_CREDENTIALS, scopes=SCOPES
+    )
+    return AuthorizedSession(credentials)
+
+
+class SheetsClient:
+    """
+    The one Sheets v4 call the sync needs, over any requests-style session.
+    Pass a plain requests.Session and a base_url to talk to a fake server.
+    """
+
+    def __init__(self, session=None, base_url=None, timeout=30, sleep=time.sleep):
+        self.session = session or default_session()
+        self.base_url = (base_url or settings.GOOGLE_SHEETS_API_URL).rstrip('/')
+        self.timeout = timeout
+        self.sleep = sleep
+
+    def batch_update_values(self, spreadsheet_id, data):
+        url = f"{self.base_url}/v4/spreadsheets/{spreadsheet_id}/values:batchUpdate"
+        body = {'valueInputOption': 'RAW', 'data': data}
+
+        for attempt in range(MAX_RETRIES + 1):
+            response = self.session.post(url, json=body, timeout=self.timeout)
+            if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                break
+            # Rate limited or a hiccup: back off 1s, 2s, 4s, ...
+            self.sleep(2 ** attempt)
+
+        if response.status_code >= 400:
+            raise SheetsError(f"Sheets API returned {response.status_code}: {response.text[:500]}")
+        return response.json()
+
+
+def runner_row(runner):
+    return [
+        runner.bib_number if runner.is_verified and runner.bib_number else '',
+        runner.last_name,
+        runner.first_name,
+        runner.email,
+        runner.contact_number,
+        runner.distance.label,
+        runner.age,
+        runner.get_gender_display(),
+        runner.shirt_size,
+        'Yes' if runner.is_verified else 'No',
+        timezone.localtime(runner.created_at).strftime('%Y-%m-%d %H:%M'),
+    ]
+
+
+def _a1_range(sync, first, last):
+    title = sync.sheet_title.replace("'", "''")
+    return f"'{title}'!A{first}:{LAST_COLUMN}{last}"
+
+
+def value_ranges(sync, rows):
+    """Turns {row number: values} into one ValueRange per run of consecutive rows."""
+    data = []
+    numbers = sorted(rows)
+    for _, run in groupby(enumerate(numbers), key=lambda item: item[1] - item[0]):
+        run = [number for _, number in run]
+        data.append({
+            'range': _a1_range(sync, run[0], run[-1]),
+            'values': [rows[number] for number in run],
+        })
+    return data
+
+
+def _row_numbers(sync, runner_ids):
+    """Existing sheet rows for the runners; new runners get rows appended at next_row."""
+    rows = dict(
+        SheetRow.objects.filter(sync=sync, runner_id__in=runner_ids)
+        .values_list('runner_id', 'row_number')
+    )
+    missing = [pk for pk in runner_ids if pk not in rows]
+    if missing:
+        with transaction.atomic():
+            next_row = SheetSync.objects.select_for_update().values_list('next_row', flat=True).get(pk=sync.pk)
+            new = [
+                SheetRow(sync=sync, runner_id=pk, row_number=next_row + i)
+                for i, pk in enumerate(missing)
+            ]
+            SheetRow.objects.bulk_create(new)
+            SheetSync.objects.filter(pk=sync.pk).update(next_row=next_row + len(new))
+        rows.update((row.runner_id, row.row_number) for row in new)
+    return rows
+
+
+def sync_sheet(sync, client=None, full=False):
+    """
+    Writes the runners of sync.event that changed since the last watermark
+    (all of them on the first run or with full=True) to their mapped rows,
+    BATCH_ROWS per batchUpdate. Rows of runners that were deleted or moved
+    to another event are blanked. The watermark only advances once every
+    batch went through, so a failed run is simply repeated next time.
+    Returns the number of rows written.
+    """
+    client = client or SheetsClient()
+    started = timezone.now()
+    first_run = full or sync.synced_until is None
+    written = 0
+
+    try:
+        # Orphaned rows first, so their mappings can go
+        orphans = list(
+            sync.rows.filter(Q(runner__isnull=True) | ~Q(runner__event_id=sync.event_id))
+        )
+        pending = {row.row_number: BLANK_ROW for row in orphans}
+        if first_run:
+            pending[1] = SHEET_HEADERS
+        if pending:
+            client.batch_update_values(sync.spreadsheet_id, value_ranges(sync, pending))
+            SheetRow.objects.filter(pk__in=[row.pk for row in orphans]).delete()
+            written += len(pending)
+
+        runners = (
+            Runner.objects.filter(event_id=sync.event_id)
+            .select_related('distance')
+            .order_by('pk')
+        )
+        if not first_run:
+            runners = runners.filter(updated_at__gte=sync.synced_until - WATERMARK_OVERLAP)
+
+        last_pk = 0
+        while True:
+            batch = list(runners.filter(pk__gt=last_pk)[:BATCH_ROWS])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+
+            row_numbers = _row_numbers(sync, [runner.pk for runner in batch])
+            rows = {row_numbers[runner.pk]: runner_row(runner) for runner in batch}
+            client.batch_update_values(sync.spreadsheet_id, value_ranges(sync, rows))
+            written += len(rows)
+
+    except Exception as exc:
+        sync.last_error = str(exc)
+        sync.save(update_fields=['last_error'])
+        raise
+
+    sync.synced_until = started
+    sync.last_synced_at = timezone.now()
+    sync.last_error = ''
+    sync.save(update_fields=['synced_until', 'last_synced_at', 'last_error'])
+    return written
@@ -1,10 +1,1244 @@
-from django.test import TestCase
-
-from django.core.mail import send_mail
-send_mail(
-    subject='Test from SUR app',
-    message='If you get this, SMTP works!',
-    from_email='Surigao Ultra Runners <suractive@yahoo.com>',
-    recipient_list=['your_email@gmail.com'],
-    fail_silently=False,
+import csv
+import io
+import json
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import date, timedelta
+from pathlib import Path
+from unittest import mock, skipIf
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core import mail
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail import EmailMultiAlternatives
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+import openpyxl
+from PIL import Image
+
+from .caching import bump_version, version
+from .checkin import CheckinIndex, claim_kit
+from .exports import claim_export_job, purge_expired_exports, run_export_job
+from .forms import DUPLICATE_EMAIL_MESSAGE, RunnerRegistrationForm
+from .imports import RunnerImportError, import_runners
+from .metrics import dashboard_metrics
+from .search import search_runners
+from .serializers import MAX_GROUP_SIZE
+from .models import (
+    BibCounter,
+    Distance,
+    Event,
+    ExportJob,
+    OutgoingEmail,
+    RaceResult,
+    Runner,
+    SheetRow,
+    SheetSync,
+    allocate_bib_numbers,
+    create_runners,
+    generate_bib_number,
+    reconcile_runner_counts,
+    verify_runners,
 )
+from .outbox import claim_batch, send_queued_emails
+from .pagination import TOKEN_MAX_AGE, KeysetPaginator
+from .results import format_duration, import_timing_reads, parse_read_time, rank_results
+from .sheets import BLANK_ROW, SHEET_HEADERS, SheetsClient, SheetsError, sync_sheet
+from .uploads import MAX_RECEIPT_SIZE
+
+RACE_DAY = date(2030, 6, 1)
+
+
+def make_event(labels=('5', '10'), **fields):
+    event = Event.objects.create(name=fields.pop('name', 'Surigao Run'), date=fields.pop('date', RACE_DAY), **fields)
+    distances = [Distance.objects.create(event=event, label=label, fee=500) for label in labels]
+    return event, distances
+
+
+def make_runner(event, distance, n, **fields):
+    values = {
+        'first_name': f"Juan{n}",
+        'last_name': 'Dela Cruz',
+        'email': f"juan{n}@example.com",
+        'contact_number': '09171234567',
+        'age': 30,
+        'gender': 'M',
+        'shirt_size': 'M',
+    }
+    values.update(fields)
+    return Runner.objects.create(event=event, distance=distance, **values)
+
+
+def receipt_upload(name='receipt.png', size=(20, 20)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'white').save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+def use_temp_media(test):
+    """Points MEDIA_ROOT at a throwaway directory for the test."""
+    media = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, media, ignore_errors=True)
+    media_settings = test.settings(MEDIA_ROOT=media)
+    media_settings.enable()
+    test.addCleanup(media_settings.disable)
+    return media
+
+
+# SQLite's shared in-memory test database locks whole tables instead of
+# waiting, so the thread tests only run against Postgres
+needs_concurrent_db = skipIf(connection.vendor == 'sqlite', "needs a database with row-level locking")
+
+
+def run_in_threads(target, count):
+    """Runs target(i) in `count` threads started together; each closes its own connection."""
+    barrier = threading.Barrier(count)
+    errors = []
+
+    def worker(i):
+        try:
+            barrier.wait()
+            target(i)
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+# 📬 Email outbox (send_queued_emails)
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.emails = [
+            OutgoingEmail.objects.create(subject=f"Hello {n}", body="Hi", to_email=f"runner{n}@example.com")
+            for n in range(3)
+        ]
+
+    def status(self, email):
+        email.refresh_from_db()
+        return email.status, email.attempts
+
+    def test_sends_due_emails_once(self):
+        self.assertEqual(send_queued_emails(), (3, 0))
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), [e.to_email for e in self.emails])
+        self.assertEqual(self.status(self.emails[0]), (OutgoingEmail.STATUS_SENT, 1))
+        self.assertEqual(send_queued_emails(), (0, 0))
+
+    def test_failures_back_off_then_give_up(self):
+        with mock.patch.object(EmailMultiAlternatives, 'send', side_effect=OSError("mailbox full")):
+            self.assertEqual(send_queued_emails(), (0, 3))
+            email = self.emails[0]
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.attempts, email.last_error), ('pending', 1, 'mailbox full'))
+            self.assertGreater(email.next_attempt_at, timezone.now() + timedelta(seconds=50))
+            # Not due yet
+            self.assertEqual(send_queued_emails(), (0, 0))
+
+            for _ in range(OutgoingEmail.MAX_ATTEMPTS - 1):
+                OutgoingEmail.objects.update(next_attempt_at=timezone.now())
+                send_queued_emails()
+        self.assertEqual(self.status(email), (OutgoingEmail.STATUS_FAILED, OutgoingEmail.MAX_ATTEMPTS))
+
+    def test_unreachable_server_backs_off_the_batch(self):
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.open', side_effect=OSError("refused")):
+            self.assertEqual(send_queued_emails(), (0, 3))
+        self.assertEqual(OutgoingEmail.objects.filter(status='pending', attempts=1).count(), 3)
+
+    def test_claimed_batch_is_leased(self):
+        claimed = claim_batch()
+        self.assertEqual(len(claimed), 3)
+        # Another worker finds nothing while the lease runs
+        self.assertEqual(claim_batch(), [])
+
+        # A worker that died mid-batch: the lease runs out and the emails go again
+        OutgoingEmail.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(send_queued_emails(), (3, 0))
+        self.assertEqual(self.status(self.emails[0]), (OutgoingEmail.STATUS_SENT, 2))
+
+    def test_crash_mid_batch_keeps_what_was_sent(self):
+        with mock.patch.object(EmailMultiAlternatives, 'send', side_effect=[1, KeyboardInterrupt]):
+            with self.assertRaises(KeyboardInterrupt):
+                send_queued_emails()
+
+        self.assertEqual(self.status(self.emails[0]), (OutgoingEmail.STATUS_SENT, 1))
+        self.assertEqual(self.status(self.emails[1]), (OutgoingEmail.STATUS_SENDING, 1))
+        self.assertEqual(self.status(self.emails[2]), (OutgoingEmail.STATUS_SENDING, 1))
+
+
+# 🔢 Bib allocation (allocate_bib_numbers)
+
+class BibAllocationTests(TestCase):
+    def setUp(self):
+        self.event, (self.five_k, self.ten_k) = make_event()
+
+    def test_blocks_are_consecutive_per_distance(self):
+        self.assertEqual(list(allocate_bib_numbers(self.five_k, count=3)), [1, 2, 3])
+        self.assertEqual(list(allocate_bib_numbers(self.five_k, count=2)), [4, 5])
+        self.assertEqual(list(allocate_bib_numbers(self.ten_k)), [1])
+
+    def test_first_allocation_continues_after_existing_bibs(self):
+        make_runner(self.event, self.five_k, 1, bib_number='5 - 0041')
+        self.assertEqual(generate_bib_number(self.five_k), '5 - 0042')
+
+
+class VerifyRunnerViewTests(TestCase):
+    def setUp(self):
+        self.event, (self.distance, _) = make_event()
+        self.runner = make_runner(self.event, self.distance, 1)
+        self.client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+
+    def verify(self):
+        return self.client.get(reverse('registration:verify_runner', args=[self.runner.pk]))
+
+    def test_verifying_twice_allocates_one_bib(self):
+        self.verify()
+        self.verify()
+
+        self.runner.refresh_from_db()
+        self.assertEqual(self.runner.bib_number, '5 - 0001')
+        self.assertEqual(BibCounter.objects.get(distance=self.distance).last_number, 1)
+
+    def test_failed_save_returns_the_bib(self):
+        with mock.patch.object(Runner, 'save', side_effect=DatabaseError("disk full")):
+            with self.assertRaises(DatabaseError):
+                self.verify()
+
+        self.assertFalse(BibCounter.objects.filter(distance=self.distance, last_number__gt=0).exists())
+        self.verify()
+        self.runner.refresh_from_db()
+        self.assertEqual(self.runner.bib_number, '5 - 0001')
+
+
+# ✉️ Verification emails (dirty tracking)
+
+class VerificationEmailTests(TestCase):
+    def setUp(self):
+        self.event, (self.distance, _) = make_event()
+        self.runner = make_runner(self.event, self.distance, 1)
+
+    def verification_emails(self):
+        return OutgoingEmail.objects.filter(subject__contains='Verified', to_email=self.runner.email)
+
+    def test_dirty_fields_come_from_the_loaded_values(self):
+        runner = Runner.objects.get(pk=self.runner.pk)
+        self.assertFalse(runner.is_dirty())
+        runner.is_verified = True
+        self.assertEqual(runner.get_dirty_fields(), {'is_verified': False})
+        runner.save()
+        self.assertFalse(runner.is_dirty())
+
+    def test_verifying_queues_one_email_without_reselecting_the_runner(self):
+        runner = Runner.objects.get(pk=self.runner.pk)
+        runner.is_verified = True
+        with CaptureQueriesContext(connection) as queries:
+            runner.save()
+        selects = [q['sql'] for q in queries if q['sql'].startswith('SELECT') and 'registration_runner' in q['sql']]
+        self.assertEqual(selects, [])
+        self.assertEqual(self.verification_emails().count(), 1)
+
+        runner.shirt_size = 'L'
+        runner.save()
+        Runner.objects.get(pk=runner.pk).save()
+        self.assertEqual(self.verification_emails().count(), 1)
+
+    def test_verify_view_queues_exactly_one_email(self):
+        self.client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+        for _ in range(2):
+            self.client.get(reverse('registration:verify_runner', args=[self.runner.pk]))
+        self.assertEqual(self.verification_emails().count(), 1)
+
+
+class BulkVerifyTests(TestCase):
+    def setUp(self):
+        self.event, (self.five, self.ten) = make_event()
+        self.client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+
+    def bulk_verify(self, **data):
+        return self.client.post(reverse('registration:bulk_verify_runners'), {'event': self.event.pk, **data})
+
+    def test_select_all_assigns_consecutive_bibs_per_distance(self):
+        fives = [make_runner(self.event, self.five, n) for n in range(1, 4)]
+        ten = make_runner(self.event, self.ten, 4)
+        other_event, (other_five, _) = make_event(name='Other Run')
+        outsider = make_runner(other_event, other_five, 5)
+
+        self.bulk_verify(select_all='on')
+
+        self.assertEqual(
+            [Runner.objects.get(pk=r.pk).bib_number for r in fives],
+            ['5 - 0001', '5 - 0002', '5 - 0003'],
+        )
+        self.assertEqual(Runner.objects.get(pk=ten.pk).bib_number, '10 - 0001')
+        self.assertFalse(Runner.objects.get(pk=outsider.pk).is_verified)
+        self.assertEqual(OutgoingEmail.objects.filter(subject__contains='Verified').count(), 4)
+
+    def test_selected_runners_only_and_existing_bibs_are_kept(self):
+        kept = make_runner(self.event, self.five, 1, bib_number='5 - 0041')
+        picked = make_runner(self.event, self.five, 2)
+        skipped = make_runner(self.event, self.five, 3)
+
+        self.bulk_verify(runner_ids=[kept.pk, picked.pk])
+        self.bulk_verify(runner_ids=[kept.pk])  # Already verified: nothing to do
+
+        self.assertEqual(Runner.objects.get(pk=kept.pk).bib_number, '5 - 0041')
+        self.assertEqual(Runner.objects.get(pk=picked.pk).bib_number, '5 - 0042')
+        self.assertFalse(Runner.objects.get(pk=skipped.pk).is_verified)
+        self.assertEqual(OutgoingEmail.objects.filter(subject__contains='Verified').count(), 2)
+
+
+@needs_concurrent_db
+class ConcurrentBibAllocationTests(TransactionTestCase):
+    def test_concurrent_callers_never_share_a_number(self):
+        _, (distance, _) = make_event()
+        allocated = []
+
+        def allocate(i):
+            for _ in range(5):
+                allocated.extend(allocate_bib_numbers(distance, count=2))
+
+        errors = run_in_threads(allocate, 4)
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(allocated), list(range(1, 41)))
+
+
+# 📧 One registration per email per event
+
+class DuplicateEmailTests(TestCase):
+    def setUp(self):
+        use_temp_media(self)
+        self.event, (self.distance, _) = make_event(date=date.today() + timedelta(days=30))
+        make_runner(self.event, self.distance, 1, email='juan1@example.com')
+
+    def registration_form(self, **fields):
+        data = {
+            'event': self.event.pk, 'distance': self.distance.pk,
+            'first_name': 'Maria', 'last_name': 'Santos', 'email': 'maria@example.com',
+            'contact_number': '09171234567', 'age': 28, 'gender': 'F', 'shirt_size': 'S',
+        }
+        data.update(fields)
+        return RunnerRegistrationForm(data, {'proof_of_payment': receipt_upload()})
+
+    def test_constraint_ignores_case_and_spaces(self):
+        with self.assertRaises(IntegrityError) as caught, transaction.atomic():
+            make_runner(self.event, self.distance, 2, email='  JUAN1@Example.com ')
+        self.assertTrue(Runner.is_duplicate_email_error(caught.exception))
+
+    def test_same_email_in_another_event_is_allowed(self):
+        other, (distance, _) = make_event(name='Other Run')
+        make_runner(other, distance, 2, email='juan1@example.com')
+        self.assertEqual(Runner.objects.filter(normalized_email='juan1@example.com').count(), 2)
+
+    def test_form_reports_duplicate_instead_of_crashing(self):
+        form = self.registration_form(email='Juan1@example.com')
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertIsNone(form.try_save())
+        self.assertEqual(form.errors['email'], [DUPLICATE_EMAIL_MESSAGE])
+
+    def test_race_between_validation_and_save(self):
+        # The other sign-up commits after this form passed validation
+        form = self.registration_form()
+        self.assertTrue(form.is_valid(), form.errors)
+        make_runner(self.event, self.distance, 2, email='maria@example.com')
+
+        self.assertIsNone(form.try_save())
+        self.assertIn(DUPLICATE_EMAIL_MESSAGE, form.errors['email'])
+        self.assertEqual(Runner.objects.filter(normalized_email='maria@example.com').count(), 1)
+
+
+# 📎 Receipt uploads (ReceiptUploadHandler)
+
+class ReceiptUploadTests(TestCase):
+    def setUp(self):
+        use_temp_media(self)
+        self.event, (self.distance, _) = make_event(date=date.today() + timedelta(days=30))
+
+    def post(self, url, upload):
+        data = {
+            'event': self.event.pk, 'distance': self.distance.pk,
+            'first_name': 'Maria', 'last_name': 'Santos', 'email': 'maria@example.com',
+            'contact_number': '09171234567', 'age': 28, 'gender': 'F', 'shirt_size': 'S',
+            'proof_of_payment': upload,
+        }
+        return self.client.post(reverse(url), data)
+
+    def not_an_image(self):
+        return SimpleUploadedFile('receipt.png', b'%PDF-1.7 not really a png', content_type='image/png')
+
+    def oversized(self):
+        # Right signature, too many bytes
+        return SimpleUploadedFile('receipt.png', b'\x89PNG\r\n\x1a\n' + bytes(MAX_RECEIPT_SIZE), content_type='image/png')
+
+    def test_registration_form_rejects_before_saving(self):
+        cases = {
+            'Only image files are allowed': self.not_an_image(),
+            'File size must be under 5MB': self.oversized(),
+        }
+        for message, upload in cases.items():
+            with self.subTest(message):
+                response = self.post('registration:register', upload)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn(message, str(response.context['form'].errors['proof_of_payment']))
+        self.assertFalse(Runner.objects.exists())
+
+    def test_api_rejects_with_a_field_error(self):
+        for upload in (self.not_an_image(), self.oversized()):
+            response = self.post('registration:api_register', upload)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('proof_of_payment', response.json())
+        self.assertFalse(Runner.objects.exists())
+
+    def test_images_pass_through(self):
+        response = self.post('registration:register', receipt_upload())
+        self.assertTemplateUsed(response, 'registration/success.html')
+        self.assertTrue(Runner.objects.get().proof_of_payment)
+
+
+# 🌐 Public registration API
+
+class RunnerCreateAPITests(TestCase):
+    def setUp(self):
+        use_temp_media(self)
+        self.event, (self.distance, _) = make_event(date=date.today() + timedelta(days=30))
+        make_runner(self.event, self.distance, 1, first_name='Juan', email='juan@example.com')
+
+    def register(self, **fields):
+        data = {
+            'event': self.event.pk, 'distance': self.distance.pk,
+            'first_name': 'Maria', 'last_name': 'Santos', 'email': ' Maria@Example.com',
+            'contact_number': '09171234567', 'age': 28, 'gender': 'F', 'shirt_size': 'S',
+            'proof_of_payment': receipt_upload(),
+        }
+        data.update(fields)
+        return self.client.post(reverse('registration:api_register'), data)
+
+    def test_registration_queues_the_confirmation_email(self):
+        response = self.register()
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(Runner.objects.get(event=self.event, first_name='Maria').email, 'maria@example.com')
+        self.assertEqual(OutgoingEmail.objects.filter(to_email='maria@example.com').count(), 1)
+
+    def test_form_rules_apply(self):
+        other, (other_distance, _) = make_event(name='Other Run', date=date.today() + timedelta(days=30))
+        cases = {
+            'contact_number': self.register(contact_number='12345'),
+            'distance': self.register(distance=other_distance.pk),
+            'non_field_errors': self.register(first_name='Juan', last_name='Dela Cruz'),
+            'email': self.register(email='JUAN@example.com'),
+        }
+        for field, response in cases.items():
+            self.assertEqual(response.status_code, 400, field)
+            self.assertIn(field, response.json(), field)
+        self.assertEqual(OutgoingEmail.objects.count(), 0)
+
+    def test_closed_registration_is_refused(self):
+        Event.objects.filter(pk=self.event.pk).update(registration_deadline=date.today() - timedelta(days=1))
+        response = self.register()
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('event', response.json())
+
+
+# 🧮 Registered/verified counters
+
+class RunnerCountTests(TestCase):
+    def setUp(self):
+        self.event, (self.five, self.ten) = make_event()
+
+    def assertCounts(self, event, five, ten):
+        self.event.refresh_from_db()
+        self.five.refresh_from_db()
+        self.ten.refresh_from_db()
+        self.assertEqual((self.event.registered_count, self.event.verified_count), event)
+        self.assertEqual((self.five.registered_count, self.five.verified_count), five)
+        self.assertEqual((self.ten.registered_count, self.ten.verified_count), ten)
+
+    def test_create_verify_move_and_delete(self):
+        runner = make_runner(self.event, self.five, 1)
+        make_runner(self.event, self.ten, 2, is_verified=True)
+        self.assertCounts(event=(2, 1), five=(1, 0), ten=(1, 1))
+
+        runner.is_verified = True
+        runner.save()
+        self.assertCounts(event=(2, 2), five=(1, 1), ten=(1, 1))
+
+        runner.distance = self.ten
+        runner.save()
+        self.assertCounts(event=(2, 2), five=(0, 0), ten=(2, 2))
+
+        runner.delete()
+        self.assertCounts(event=(1, 1), five=(0, 0), ten=(1, 1))
+
+    def test_bulk_create_and_bulk_verify(self):
+        create_runners([
+            Runner(event=self.event, distance=self.five, first_name=f"Ana{n}", last_name='Reyes',
+                   email=f"ana{n}@example.com", contact_number='09171234567', age=25, gender='F', shirt_size='S')
+            for n in range(3)
+        ], send_emails=False)
+        self.assertCounts(event=(3, 0), five=(3, 0), ten=(0, 0))
+
+        self.assertEqual(verify_runners(Runner.objects.filter(event=self.event)), 3)
+        self.assertCounts(event=(3, 3), five=(3, 3), ten=(0, 0))
+
+        Runner.objects.filter(first_name='Ana0').delete()
+        self.assertCounts(event=(2, 2), five=(2, 2), ten=(0, 0))
+
+    def test_reconcile_fixes_drift(self):
+        make_runner(self.event, self.five, 1)
+        Event.objects.filter(pk=self.event.pk).update(registered_count=9)
+        self.assertEqual(reconcile_runner_counts(), 1)
+        self.assertCounts(event=(1, 0), five=(1, 0), ten=(0, 0))
+
+
+# 👥 Group registration API
+
+class GroupRegistrationAPITests(TestCase):
+    def setUp(self):
+        self.media = use_temp_media(self)
+        self.event, (self.five, self.ten) = make_event(date=date.today() + timedelta(days=30))
+        make_runner(self.event, self.five, 1, email='taken@example.com')
+        self.client.force_login(User.objects.create_user('coach', password='x', is_staff=True))
+
+    def member(self, n, **fields):
+        return {
+            'distance': self.five.pk, 'first_name': f"Ana{n}", 'last_name': 'Reyes',
+            'email': f"ana{n}@example.com", 'contact_number': '09171234567',
+            'age': 25, 'gender': 'F', 'shirt_size': 'S', **fields,
+        }
+
+    def register(self, runners):
+        return self.client.post(reverse('registration:api_register_group'), {
+            'event': self.event.pk, 'proof_of_payment': receipt_upload(), 'runners': json.dumps(runners),
+        })
+
+    def stored_receipts(self):
+        return sorted(str(path.relative_to(self.media)) for path in Path(self.media).rglob('*') if path.is_file())
+
+    def test_registers_everyone_with_one_shared_receipt(self):
+        response = self.register([self.member(1), self.member(2, distance=self.ten.pk, email=' ANA2@example.com')])
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['created'], 2)
+
+        runners = Runner.objects.filter(last_name='Reyes')
+        self.assertEqual({r.email for r in runners}, {'ana1@example.com', 'ana2@example.com'})
+        self.assertEqual(len({(r.proof_of_payment.name, r.proof_thumbnail.name) for r in runners}), 1)
+        self.assertEqual(len(self.stored_receipts()), 2)  # Receipt and thumbnail, once
+        self.assertEqual(OutgoingEmail.objects.filter(to_email__startswith='ana').count(), 2)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.registered_count, 3)
+
+    def test_row_errors_line_up_and_nothing_is_saved(self):
+        other, (other_distance, _) = make_event(name='Other Run')
+        response = self.register([
+            self.member(1),
+            self.member(2, distance=other_distance.pk),
+            self.member(3, email='Taken@example.com'),
+            self.member(4, email='ana1@example.com'),  # Both copies are flagged
+            self.member(5, contact_number='123'),
+        ])
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()['runners']
+        self.assertEqual([sorted(e) for e in errors], [['email'], ['distance'], ['email'], ['email'], ['contact_number']])
+        self.assertFalse(Runner.objects.filter(last_name='Reyes').exists())
+        self.assertEqual(self.stored_receipts(), [])
+
+    def test_limits_and_permissions(self):
+        self.assertEqual(self.register([]).status_code, 400)
+        self.assertEqual(self.register([self.member(n) for n in range(MAX_GROUP_SIZE + 1)]).status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.register([self.member(1)]).status_code, 403)
+
+    def test_email_taken_after_validation_removes_the_receipt(self):
+        # Another sign-up wins the race between the batch check and the insert
+        with mock.patch('registration.serializers.check_runner_batch'):
+            response = self.register([self.member(1, email='taken@example.com')])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('email', response.json())
+        self.assertEqual(self.stored_receipts(), [])
+
+
+# 🔍 Runner search (search_runners)
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.event, (self.five, self.ten) = make_event()
+        self.juan = make_runner(self.event, self.five, 1, first_name='Juan', last_name='Dela Cruz', bib_number='5 - 0007')
+        self.maria = make_runner(self.event, self.ten, 2, first_name='Maria', last_name='Santos', email='maria@example.org', bib_number='10 - 0012')
+
+    def search(self, term):
+        return list(search_runners(Runner.objects.all(), term))
+
+    def test_search_by_name_prefix(self):
+        self.assertEqual(self.search('dela cr'), [self.juan])
+        self.assertEqual(self.search('  MARIA  '), [self.maria])
+
+    def test_search_by_email(self):
+        self.assertEqual(self.search('maria@example.org'), [self.maria])
+
+    def test_search_by_bib_in_any_format(self):
+        for term in ('5 - 0007', '5-0007', '5 -0007', '0007'):
+            with self.subTest(term=term):
+                self.assertEqual(self.search(term), [self.juan])
+        self.assertEqual(self.search('10-0012'), [self.maria])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.maria.last_name = 'Reyes'
+        self.maria.save()
+        self.assertEqual(self.search('santos'), [])
+        self.assertEqual(self.search('reyes'), [self.maria])
+
+        self.juan.delete()
+        self.assertEqual(self.search('juan'), [])
+
+
+# 📄 Keyset pagination (KeysetPaginator)
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        event, (distance, _) = make_event()
+        self.runners = [make_runner(event, distance, n, last_name=f"Runner{n:02d}") for n in range(1, 8)]
+        self.paginator = KeysetPaginator(Runner.objects.all(), ['last_name', 'first_name', 'pk'], per_page=3)
+
+    def test_pages_forward_and_back(self):
+        first = self.paginator.page()
+        second = self.paginator.page(first.next_token)
+        third = self.paginator.page(second.next_token)
+        self.assertEqual(list(second), self.runners[3:6])
+        self.assertEqual(list(third), self.runners[6:])
+        self.assertFalse(third.has_next())
+        self.assertEqual(list(self.paginator.page(second.previous_token)), list(first))
+
+    def test_tampered_token_starts_over(self):
+        token = self.paginator.page().next_token
+        value, signature = token.rsplit(':', 1)
+        for bad in (f"{value}:{signature[::-1]}", 'not-a-token', token[:-1]):
+            with self.subTest(bad):
+                page = self.paginator.page(bad)
+                self.assertEqual(list(page), self.runners[:3])
+                self.assertFalse(page.has_previous())
+
+    def test_token_for_another_ordering_starts_over(self):
+        token = KeysetPaginator(Runner.objects.all(), ['-created_at', 'pk'], per_page=3).page().next_token
+        self.assertEqual(list(self.paginator.page(token)), self.runners[:3])
+
+    def test_expired_token_starts_over(self):
+        token = self.paginator.page().next_token
+        later = time.time() + TOKEN_MAX_AGE + 1
+        with mock.patch('django.core.signing.time.time', return_value=later):
+            self.assertEqual(list(self.paginator.page(token)), self.runners[:3])
+
+
+# 🗄️ Cache versions and dashboard metrics
+
+class CacheVersionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_bump_changes_the_version(self):
+        first = version('home')
+        self.assertEqual(version('home'), first)
+        bump_version('home')
+        self.assertNotEqual(version('home'), first)
+
+    def test_lost_version_key_never_revives_old_entries(self):
+        old = version('distances')
+        cache.set(f"distances:{old}:event:1", 'stale', None)
+        cache.delete('version:distances')  # As if culled
+        self.assertNotEqual(version('distances'), old)
+
+    def test_saving_an_event_invalidates_its_caches(self):
+        event, _ = make_event()
+        before = version('api-events')
+        event.name = 'Renamed Run'
+        event.save()
+        self.assertNotEqual(version('api-events'), before)
+
+    def test_dashboard_metrics_follow_runner_changes(self):
+        event, (distance, _) = make_event(date=date.today() + timedelta(days=3))
+        make_runner(event, distance, 1)
+        metrics = dashboard_metrics()
+        self.assertEqual((metrics['event_count'], metrics['upcoming_week'], metrics['runner_count'], metrics['unverified']), (1, 1, 1, 1))
+
+        with self.assertNumQueries(1):  # Just the cache row
+            dashboard_metrics()
+
+        make_runner(event, distance, 2, is_verified=True)
+        metrics = dashboard_metrics()
+        self.assertEqual((metrics['runner_count'], metrics['unverified']), (2, 1))
+
+
+# 📤 Runner exports
+
+class ExportJobTests(TestCase):
+    def setUp(self):
+        self.media = use_temp_media(self)
+        self.event, (self.five, _) = make_event()
+        make_runner(self.event, self.five, 1, last_name='Alonzo')
+        self.client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+
+    def run_export(self, **data):
+        data = {'event': self.event.pk, 'export_type': 'xlsx', **data}
+        response = self.client.post(reverse('registration:export_start'), data)
+        self.assertEqual(response.status_code, 302)
+        job = claim_export_job()
+        run_export_job(job)
+        return job
+
+    def test_workbook_is_stored_and_streamed_from_storage(self):
+        job = self.run_export()
+        self.assertEqual(job.status, ExportJob.STATUS_DONE)
+        self.assertTrue(default_storage.exists(job.file.name))
+
+        response = self.client.get(reverse('registration:export_job_download', args=[job.pk]))
+        self.assertEqual(response.status_code, 200)
+        sheet = openpyxl.load_workbook(io.BytesIO(b"".join(response.streaming_content))).active
+        self.assertEqual(sheet['A5'].value, 'Alonzo, Juan1')
+
+    def test_receipts_use_the_thumbnails_stored_at_upload(self):
+        make_runner(self.event, self.five, 2, last_name='Bautista', proof_of_payment=receipt_upload(size=(800, 600)))
+        with mock.patch('registration.images.render_receipt') as render:
+            job = self.run_export(include_receipts='on')
+        render.assert_not_called()
+
+        with default_storage.open(job.file.name, 'rb') as stored:
+            sheet = openpyxl.load_workbook(stored).active
+        self.assertEqual(sheet['H5'].value, 'No receipt')  # Alonzo
+        self.assertEqual(len(sheet._images), 1)
+        self.assertEqual(sheet._images[0].anchor._from.row, 5)  # Bautista, 0-based
+
+    def test_purge_deletes_expired_jobs_and_their_files(self):
+        job = self.run_export()
+        ExportJob.objects.filter(pk=job.pk).update(created_at=timezone.now() - timedelta(days=2))
+
+        self.assertEqual(purge_expired_exports(), 1)
+        self.assertFalse(ExportJob.objects.exists())
+        self.assertFalse(default_storage.exists(job.file.name))
+
+
+class StreamingExportTests(TestCase):
+    def setUp(self):
+        self.event, (five, ten) = make_event()
+        make_runner(self.event, five, 1, last_name='Alonzo', bib_number='5 - 0001', is_verified=True)
+        make_runner(self.event, ten, 2, last_name='Bautista', first_name='Ana, Jr.', gender='F', bib_number='10 - 0001')
+        other, (other_five, _) = make_event(name='Other Run')
+        make_runner(other, other_five, 3, last_name='Cruz')
+        self.client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+
+    def export(self, export_type, **filters):
+        response = self.client.post(reverse('registration:export_start'), {'event': self.event.pk, 'export_type': export_type, **filters})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn(f'.{export_type}"', response['Content-Disposition'])
+        return b"".join(response.streaming_content).decode()
+
+    def test_csv(self):
+        rows = list(csv.reader(io.StringIO(self.export('csv'))))
+        self.assertEqual(rows[0], ['Name', 'Email', 'Distance', 'Bib', 'Age', 'Gender', 'Shirt Size'])
+        self.assertEqual(rows[1], ['Alonzo, Juan1', 'juan1@example.com', '5', '5 - 0001', '30', 'Male', 'M'])
+        # Quoted comma in the name; no bib until verified
+        self.assertEqual(rows[2][:4], ['Bautista, Ana, Jr.', 'juan2@example.com', '10', ''])
+        self.assertEqual(len(rows), 3)
+
+    def test_jsonl_with_filters(self):
+        lines = self.export('jsonl', gender='F').splitlines()
+        self.assertEqual([json.loads(line) for line in lines], [{
+            'name': 'Bautista, Ana, Jr.', 'email': 'juan2@example.com', 'distance': '10',
+            'bib': '', 'age': 30, 'gender': 'Female', 'shirt_size': 'M',
+        }])
+
+
+class ReceiptsZipTests(TestCase):
+    def test_archive_has_each_receipt_and_an_index(self):
+        use_temp_media(self)
+        event, (five, _) = make_event()
+        verified = make_runner(event, five, 1, last_name='Alonzo', bib_number='5 - 0001', is_verified=True,
+                               proof_of_payment=receipt_upload())
+        make_runner(event, five, 2, last_name='Bautista', proof_of_payment=receipt_upload())
+        lost = make_runner(event, five, 3, last_name='Cruz')
+        Runner.objects.filter(pk=lost.pk).update(proof_of_payment='receipts/gone.jpg')
+        make_runner(event, five, 4, last_name='Diaz')  # No receipt: left out
+        self.client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+
+        response = self.client.get(reverse('registration:event_receipts_zip', args=[event.pk]))
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+
+        self.assertEqual(sorted(archive.namelist()), ['5-0001_Alonzo_Juan1.jpg', 'index.csv', 'unverified_Bautista_Juan2.jpg'])
+        with default_storage.open(Runner.objects.get(pk=verified.pk).proof_of_payment.name, 'rb') as stored:
+            self.assertEqual(archive.read('5-0001_Alonzo_Juan1.jpg'), stored.read())
+
+        index = list(csv.DictReader(io.StringIO(archive.read('index.csv').decode())))
+        self.assertEqual([(row['last_name'], row['status']) for row in index],
+                         [('Alonzo', 'ok'), ('Bautista', 'ok'), ('Cruz', 'missing')])
+
+
+# 🏠 Cached home page and events API
+
+class HomePageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.event, _ = make_event(name='Surigao Night Run')
+
+    def test_conditional_get_answers_304(self):
+        response = self.client.get(reverse('registration:home'))
+        self.assertContains(response, 'Surigao Night Run')
+        etag = response['ETag']
+
+        with self.assertNumQueries(2):  # Version and page from the cache table; no Event query
+            again = self.client.get(reverse('registration:home'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(again.status_code, 304)
+
+    def test_saving_an_event_changes_the_page(self):
+        etag = self.client.get(reverse('registration:home'))['ETag']
+        self.event.name = 'Surigao Dawn Run'
+        self.event.save()
+
+        response = self.client.get(reverse('registration:home'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, 'Surigao Dawn Run')
+
+
+class EventListAPITests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.event, (self.five, _) = make_event()
+        make_event(name='Earlier Run', labels=('21',), date=RACE_DAY - timedelta(days=7))
+        make_event(name='Last Year', date=date.today() - timedelta(days=365))
+
+    def get(self, **headers):
+        return self.client.get(reverse('registration:api_events'), **headers)
+
+    def test_lists_upcoming_events_with_distances(self):
+        with CaptureQueriesContext(connection) as queries:
+            events = self.get().json()
+        self.assertEqual([e['name'] for e in events], ['Earlier Run', 'Surigao Run'])
+        self.assertEqual([d['label'] for d in events[1]['distances']], ['5', '10'])
+        self.assertEqual(len(self.model_queries(queries)), 2)  # Events, then all their distances
+
+        with CaptureQueriesContext(connection) as queries:
+            self.get()
+        self.assertEqual(self.model_queries(queries), [])
+
+    def model_queries(self, queries):
+        return [q for q in queries if 'registration_event' in q['sql'] or 'registration_distance' in q['sql']]
+
+    def test_etag_and_invalidation(self):
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.five.label = '6'
+        self.five.save()
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([d['label'] for d in response.json()[1]['distances']], ['6', '10'])
+
+    def test_date_is_read_per_request(self):
+        class AfterRaceDay(date):
+            @classmethod
+            def today(cls):
+                return RACE_DAY + timedelta(days=1)
+
+        self.get()
+        with mock.patch('registration.api_views.date', AfterRaceDay):
+            self.assertEqual(self.get().json(), [])
+
+
+# 📥 CSV/XLSX runner import
+
+IMPORT_HEADER = "First Name,Last Name,Email,Contact Number,Distance,Age,Gender,Shirt Size,Verified,Bib\n"
+
+
+class RunnerImportTests(TestCase):
+    def setUp(self):
+        self.event, (self.five_k, self.ten_k) = make_event()
+        make_runner(self.event, self.five_k, 1, email='taken@example.com')
+
+    def run_import(self, rows, **options):
+        data = (IMPORT_HEADER + rows).encode()
+        return import_runners(self.event, io.BytesIO(data), 'runners.csv', **options)
+
+    def test_bad_rows_are_reported_by_line(self):
+        result = self.run_import(
+            "Ana,Reyes,ana@example.com,9171234567,5 KM,25,female,s,yes,\n"
+            "Ben,Cruz,not-an-email,09171234567,5,30,M,M,,\n"
+            "Carl,Lim,carl@example.com,09171234567,42,30,M,M,,\n"
+            "Dina,Go,taken@example.com,09171234567,10,30,F,M,,\n"
+            "Eve,Tan,eve@example.com,09171234567,10,30,F,M,,\n"
+            "Eva,Tan,EVE@example.com,09171234567,10,31,F,M,,\n"
+        )
+
+        self.assertEqual(result.created, 1)
+        self.assertEqual([line for line, _ in result.errors], [3, 4, 5, 6, 7])
+        errors = dict(result.errors)
+        self.assertIn('email', errors[3])
+        self.assertIn('distance', errors[4])
+        self.assertIn('email', errors[5])  # Already registered
+        self.assertIn('email', errors[6])  # Repeated in the file: neither row is taken
+        self.assertIn('email', errors[7])
+
+        ana = Runner.objects.get(email='ana@example.com')
+        self.assertEqual((ana.contact_number, ana.gender, ana.shirt_size), ('09171234567', 'F', 'S'))
+        self.assertTrue(ana.is_verified)
+
+    def test_missing_required_columns_reject_the_file(self):
+        data = b"First Name,Last Name,Email,Distance\nAna,Reyes,ana@example.com,5\n"
+        with self.assertRaisesMessage(RunnerImportError, 'contact_number'):
+            import_runners(self.event, io.BytesIO(data), 'runners.csv')
+
+    def test_dry_run_saves_nothing(self):
+        result = self.run_import("Ana,Reyes,ana@example.com,09171234567,5,25,F,S,,\n", dry_run=True)
+        self.assertEqual(result.created, 1)
+        self.assertFalse(Runner.objects.filter(email='ana@example.com').exists())
+
+    def test_allocate_bibs_for_verified_rows(self):
+        result = self.run_import(
+            "Ana,Reyes,ana@example.com,09171234567,5,25,F,S,yes,\n"
+            "Ben,Cruz,ben@example.com,09171234567,5,30,M,M,no,\n",
+            allocate_bibs=True, send_emails=True,
+        )
+        self.assertEqual(result.bibs_allocated, 1)
+        self.assertEqual(Runner.objects.get(email='ana@example.com').bib_number, '5 - 0001')
+        self.assertIsNone(Runner.objects.get(email='ben@example.com').bib_number)
+        self.assertEqual(OutgoingEmail.objects.filter(to_email__in=['ana@example.com', 'ben@example.com']).count(), 2)
+
+
+    def test_bibs_from_the_file_are_checked_and_normalized(self):
+        make_runner(self.event, self.five_k, 2, is_verified=True, bib_number='5 - 0003')
+        result = self.run_import(
+            "Ana,Reyes,ana@example.com,09171234567,5,25,F,S,yes,5-41\n"
+            "Ben,Cruz,ben@example.com,09171234567,5,30,M,M,yes,10 - 0002\n"
+            "Cy,Ong,cy@example.com,09171234567,5,30,M,M,yes,5 - 0003\n"
+            "Di,Uy,di@example.com,09171234567,5,30,F,M,yes,5 - 0041\n"
+            "Ed,Yu,ed@example.com,09171234567,5,30,M,M,yes,abc\n"
+        )
+
+        self.assertEqual(result.created, 1)
+        errors = dict(result.errors)
+        self.assertEqual(sorted(errors), [3, 4, 5, 6])
+        self.assertTrue(all('bib_number' in errors[line] for line in errors))
+        self.assertEqual(Runner.objects.get(email='ana@example.com').bib_number, '5 - 0041')
+        # The counter moved past the imported bib
+        self.assertEqual(generate_bib_number(self.five_k), '5 - 0042')
+
+    def test_email_registered_during_the_import_is_a_row_error(self):
+        # As if the conflicting sign-up landed after the duplicate check ran
+        with mock.patch('registration.imports.check_runner_batch'):
+            result = self.run_import(
+                "Ana,Reyes,ana@example.com,09171234567,5,25,F,S,,\n"
+                "Dina,Go,taken@example.com,09171234567,10,30,F,M,,\n"
+                "Ben,Cruz,ben@example.com,09171234567,5,30,M,M,,\n"
+            )
+
+        self.assertEqual(result.created, 2)
+        self.assertEqual(result.errors, [(3, {'email': [DUPLICATE_EMAIL_MESSAGE]})])
+        self.assertEqual(Runner.objects.filter(event=self.event).count(), 3)
+
+
+# 📊 Google Sheets sync
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self.payload = payload or {}
+        self.text = str(self.payload)
+
+    def json(self):
+        return self.payload
+
+
+class FakeSession:
+    """Records batchUpdate bodies; answers with the queued status codes, then 200."""
+
+    def __init__(self, statuses=()):
+        self.statuses = list(statuses)
+        self.requests = []
+
+    def post(self, url, json=None, timeout=None):
+        self.requests.append((url, json))
+        status = self.statuses.pop(0) if self.statuses else 200
+        return FakeResponse(status, {'totalUpdatedRows': 1} if status == 200 else {'error': status})
+
+    def written(self):
+        """{range: values} over every request so far."""
+        return {item['range']: item['values'] for _, body in self.requests for item in body['data']}
+
+
+class SheetSyncTests(TestCase):
+    def setUp(self):
+        self.event, (self.distance, _) = make_event()
+        self.runners = [make_runner(self.event, self.distance, n) for n in range(1, 4)]
+        self.sync = SheetSync.objects.create(event=self.event, spreadsheet_id='sheet-1', sheet_title="Runners")
+        self.sleeps = []
+
+    def sheets(self, session):
+        return SheetsClient(session=session, base_url='https://sheets.test', sleep=self.sleeps.append)
+
+    def age_watermark(self):
+        # Everything so far is older than the overlap the next sync looks back over
+        past = timezone.now() - timedelta(hours=1)
+        Runner.objects.update(updated_at=past)
+        SheetSync.objects.filter(pk=self.sync.pk).update(synced_until=past + timedelta(minutes=30))
+        self.sync.refresh_from_db()
+
+    def test_first_sync_writes_header_and_rows(self):
+        session = FakeSession()
+        written = sync_sheet(self.sync, self.sheets(session))
+
+        self.assertEqual(written, 4)
+        url, _ = session.requests[0]
+        self.assertEqual(url, 'https://sheets.test/v4/spreadsheets/sheet-1/values:batchUpdate')
+        ranges = session.written()
+        self.assertEqual(ranges["'Runners'!A1:K1"], [SHEET_HEADERS])
+        self.assertEqual([row[2] for row in ranges["'Runners'!A2:K4"]], ['Juan1', 'Juan2', 'Juan3'])
+
+        self.sync.refresh_from_db()
+        self.assertEqual(self.sync.next_row, 5)
+        self.assertIsNotNone(self.sync.synced_until)
+
+    def test_changed_runner_is_rewritten_in_place(self):
+        sync_sheet(self.sync, self.sheets(FakeSession()))
+        self.age_watermark()
+
+        runner = self.runners[1]
+        runner.first_name = 'Pedro'
+        runner.save()
+        session = FakeSession()
+        self.assertEqual(sync_sheet(self.sync, self.sheets(session)), 1)
+        self.assertEqual(session.written()["'Runners'!A3:K3"][0][2], 'Pedro')
+
+    def test_deleted_runner_row_is_blanked(self):
+        sync_sheet(self.sync, self.sheets(FakeSession()))
+        self.age_watermark()
+
+        self.runners[0].delete()
+        session = FakeSession()
+        sync_sheet(self.sync, self.sheets(session))
+        self.assertEqual(session.written(), {"'Runners'!A2:K2": [BLANK_ROW]})
+        self.assertFalse(SheetRow.objects.filter(sync=self.sync, row_number=2).exists())
+
+    def test_rate_limits_are_retried_with_backoff(self):
+        session = FakeSession(statuses=[429, 503])
+        sync_sheet(self.sync, self.sheets(session))
+        self.assertEqual(self.sleeps, [1, 2])
+
+    def test_failed_sync_keeps_the_watermark(self):
+        session = FakeSession(statuses=[200, 400])
+        with self.assertRaises(SheetsError):
+            sync_sheet(self.sync, self.sheets(session))
+
+        self.sync.refresh_from_db()
+        self.assertIsNone(self.sync.synced_until)
+        self.assertIn('400', self.sync.last_error)
+
+
+# 🎽 Race-day check-in
+
+class CheckinTests(TestCase):
+    def setUp(self):
+        self.event, (self.five_k, self.ten_k) = make_event()
+        self.juan = make_runner(self.event, self.five_k, 1, first_name='Juan', is_verified=True, bib_number='5 - 0007')
+        self.joan = make_runner(self.event, self.ten_k, 2, first_name='Joan', last_name='Abad', bib_number='10 - 0007')
+        self.index = CheckinIndex(self.event.pk)
+        self.index.load()
+
+    def lookup(self, query):
+        return [entry.id for entry in self.index.lookup(query)]
+
+    def test_bib_lookup(self):
+        self.assertEqual(self.lookup('5-0007'), [self.juan.pk])
+        self.assertEqual(self.lookup('10 0007'), [self.joan.pk])
+        # A bare number matches it in every distance
+        self.assertEqual(sorted(self.lookup('7')), sorted([self.juan.pk, self.joan.pk]))
+
+    def test_unknown_prefixed_bib_matches_nothing(self):
+        self.assertEqual(self.lookup('21-0007'), [])
+        self.assertEqual(self.lookup('5 - 0008'), [])
+
+    def test_name_lookup_matches_every_word_prefix(self):
+        self.assertEqual(self.lookup('jo'), [self.joan.pk])
+        self.assertEqual(self.lookup('dela ju'), [self.juan.pk])
+        self.assertEqual(self.lookup('j'), [self.joan.pk, self.juan.pk])  # Abad before Dela Cruz
+        self.assertEqual(self.lookup('nobody'), [])
+
+    def test_refresh_sees_delete_and_add_in_the_same_window(self):
+        self.joan.delete()
+        maria = make_runner(self.event, self.five_k, 3, first_name='Maria')
+        self.index.refresh(force=True)
+
+        self.assertEqual(self.lookup('jo'), [])
+        self.assertEqual(self.lookup('maria'), [maria.pk])
+
+    def test_refresh_drops_runner_moved_to_another_event(self):
+        other, (distance, _) = make_event(name='Other Run')
+        Runner.objects.filter(pk=self.joan.pk).update(event=other, distance=distance, updated_at=timezone.now())
+        self.index.refresh(force=True)
+        self.assertEqual(self.lookup('joan'), [])
+
+    def test_claim_needs_verification_and_happens_once(self):
+        entry, claimed = claim_kit(self.joan.pk)
+        self.assertFalse(claimed)
+        self.assertIsNone(entry.kit_claimed_at)
+
+        entry, claimed = claim_kit(self.juan.pk)
+        self.assertTrue(claimed)
+        first_claim = entry.kit_claimed_at
+        entry, claimed = claim_kit(self.juan.pk)
+        self.assertFalse(claimed)
+        self.assertEqual(entry.kit_claimed_at, first_claim)
+
+    def test_claim_view(self):
+        staff = User.objects.create_user('desk', password='x', is_staff=True)
+        self.client.force_login(staff)
+
+        response = self.client.post(reverse('registration:checkin_claim', args=[self.joan.pk]))
+        self.assertEqual(response.status_code, 409)
+        response = self.client.post(reverse('registration:checkin_claim', args=[self.juan.pk]))
+        self.assertEqual(response.json()['claimed'], True)
+        response = self.client.get(reverse('registration:checkin_lookup', args=[self.event.pk]), {'q': '5-0007'})
+        self.assertIsNotNone(response.json()['results'][0]['kit_claimed_at'])
+
+
+@needs_concurrent_db
+class ConcurrentClaimTests(TransactionTestCase):
+    def test_only_one_desk_claims_a_kit(self):
+        event, (distance, _) = make_event()
+        runner = make_runner(event, distance, 1, is_verified=True, bib_number='5 - 0001')
+        claims = []
+
+        errors = run_in_threads(lambda i: claims.append(claim_kit(runner.pk)[1]), 4)
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(claims), [False, False, False, True])
+
+
+# 🏁 Results ingestion and ranking
+
+class ResultsTests(TestCase):
+    def setUp(self):
+        self.event, (self.five_k, self.ten_k) = make_event()
+        self.runners = {}
+        for n, (distance, gender, age) in enumerate([
+            (self.five_k, 'M', 30), (self.five_k, 'F', 30), (self.five_k, 'M', 45),
+            (self.five_k, 'M', 33), (self.ten_k, 'F', 25),
+        ], start=1):
+            bib = f"{distance.label} - {n:04d}"
+            self.runners[bib] = make_runner(
+                self.event, distance, n, gender=gender, age=age, is_verified=True, bib_number=bib
+            )
+
+    def ingest(self, text, gun_starts=None):
+        return import_timing_reads(self.event, io.BytesIO(text.encode()), gun_starts=gun_starts)
+
+    def result(self, bib):
+        return RaceResult.objects.get(runner=self.runners[bib])
+
+    def at(self, clock):
+        return parse_read_time(clock, RACE_DAY)
+
+    def test_parse_read_time_formats(self):
+        self.assertEqual(self.at('6:12:03'), self.at('06:12:03'))
+        self.assertEqual(self.at('6:12:03,5').microsecond, 500000)
+        self.assertEqual(self.at('2030-06-02 6:00:00').date(), date(2030, 6, 2))
+        with self.assertRaises(ValueError):
+            self.at('6h12')
+
+    def test_two_mat_ranking(self):
+        summary = self.ingest(
+            "Bib,Time,Location\n"
+            "5-0001,6:00:10,Start\n5-0001,6:25:00,Finish\n5-0001,6:25:30,Finish\n"
+            "5-0002,6:00:40,Start\n5-0002,6:25:20,Finish\n"
+            "5-0003,6:00:05,Start\n5-0003,6:24:59,Finish\n"
+            "10-0005,6:00:00,Start\n10-0005,6:50:00,Finish\n"
+            "99-0001,6:30:00,Finish\n",
+            gun_starts={self.five_k: self.at('6:00:00')},
+        )
+        self.assertEqual(summary.finishers, 4)
+        self.assertEqual(dict(summary.unknown_bibs), {'99-0001': 1})
+
+        first, second, third = self.result('5 - 0003'), self.result('5 - 0001'), self.result('5 - 0002')
+        self.assertEqual([r.distance_rank for r in (first, second, third)], [1, 2, 3])
+        self.assertEqual(format_duration(second.gun_time), '0:25:00')  # First finish read counts
+        self.assertEqual(format_duration(second.chip_time), '0:24:50')
+        self.assertEqual((first.gender_rank, second.gender_rank, third.gender_rank), (1, 2, 1))
+        self.assertEqual((first.age_category, first.category_rank), ('40_49', 1))
+        self.assertEqual(self.result('10 - 0005').distance_rank, 1)
+
+    def test_ties_break_on_chip_time_then_bib(self):
+        self.ingest(
+            "Bib,Time,Location\n"
+            "5-0001,6:00:30,Start\n5-0001,6:30:00,Finish\n"
+            "5-0004,6:00:10,Start\n5-0004,6:30:00,Finish\n"
+            "5-0003,6:00:30,Start\n5-0003,6:30:00,Finish\n",
+            gun_starts={self.five_k: self.at('6:00:00')},
+        )
+        ranks = {bib: self.result(bib).distance_rank for bib in ('5 - 0001', '5 - 0003', '5 - 0004')}
+        self.assertEqual(ranks, {'5 - 0001': 1, '5 - 0003': 2, '5 - 0004': 3})
+
+    def test_single_mat_first_read_starts_last_read_finishes(self):
+        summary = self.ingest(
+            "Bib,Time\n"
+            "5-0001,6:00:05\n5-0002,6:00:06\n5-0001,6:00:09\n"
+            "5-0001,6:26:00\n5-0004,6:31:00\n"
+        )
+        self.assertTrue(summary.single_mat)
+        self.assertEqual(summary.finishers, 2)
+
+        juan = self.result('5 - 0001')
+        self.assertEqual(format_duration(juan.chip_time), '0:25:55')
+        self.assertEqual(juan.distance_rank, 1)
+        # Only crossed at the start: no finish, not ranked
+        self.assertIsNone(self.result('5 - 0002').distance_rank)
+        # Only read at the finish: gun time from the first start read
+        self.assertEqual(format_duration(self.result('5 - 0004').gun_time), '0:30:55')
+
+    def test_impossible_times_are_not_ranked(self):
+        self.ingest(
+            "Bib,Time,Location\n"
+            "5-0001,6:00:00,Start\n5-0001,6:03:00,Finish\n"  # 3 minutes for 5 km
+            "5-0002,6:00:00,Start\n5-0002,5:59:00,Finish\n"  # Before the gun
+            "5-0003,6:00:00,Start\n5-0003,6:28:00,Finish\n",
+            gun_starts={self.five_k: self.at('6:00:00')},
+        )
+        self.assertIsNone(self.result('5 - 0001').gun_time)
+        self.assertIsNone(self.result('5 - 0002').gun_time)
+        self.assertEqual(self.result('5 - 0003').distance_rank, 1)
+
+    def test_late_start_read_falls_back_to_gun_time(self):
+        # A start read next to the finish (runner re-crossed the start mat) can't be the start
+        self.ingest(
+            "Bib,Time,Location\n5-0001,6:27:00,Start\n5-0001,6:28:00,Finish\n",
+            gun_starts={self.five_k: self.at('6:00:00')},
+        )
+        result = self.result('5 - 0001')
+        self.assertEqual(format_duration(result.gun_time), '0:28:00')
+        self.assertEqual(result.chip_time, result.gun_time)
+
+    def test_separate_files_merge_and_rerank(self):
+        self.ingest("Bib,Time,Location\n5-0001,6:00:10,Start\n5-0002,6:00:20,Start\n")
+        self.assertEqual(rank_results(self.event), 0)
+
+        self.ingest("Bib,Time,Location\n5-0002,6:24:00,Finish\n5-0001,6:25:00,Finish\n")
+        self.assertEqual(self.result('5 - 0002').distance_rank, 1)
+        self.assertEqual(format_duration(self.result('5 - 0001').chip_time), '0:24:50')
+
+    def test_results_page(self):
+        self.ingest(
+            "Bib,Time,Location\n5-0001,6:00:00,Start\n5-0001,6:25:00,Finish\n",
+            gun_starts={self.five_k: self.at('6:00:00')},
+        )
+        response = self.client.get(reverse('registration:event_results', args=[self.event.pk]))
+        self.assertContains(response, '0:25:00')
+        self.assertContains(response, 'No finishers yet.')  # 10 km
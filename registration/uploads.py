@@ -0,0 +1,64 @@
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+
+MAX_RECEIPT_SIZE = 5 * 1024 * 1024  # 5MB per uploaded image
+
+# Leading bytes of the image formats Pillow can decode for a receipt
+IMAGE_SIGNATURES = (
+    b'\xff\xd8\xff',        # JPEG
+    b'\x89PNG\r\n\x1a\n',   # PNG
+    b'GIF87a',
+    b'GIF89a',
+)
+
+
+def is_image_header(data):
+    if data.startswith(IMAGE_SIGNATURES):
+        return True
+    # WebP: "RIFF" <size> "WEBP"
+    return data[:4] == b'RIFF' and data[8:12] == b'WEBP'
+
+
+class ReceiptUploadHandler(FileUploadHandler):
+    """
+    Inspects uploaded files while they stream in. The first chunk must look
+    like an image and the running byte count must stay under
+    MAX_RECEIPT_SIZE; otherwise the upload is stopped before the rest of the
+    file is buffered. The reason is stored on request.upload_errors.
+    """
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        if start == 0 and not is_image_header(raw_data):
+            self.reject("❌ Only image files are allowed (JPG, PNG, etc).")
+
+        self.received += len(raw_data)
+        if self.received > MAX_RECEIPT_SIZE:
+            self.reject("❌ File size must be under 5MB.")
+
+        # Hand the chunk on to Django's memory/temporary file handlers
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+    def reject(self, message):
+        if not hasattr(self.request, 'upload_errors'):
+            self.request.upload_errors = {}
+        self.request.upload_errors[self.field_name] = message
+        # Discard the remaining body instead of spooling it
+        raise StopUpload(connection_reset=False)
+
+
+def install_receipt_upload_handler(request):
+    """Must run before request.POST/FILES are first accessed."""
+    request.upload_handlers.insert(0, ReceiptUploadHandler(request))
+
+
+def apply_upload_errors(request, form):
+    """Replaces a form's field errors with any rejection from the upload handler."""
+    for field, message in getattr(request, 'upload_errors', {}).items():
+        if field in form.fields:
+            form.errors[field] = form.error_class([message])
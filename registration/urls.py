@@ -2,6 +2,7 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from .views import CustomLoginView, TemplateView
+from .api_views import EventListAPI, GroupRegistrationAPI, RunnerCreateAPI
 
 from . import views
 
@@ -26,18 +27,24 @@ urlpatterns = [
     # 📊 Admin dashboard and tools
     path('dashboard/', views.dashboard, name='dashboard'),
     path('export-xlsx/', views.export_xlsx, name='export_xlsx'),
+    path('export-xlsx/start/', views.export_start, name='export_start'),
+    path('export-jobs/<int:pk>/', views.export_job, name='export_job'),
+    path('export-jobs/<int:pk>/status/', views.export_job_status, name='export_job_status'),
+    path('export-jobs/<int:pk>/download/', views.export_job_download, name='export_job_download'),
     path('verification-stats/', views.verification_stats, name='verification_stats'),
 
     # 🗓️ Event CRUD
     path('event/add/', views.add_event, name='add_event'),
     path('event/<int:pk>/edit/', views.edit_event, name='edit_event'),
     path('event/<int:pk>/delete/', views.delete_event, name='delete_event'),
+    path('event/<int:pk>/receipts.zip', views.event_receipts_zip, name='event_receipts_zip'),
 
     # 📏 Distance management
     path('distance/add/', views.add_distance, name='add_distance'),
 
     # 👤 Manual runner registration (admin)
     path('runner/add/', views.manual_runner, name='manual_runner'),
+    path('runners/import/', views.import_runners_view, name='import_runners'),
 
     # 📃 Filtered views
     path('runners-by-event/', views.runners_by_event, name='runners_by_event'),
@@ -46,6 +53,7 @@ urlpatterns = [
 
     # ✅ Verify/edit/delete runners
     path('verify/<int:pk>/', views.verify_runner, name='verify_runner'),
+    path('verify/bulk/', views.bulk_verify_runners, name='bulk_verify_runners'),
     path('runner/<int:pk>/edit/', views.edit_runner, name='edit_runner'),
     path('runner/<int:pk>/delete/', views.delete_runner, name='delete_runner'),
     # Edit Distances
@@ -53,6 +61,18 @@ urlpatterns = [
     path('distance/<int:pk>/edit/', views.edit_distance, name='edit_distance'),
     path('distance/<int:pk>/delete/', views.delete_distance, name='delete_distance'),
 
+    # 🏁 Public results
+    path('event/<int:pk>/results/', views.event_results, name='event_results'),
+
+    # 🎽 Race-day check-in
+    path('checkin/', views.checkin, name='checkin'),
+    path('checkin/<int:pk>/lookup/', views.checkin_lookup, name='checkin_lookup'),
+    path('checkin/runner/<int:pk>/claim/', views.checkin_claim, name='checkin_claim'),
+
+    # Rest API
+    path('api/events/', EventListAPI.as_view(), name='api_events'),
+    path('api/register/', RunnerCreateAPI.as_view(), name='api_register'),
+    path('api/register/group/', GroupRegistrationAPI.as_view(), name='api_register_group'),
 
 ]
 
@@ -1,20 +1,22 @@
-import io
 import os
 
-from datetime import date, timedelta, datetime
-import xlsxwriter
+from datetime import date
 
 from django.contrib import messages
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.views import LoginView
-from django.core.mail import EmailMessage
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from django.db.models import Count, Q
-from django.http import JsonResponse, HttpResponse
+from django.core.files.storage import default_storage
+from django.http import Http404, JsonResponse, HttpResponse, FileResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
 from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.decorators.http import require_POST
 from django.views.generic import TemplateView
 from django.conf import settings
+from django.db import transaction
 
 from .forms import (
     RunnerRegistrationForm,
@@ -22,9 +24,50 @@ from .forms import (
     EventForm,
     DistanceForm,
     EventSelectForm,
+    BulkVerifyForm,
+    RunnerImportForm,
 )
-from .models import Event, Distance, Runner
+from .models import (
+    Event,
+    Distance,
+    Runner,
+    ExportJob,
+    RaceResult,
+    build_registration_email,
+    generate_bib_number,
+    verify_runners,
+)
+from .exports import (
+    AGE_MAP,
+    CSV_CONTENT_TYPE,
+    JSONL_CONTENT_TYPE,
+    XLSX_CONTENT_TYPE,
+    enqueue_export,
+    export_filename,
+    stream_csv,
+    stream_jsonl,
+    stream_receipts_zip,
+)
+from .imports import RunnerImportError, import_runners
+from .checkin import claim_kit, get_index
+from .results import format_duration
+from .caching import build_once, cached_page, event_distances, open_event_distances, version
+from .metrics import dashboard_features, dashboard_metrics
+from .pagination import KeysetPaginator
+from .search import search_runners
+from .uploads import install_receipt_upload_handler, apply_upload_errors
+
+
+# =========================
+# Helpers
+# =========================
 
+def querystring_without(request, *keys):
+    """Current GET parameters minus `keys`, for building pagination links."""
+    params = request.GET.copy()
+    for key in keys:
+        params.pop(key, None)
+    return params.urlencode()
 
 # =========================
 # Public Views
@@ -38,298 +81,248 @@ class CustomLoginView(LoginView):
             return '/dashboard/'
         return '/'
 
+
+HOME_CACHE_TIMEOUT = 60
+
+
 def home(request):
+    """Public home page, served from cache and revalidated with ETag/Last-Modified."""
     today = date.today()
-    events = Event.objects.filter(date__gte=today).order_by('date')
 
-    # Prefetch only if events exist
-    if events.exists():
-        events = events.prefetch_related('distances')
+    def build():
+        events = Event.objects.filter(date__gte=today).order_by('date').prefetch_related('distances')
+        # Rendered without the request: the page has no per-user content and is shared by everyone
+        return cached_page(render_to_string('registration/home.html', {'events': events, 'today': today}))
 
-    return render(request, 'registration/home.html', {
-        'events': events
-    })
+    # Event/Distance changes bump the version; the timeout bounds anything that slips past it
+    page = build_once(
+        f"home:{version('home')}:{today}", build, HOME_CACHE_TIMEOUT, stale_key='home:last'
+    )
+
+    return cached_page_response(request, page)
+
+
+def cached_page_response(request, page):
+    """Serves a caching.cached_page entry, answering 304 when the client's copy is current."""
+    last_modified = int(page['last_modified'].timestamp())
+    response = get_conditional_response(request, etag=page['etag'], last_modified=last_modified)
+    if response is None:
+        response = HttpResponse(page['html'])
+    response['ETag'] = page['etag']
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, public=True, no_cache=True)
+    return response
+
+
+RESULTS_CACHE_TIMEOUT = 10 * 60
 
 
+def results_context(event):
+    categories = dict(RunnerExportForm.AGE_CATEGORY_CHOICES)
+    genders = dict(Runner.GENDER_CHOICES)
+    rows = (
+        RaceResult.objects.filter(event=event, distance_rank__isnull=False)
+        .order_by('distance_id', 'distance_rank')
+        .values(
+            'distance_id', 'distance_rank', 'gender_rank', 'category_rank', 'age_category',
+            'gun_time', 'chip_time', 'runner__bib_number', 'runner__first_name',
+            'runner__last_name', 'runner__gender',
+        )
+    )
+    finishers = {}
+    for row in rows:
+        finishers.setdefault(row['distance_id'], []).append({
+            'place': row['distance_rank'],
+            'bib': row['runner__bib_number'],
+            'name': f"{row['runner__last_name']}, {row['runner__first_name']}",
+            'gender': genders.get(row['runner__gender'], row['runner__gender']),
+            'gender_place': row['gender_rank'],
+            'category': categories.get(row['age_category'], ''),
+            'category_place': row['category_rank'],
+            'gun_time': format_duration(row['gun_time']),
+            'chip_time': format_duration(row['chip_time']),
+        })
+    distances = [
+        {'distance': distance, 'finishers': finishers.get(distance.pk, [])}
+        for distance in event.distances.order_by('pk')
+    ]
+    return {'event': event, 'distances': distances}
+
+
+def event_results(request, pk):
+    """Public results page, cached per event until new reads are ingested."""
+    def build():
+        event = get_object_or_404(Event, pk=pk)
+        return cached_page(render_to_string('registration/results.html', results_context(event)))
+
+    page = build_once(
+        f"results:{version('results')}:event:{pk}", build, RESULTS_CACHE_TIMEOUT,
+        stale_key=f"results:last:{pk}",
+    )
+    return cached_page_response(request, page)
+
+
+def registration_context(form):
+    return {'form': form, 'distances': open_event_distances(date.today())}
+
+
+@csrf_exempt
 def register_runner(request):
+    # The upload handler has to be installed before CSRF validation reads request.POST
+    install_receipt_upload_handler(request)
+    return _register_runner(request)
+
+
+@csrf_protect
+def _register_runner(request):
     if request.method == 'POST':
         form = RunnerRegistrationForm(request.POST, request.FILES)
+        apply_upload_errors(request, form)
         if form.is_valid():
-            runner = form.save()
-
-            # 🔔 Send confirmation email (plain text)
-            EmailMessage(
-                subject="✅ SUR Registration Received",
-                body=(
-                    f"{runner.full_name}\n\n"
-                    f"Thanks for registering for:\n\n"
-                    f"🏁 Event: {runner.event.name}\n"
-                    f"📏 Distance: {runner.distance.label} KM\n"
-                    f"📅 Date: {runner.event.date.strftime('%B %d, %Y')}\n\n"
-                    f"We’ll verify your proof of payment shortly.\n"
-                    f"Once confirmed, you’ll get another email.\n\n"
-                    f"Thanks for joining Surigao Ultra Runners!\n"
-                    f"– The SUR Team 🏃‍♂️💚"
-                ),
-                from_email=None,  # uses settings.DEFAULT_FROM_EMAIL
-                to=[runner.email]
-            ).send()
+            # A duplicate email is only detected by the per-event unique constraint
+            runner = form.try_save()
+            if runner is None:
+                return render(request, 'registration/register.html', registration_context(form))
+
+            # 🔔 Queue confirmation email (plain text)
+            build_registration_email(runner).save()
 
             return render(request, 'registration/success.html')
     else:
         form = RunnerRegistrationForm()
 
-    return render(request, 'registration/register.html', {'form': form})
+    return render(request, 'registration/register.html', registration_context(form))
 
 def load_distances(request):
+    """Distances of one event as JSON. The registration page embeds these; staff pages still call it."""
     try:
         event_id = int(request.GET.get('event_id'))
-        distances = Distance.objects.filter(event__id=event_id).values('id', 'label', 'fee')
-        print("event_id received:", event_id)
-        print("distances found:", list(distances))  # ← full debug
-        return JsonResponse(list(distances), safe=False)
-    except (TypeError, ValueError) as e:
-        print("ERROR in load_distances:", e)
+    except (TypeError, ValueError):
         return JsonResponse([], safe=False)
 
+    entry = event_distances(event_id)
+    response = get_conditional_response(request, etag=entry['etag'])
+    if response is None:
+        response = HttpResponse(entry['body'], content_type='application/json')
+    response['ETag'] = entry['etag']
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
 # =========================
 # Dashboard & Staff Views
 # =========================
 @staff_member_required
 def dashboard(request):
     """Admin dashboard with metrics and quick links."""
-    # Metrics
-    event_count    = Event.objects.count()
-    distance_count = Distance.objects.count()
-    runner_count   = Runner.objects.count()
-    unverified     = Runner.objects.filter(is_verified=False).count()
-    upcoming_week  = Event.objects.filter(
-                         date__gte=date.today(),
-                         date__lte=date.today() + timedelta(days=7)
-                     ).count()
+    # Metrics (one aggregate query, cached until runners/events/distances change)
+    metrics = dashboard_metrics()
 
     # Recent registrations
     recent_runners = Runner.objects.order_by('-pk')[:5]
 
     # Dashboard feature cards
     features = [
-        {
-            'name': 'New Event',
-            'desc': 'Create a new race event',
-            'icon': 'fa-calendar-plus',
-            'url': reverse('registration:add_event'),
-            'count': None
-        },
-        {
-            'name': 'New Distance',
-            'desc': 'Add a new distance/fee category',
-            'icon': 'fa-route',
-            'url': reverse('registration:add_distance'),
-            'count': None
-        },
-        {
-            'name': 'New Runner',
-            'desc': 'Manually register a runner',
-            'icon': 'fa-user-plus',
-            'url': reverse('registration:manual_runner'),
-            'count': None
-        },
-        {
-            'name': 'Runners by Event',
-            'desc': 'View runners by selected event',
-            'icon': 'fa-list',
-            'url': reverse('registration:runners_by_event'),
-            'count': None
-        },
-        {
-            'name': 'Payment Stats',
-            'desc': 'View verified vs pending counts',
-            'icon': 'fa-chart-pie',
-            'url': reverse('registration:verification_stats'),
-            'count': None
-        },
-        {
-            'name': 'Current Events',
-            'desc': 'Edit or delete upcoming races',
-            'icon': 'fa-calendar-alt',
-            'url': reverse('registration:current_events'),
-            'count': None
-        },
-        {
-            'name': 'Export XLSX',
-            'desc': 'Download full report with images',
-            'icon': 'fa-file-excel',
-            'url': reverse('registration:export_xlsx'),
-            'count': None
-        },
-        {
-            'name': 'Edit Distances',
-            'desc': 'Manage existing distance categories',
-            'icon': 'fa-edit',
-            'url': reverse('registration:edit_distances'),
-            'count': None
-        },
-        {
-            'name': 'Verify Runners',
-            'desc': 'Approve pending registrations',
-            'icon': 'fa-check-circle',
-            'url': reverse('registration:unverified_runners'),
-            'count': unverified
-        }
+        {**card, 'count': metrics[card['count_key']] if card['count_key'] else None}
+        for card in dashboard_features()
     ]
 
     return render(request, 'registration/dashboard.html', {
         'features': features,
         'recent_runners': recent_runners,
-        'event_count': event_count,
-        'distance_count': distance_count,
-        'runner_count': runner_count,
-        'unverified': unverified,
-        'upcoming_week': upcoming_week,
+        'event_count': metrics['event_count'],
+        'distance_count': metrics['distance_count'],
+        'runner_count': metrics['runner_count'],
+        'unverified': metrics['unverified'],
+        'upcoming_week': metrics['upcoming_week'],
     })
 
 
+STREAMING_EXPORTS = {
+    'csv': (stream_csv, CSV_CONTENT_TYPE),
+    'jsonl': (stream_jsonl, JSONL_CONTENT_TYPE),
+}
+
+
 @staff_member_required
 def export_xlsx(request):
-    """Export filtered runners to a styled XLSX file using XlsxWriter."""
-    export_type = "xlsx"  # Default value for export_type
+    """Export form; submitting it goes to export_start."""
+    return render(request, 'registration/export_xslx.html', {'form': RunnerExportForm()})
 
-    form = RunnerExportForm(request.GET or None)
-    if request.GET and form.is_valid():
-        cd = form.cleaned_data
-        qs = Runner.objects.select_related('event', 'distance')
-        export_type = request.GET.get("export_type", export_type)
-
-        # Move dictionary ABOVE filters
-        age_map = {
-            '20_below': (0, 20),
-            '21_29': (21, 29),
-            '30_39': (30, 39),
-            '40_49': (40, 49),
-            '50_59': (50, 59),
-            '60_75': (60, 75),
-        }
-
-        # Apply filters
-        if cd['event']:
-            qs = qs.filter(event=cd['event'])
-        if cd['distance']:
-            qs = qs.filter(distance=cd['distance'])
-        if cd['shirt_size']:
-            qs = qs.filter(shirt_size=cd['shirt_size'])
-        if cd['gender']:
-            qs = qs.filter(gender=cd['gender'])
-        if cd['is_verified'] == 'yes':
-            qs = qs.filter(is_verified=True)
-        elif cd['is_verified'] == 'no':
-            qs = qs.filter(is_verified=False)
-        if cd['age_category'] in age_map:
-            low, high = age_map[cd['age_category']]
-            qs = qs.filter(age__gte=low, age__lte=high)
 
-        # Build filter summary (only what's selected)
-        filter_parts = []
+@staff_member_required
+@require_POST
+def export_start(request):
+    """Streams CSV / JSON Lines right away, or queues an XLSX job and redirects to its progress page."""
+    form = RunnerExportForm(request.POST)
+    if not form.is_valid():
+        return render(request, 'registration/export_xslx.html', {'form': form})
+
+    cd = form.cleaned_data
+    export_type = cd['export_type'] or 'xlsx'
+
+    # Text formats skip the workbook entirely; rows flow as they are read
+    if export_type in STREAMING_EXPORTS:
+        stream, content_type = STREAMING_EXPORTS[export_type]
+        response = StreamingHttpResponse(stream(cd), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{export_filename(cd, export_type)}"'
+        return response
 
-        if cd['event']:
-            filter_parts.append(f"Event: {cd['event'].name} on {cd['event'].date}")
-        if cd['distance']:
-            filter_parts.append(f"Distance: {cd['distance'].label} KM")
-        if cd['is_verified'] in ['yes', 'no']:
-            filter_parts.append(f"Verified: {'Yes' if cd['is_verified'] == 'yes' else 'No'}")
-        if cd['gender']:
-            gender_display = dict(Runner.GENDER_CHOICES).get(cd['gender'], cd['gender'])
-            filter_parts.append(f"Gender: {gender_display}")
-        if cd['shirt_size']:
-            filter_parts.append(f"Shirt Size: {cd['shirt_size']}")
-        if cd['age_category']:
-            category_map = dict(RunnerExportForm.AGE_CATEGORY_CHOICES)
-            filter_parts.append(f"Age Category: {category_map.get(cd['age_category'], cd['age_category'])}")
-
-        filters_text = "Filters – " + ", ".join(filter_parts) if filter_parts else "All runners (no filters applied)"
-
-        output = io.BytesIO()
-        workbook = xlsxwriter.Workbook(output, {'in_memory': True})
-        worksheet = workbook.add_worksheet("Runners")
-
-        # Header styles
-        summary_format = workbook.add_format({
-            'bold': True,
-            'font_color': 'white',
-            'bg_color': '#004400',
-            'align': 'left'
-        })
-        header_format = workbook.add_format({
-            'bold': True,
-            'bg_color': '#00cc44',
-            'font_color': 'white',
-            'align': 'center',
-            'valign': 'vcenter',
-            'border': 1
-        })
-        cell_format = workbook.add_format({
-            'border': 1,
-            'text_wrap': True,
-            'valign': 'vcenter'
-        })
-        bold_name_format = workbook.add_format({
-            'bold': True,
-            'border': 1,
-            'text_wrap': True,
-            'valign': 'vcenter'
-        })
+    # Workbooks are built by the run_export_jobs worker. Redirecting means a
+    # reload or back-navigation only re-polls the job instead of queueing another
+    job = enqueue_export(cd, request.user)
+    return redirect('registration:export_job', pk=job.pk)
 
-        # Title & summary
-        worksheet.merge_range('A1:H1', 'Surigao Ultra Runners – Exported Data', summary_format)
-        worksheet.merge_range('A2:H2', filters_text, workbook.add_format({'italic': True, 'bg_color': '#002200', 'font_color': '#ccffcc'}))
-
-        # Headers
-        headers = ['Name', 'Email', 'Distance','Bib', 'Age', 'Gender', 'Shirt Size']
-        for col, header in enumerate(headers):
-            worksheet.write(3, col, header, header_format)
-
-    # Data rows
-    if 'qs' in locals():
-        # Write data rows
-        for row_num, runner in enumerate(qs, start=4):
-            worksheet.write(row_num, 0, runner.full_name, bold_name_format)
-            worksheet.write(row_num, 1, runner.email, cell_format)
-            worksheet.write(row_num, 2, runner.distance.label, cell_format)
-
-            # ✅ Show bib only for verified runners
-            if runner.is_verified and runner.bib_number:
-                bib_to_show = runner.bib_number
-            else:
-                bib_to_show = ''
-
-            worksheet.write(row_num, 3, bib_to_show, cell_format)
-            worksheet.write(row_num, 4, runner.age, cell_format)
-            worksheet.write(row_num, 5, runner.get_gender_display(), cell_format)
-            worksheet.write(row_num, 6, runner.shirt_size, cell_format)
-
-        # Column widths (only if data exists)
-        worksheet.set_column('A:A', 22)  # Name
-        worksheet.set_column('B:B', 30)  # Email
-        worksheet.set_column('C:C', 15)  # Distance
-        worksheet.set_column('D:D', 12)  # Bib Number
-        worksheet.set_column('E:E', 6)   # Age
-        worksheet.set_column('F:F', 10)  # Gender
-        worksheet.set_column('G:G', 12)  # Shirt Size
-
-        workbook.close()
-        output.seek(0)
-
-        event_name = cd['event'].name.replace(" ", "_") if cd['event'] else 'all_events'
-        timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M')
-        filename = f"{event_name}_runners_{timestamp}.xlsx" 
-
-        response = HttpResponse(
-            output.read(),
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        return response
 
-    return render(request, 'registration/export_xslx.html', {'form': form})
+@staff_member_required
+def export_job(request, pk):
+    """Progress page of an export job; the form is prefilled with its filters."""
+    job = get_object_or_404(ExportJob, pk=pk)
+    return render(request, 'registration/export_xslx.html', {
+        'form': RunnerExportForm(initial=job.filters),
+        'job': job,
+    })
+
+
+@staff_member_required
+def export_job_status(request, pk):
+    """Lightweight JSON progress for a background export job."""
+    job = get_object_or_404(ExportJob.objects.only(
+        'status', 'rows_done', 'rows_total', 'error'
+    ), pk=pk)
+    return JsonResponse({
+        'status': job.status,
+        'progress': job.progress,
+        'rows_done': job.rows_done,
+        'rows_total': job.rows_total,
+        'error': job.error,
+        'download_url': reverse('registration:export_job_download', args=[job.pk])
+        if job.status == ExportJob.STATUS_DONE else None,
+    })
+
+
+@staff_member_required
+def export_job_download(request, pk):
+    job = get_object_or_404(ExportJob.objects.exclude(file=''), pk=pk, status=ExportJob.STATUS_DONE)
+    try:
+        workbook = default_storage.open(job.file.name, 'rb')
+    except OSError:
+        raise Http404("This export has expired.")
+    return FileResponse(
+        workbook,
+        as_attachment=True,
+        filename=job.filename,
+        content_type=XLSX_CONTENT_TYPE,
+    )
+
+
+@staff_member_required
+def event_receipts_zip(request, pk):
+    """Streams a ZIP of every receipt uploaded for an event, with an index CSV."""
+    event = get_object_or_404(Event, pk=pk)
+    response = StreamingHttpResponse(stream_receipts_zip(event), content_type='application/zip')
+    filename = f"{event.name.replace(' ', '_')}_receipts.zip"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 
 # =========================
 # Event Management
@@ -373,16 +366,52 @@ def manual_runner(request):
     """Manually register a runner (admin only)."""
     if request.method == 'POST':
         form = RunnerRegistrationForm(request.POST, request.FILES)
-        if form.is_valid():
-            form.save()
+        if form.is_valid() and form.try_save():
             return redirect('registration:dashboard')
     else:
         form = RunnerRegistrationForm()
     return render(request, 'registration/register.html', {
-        'form': form,
+        **registration_context(form),
         'manual': True
     })
 
+IMPORT_ERRORS_SHOWN = 50
+
+
+@staff_member_required
+def import_runners_view(request):
+    """Bulk-register runners for an event from an uploaded CSV/XLSX file."""
+    result = None
+    if request.method == 'POST':
+        form = RunnerImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            cd = form.cleaned_data
+            try:
+                result = import_runners(
+                    cd['event'],
+                    cd['file'],
+                    cd['file'].name,
+                    allocate_bibs=cd['allocate_bibs'],
+                    send_emails=cd['send_emails'],
+                    dry_run=cd['dry_run'],
+                )
+            except RunnerImportError as exc:
+                messages.error(request, f"❌ {exc}")
+            else:
+                verb = "Would import" if result.dry_run else "Imported"
+                messages.success(
+                    request,
+                    f"✅ {verb} {result.created} runner{'s' if result.created != 1 else ''}"
+                    f" ({result.rejected} rejected, {result.bibs_allocated} bibs assigned)."
+                )
+    else:
+        form = RunnerImportForm()
+    return render(request, 'registration/import_runners.html', {
+        'form': form,
+        'result': result,
+        'errors': result.errors[:IMPORT_ERRORS_SHOWN] if result else [],
+    })
+
 # =========================
 # Runner Listings & Filters
 # =========================
@@ -398,13 +427,6 @@ def runners_by_event(request):
         selected_event = cd['event']
         runner_list = Runner.objects.filter(event=selected_event)
 
-        search_query = cd.get('search', '').strip()
-        if search_query:
-            runner_list = runner_list.filter(
-            Q(first_name__icontains=search_query) |
-            Q(last_name__icontains=search_query)
-            )
-
         if cd['distance']:
             runner_list = runner_list.filter(distance=cd['distance'])
         if cd['shirt_size']:
@@ -416,34 +438,29 @@ def runners_by_event(request):
         elif cd['is_verified'] == 'no':
             runner_list = runner_list.filter(is_verified=False)
 
-        age_map = {
-            '20_below': (0, 20),
-            '21_29': (21, 29),
-            '30_39': (30, 39),
-            '40_49': (40, 49),
-            '50_59': (50, 59),
-            '60_75': (60, 75),
-        }
-        if cd['age_category'] in age_map:
-            low, high = age_map[cd['age_category']]
+        if cd['age_category'] in AGE_MAP:
+            low, high = AGE_MAP[cd['age_category']]
             runner_list = runner_list.filter(age__gte=low, age__lte=high)
 
-        runner_list = runner_list.select_related('distance').order_by('last_name', 'first_name')
+        runner_list = runner_list.select_related('distance')
 
+        # Full-name / email / bib search, best matches first
+        search_query = cd.get('search', '').strip()
+        if search_query:
+            runner_list = search_runners(runner_list, search_query)
 
-        # Pagination
-        paginator = Paginator(runner_list, 25)
-        page_number = request.GET.get('page', 1)
-        try:
-            runners = paginator.page(page_number)
-        except PageNotAnInteger:
-            runners = paginator.page(1)
-        except EmptyPage:
-            runners = paginator.page(paginator.num_pages)
+
+        # Keyset pagination: constant cost per page, however deep
+        ordering = ['last_name', 'first_name', 'pk']
+        if search_query:
+            ordering.insert(0, '-search_rank')
+        paginator = KeysetPaginator(runner_list, ordering, per_page=25)
+        runners = paginator.page(request.GET.get('cursor'), with_total=True)
 
     return render(request, 'registration/runners_by_event.html', {
         'form': form,
         'runners': runners,
+        'querystring': querystring_without(request, 'cursor'),
         'selected_event': selected_event,
         'title': 'Runners by Event',
     })
@@ -458,20 +475,15 @@ def unverified_runners(request):
 
     if request.GET and form.is_valid():
         selected_event = form.cleaned_data['event']
-        runner_list = Runner.objects.filter(event=selected_event, is_verified=False).order_by('-created_at')
+        runner_list = Runner.objects.filter(event=selected_event, is_verified=False)
 
-        paginator = Paginator(runner_list, 25)
-        page = request.GET.get('page', 1)
-        try:
-            runners = paginator.page(page)
-        except PageNotAnInteger:
-            runners = paginator.page(1)
-        except EmptyPage:
-            runners = paginator.page(paginator.num_pages)
+        paginator = KeysetPaginator(runner_list, ['-created_at', 'pk'], per_page=25)
+        runners = paginator.page(request.GET.get('cursor'), with_total=True)
 
     return render(request, 'registration/unverified_runners.html', {
         'form': form,
         'runners': runners,
+        'querystring': querystring_without(request, 'cursor'),
         'selected_event': selected_event,
         'title': 'Unverified Runners'
     })
@@ -533,56 +545,46 @@ def edit_event(request, pk):
 
 @staff_member_required
 def verify_runner(request, pk):
-    """Mark a runner as verified and send confirmation email."""
-    runner = get_object_or_404(Runner, pk=pk)
-    runner.is_verified = True
-
-    # ✅ Assign bib number if not yet assigned
-    if not runner.bib_number:
-        from registration.models import generate_bib_number
-        runner.bib_number = generate_bib_number(runner.distance)
-
-    runner.save()
-
-    # ✅ Send verification email
-    from django.core.mail import EmailMultiAlternatives
-    from django.template.loader import render_to_string
-
-    subject = "✅ Your SUR Registration Is Verified!"
-    to_email = [runner.email]
-
-    text_content = (
-        f"Hi {runner.full_name},\n\n"
-        f"✅ You're officially verified for:\n\n"
-        f"🏁 Event: {runner.event.name}\n"
-        f"📏 Distance: {runner.distance.label} KM\n"
-        f"📅 Date: {runner.event.date.strftime('%B %d, %Y')}\n\n"
-        "You may now consider your registration confirmed.\n"
-        "We’ll see you at the starting line!\n\n"
-        "– The SUR Team 🏃‍♂️💚"
-    )
+    """Mark a runner as verified; the pre_save signal queues the confirmation email."""
+    # Bib and runner commit together, and the row lock makes a double click wait
+    # and then see the bib the first click assigned
+    with transaction.atomic():
+        runner = get_object_or_404(
+            Runner.objects.select_related('event', 'distance').select_for_update(of=('self',)), pk=pk
+        )
+        runner.is_verified = True
 
-    html_content = render_to_string("emails/verification_email.html", {
-        "name": runner.full_name,
-        "event": runner.event.name,
-        "distance": runner.distance.label,
-        "date": runner.event.date.strftime("%B %d, %Y"),
-    })
+        # ✅ Assign bib number if not yet assigned
+        if not runner.bib_number:
+            runner.bib_number = generate_bib_number(runner.distance)
 
-    email = EmailMultiAlternatives(subject, text_content, None, to_email)
-    email.attach_alternative(html_content, "text/html")
-    email.send()
+        runner.save()
 
     return redirect('registration:unverified_runners')
 
+@staff_member_required
+@require_POST
+def bulk_verify_runners(request):
+    """Verify the selected (or all pending) runners of an event in one go."""
+    form = BulkVerifyForm(request.POST)
+    if not form.is_valid():
+        for error in form.non_field_errors():
+            messages.error(request, error)
+        return redirect('registration:unverified_runners')
+
+    count = verify_runners(form.get_runners())
+    messages.success(request, f"✅ Verified {count} runner{'s' if count != 1 else ''}. Confirmation emails are queued.")
+
+    event = form.cleaned_data['event']
+    return redirect(f"{reverse('registration:unverified_runners')}?event={event.pk}")
+
 @staff_member_required
 def edit_runner(request, pk):
     """Edit runner details."""
     runner = get_object_or_404(Runner, pk=pk)
     if request.method == 'POST':
         form = RunnerRegistrationForm(request.POST, request.FILES, instance=runner)
-        if form.is_valid():
-            form.save()
+        if form.is_valid() and form.try_save():
             return redirect('registration:runners_by_event')
     else:
         form = RunnerRegistrationForm(instance=runner)
@@ -611,26 +613,17 @@ def delete_runner(request, pk):
 @staff_member_required
 def verification_stats(request):
     """Show verification stats (overall and per event)."""
-    # Overall counts
-    total      = Runner.objects.count()
-    verified   = Runner.objects.filter(is_verified=True).count()
-    unverified = total - verified
-
-    # Breakdown per event
-    by_event = (
-        Event.objects
-             .annotate(
-                 total_reg=Count('runner'),
-                 verified_reg=Count('runner', filter=Q(runner__is_verified=True))
-             )
-             .values('name', 'total_reg', 'verified_reg')
-    )
+    # Breakdown per event, read from the maintained counters
+    by_event = Event.objects.order_by('date').values('name', 'registered_count', 'verified_count')
 
-    # Compute percentages in Python
+    # Compute totals and percentages in Python
     stats = []
+    total = verified = 0
     for ev in by_event:
-        tot = ev['total_reg'] or 0
-        ver = ev['verified_reg'] or 0
+        tot = ev['registered_count']
+        ver = ev['verified_count']
+        total += tot
+        verified += ver
         pct = (ver / tot * 100) if tot else 0
         stats.append({
             'event': ev['name'],
@@ -638,6 +631,7 @@ def verification_stats(request):
             'verified': ver,
             'percent': f"{pct:.0f}%"
         })
+    unverified = total - verified
 
     return render(request, 'registration/verification_stats.html', {
         'total': total,
@@ -721,4 +715,51 @@ def delete_distance(request, pk):
     return render(request, 'registration/confirm_delete.html', {
         'object': distance,
         'title': 'Delete Distance'
-    })
\ No newline at end of file
+    })
+
+
+# =========================
+# Race-day Check-in
+# =========================
+
+def checkin_entry_json(entry):
+    data = entry._asdict()
+    data['gender'] = dict(Runner.GENDER_CHOICES).get(entry.gender, entry.gender)
+    data['claim_url'] = reverse('registration:checkin_claim', args=[entry.id])
+    return data
+
+
+@staff_member_required
+def checkin(request):
+    """Kit-claim desk: search an event's runners by bib or name and mark pickups."""
+    events = Event.objects.filter(date__gte=date.today()).order_by('date')
+    selected = None
+    event_id = request.GET.get('event')
+    if event_id and event_id.isdigit():
+        selected = get_object_or_404(Event, pk=event_id)
+    elif events:
+        selected = events[0]
+    return render(request, 'registration/checkin.html', {
+        'events': events,
+        'selected_event': selected,
+    })
+
+
+@staff_member_required
+def checkin_lookup(request, pk):
+    """JSON search over the in-memory check-in index (see checkin.py)."""
+    index = get_index(pk)
+    results = index.lookup(request.GET.get('q', ''))
+    return JsonResponse({'results': [checkin_entry_json(entry) for entry in results]})
+
+
+@staff_member_required
+@require_POST
+def checkin_claim(request, pk):
+    """Records kit pickup. Claiming twice is harmless and reports the first claim."""
+    entry, claimed = claim_kit(pk, user=request.user)
+    if entry is None:
+        return JsonResponse({'error': "Runner not found."}, status=404)
+    if not entry.is_verified:
+        return JsonResponse({'error': "❌ Payment not verified yet.", 'runner': checkin_entry_json(entry)}, status=409)
+    return JsonResponse({'claimed': claimed, 'runner': checkin_entry_json(entry)})
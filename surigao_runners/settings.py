@@ -81,6 +81,19 @@ else:
         }
     }
 
+# CACHE
+# Database backed, so every gunicorn worker (and the background commands)
+# shares one cache, and add() is atomic through the primary key, which the
+# rebuild locks in registration/caching.py rely on. The table is created with
+# `python manage.py createcachetable` (part of the Render build).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'registration_cache',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    }
+}
+
 # PASSWORD VALIDATION
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -104,6 +117,21 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# 🪣 Receipts and finished exports are read by both the web service and the
+# export worker, which don't share a disk on Render. Set AWS_STORAGE_BUCKET_NAME
+# (any S3-compatible bucket, credentials in AWS_ACCESS_KEY_ID/AWS_SECRET_ACCESS_KEY)
+# to keep them there; without it they stay in MEDIA_ROOT, fine for local dev.
+AWS_STORAGE_BUCKET_NAME = os.getenv('AWS_STORAGE_BUCKET_NAME')
+if AWS_STORAGE_BUCKET_NAME:
+    STORAGES = {
+        'default': {'BACKEND': 'storages.backends.s3.S3Storage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    }
+    AWS_S3_ENDPOINT_URL = os.getenv('AWS_S3_ENDPOINT_URL')  # For non-AWS providers
+    AWS_S3_REGION_NAME = os.getenv('AWS_S3_REGION_NAME')
+    AWS_DEFAULT_ACL = None  # Bucket stays private; receipt URLs are signed
+    AWS_S3_FILE_OVERWRITE = False
+
 # EMAIL BACKEND
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'
@@ -113,6 +141,14 @@ EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = f"Surigao Ultra Runners <{EMAIL_HOST_USER}>"
 
+# XLSX EXPORTS: threads copying stored receipt thumbnails out of storage
+EXPORT_THUMBNAIL_WORKERS = int(os.getenv('EXPORT_THUMBNAIL_WORKERS', '4'))
+
+# GOOGLE SHEETS SYNC (manage.py sync_google_sheets)
+GOOGLE_SHEETS_CREDENTIALS = os.getenv('GOOGLE_SHEETS_CREDENTIALS', str(BASE_DIR / 'credentials' / 'sheets-key.json'))
+# Point at a local fake server for testing
+GOOGLE_SHEETS_API_URL = os.getenv('GOOGLE_SHEETS_API_URL', 'https://sheets.googleapis.com')
+
 # STAFF LOGIN REDIRECT
 LOGIN_URL = 'admin_login'
 